@@ -1,6 +1,161 @@
+#change_feed.py
+import threading
+import time
+from collections import namedtuple
+
+# operation: "create", "update" ou "delete"; field/before/after só em "update"
+Change = namedtuple("Change", ["sequence", "timestamp", "entity", "entity_id", "operation", "field", "before", "after"])
+
+class ChangeFeed:
+    "Registro ordenado das alterações dos modelos, com números de sequência e valores antes/depois"
+
+    def __init__(self, retention=100_000):
+        if retention <= 0:
+            raise ValueError("A retenção deve ser positiva.")
+        self.retention = retention
+        self._changes = []
+        self._first_sequence = 1  # Sequência de _changes[0]
+        self._next_sequence = 1
+        self._condition = threading.Condition()
+
+    @property
+    def last_sequence(self):
+        return self._next_sequence - 1
+
+    @property
+    def first_available(self):
+        return self._first_sequence
+
+    def record(self, entity, entity_id, operation, field=None, before=None, after=None):
+        with self._condition:
+            change = Change(self._next_sequence, time.time(), entity, entity_id, operation, field, before, after)
+            self._next_sequence += 1
+            self._changes.append(change)
+            if len(self._changes) >= 2 * self.retention:
+                # Descarta os mais antigos de uma vez só: custo amortizado constante por registro
+                dropped = len(self._changes) - self.retention
+                del self._changes[:dropped]
+                self._first_sequence += dropped
+            self._condition.notify_all()
+        return change
+
+    def read(self, after_sequence=0, limit=500):
+        "Alterações com sequência maior que after_sequence, em ordem, no máximo limit"
+        with self._condition:
+            if after_sequence < self._first_sequence - 1:
+                raise ValueError("Sequência fora da retenção do change feed; reconstrua a partir do estado atual.")
+            start = max(after_sequence - self._first_sequence + 1, 0)
+            return self._changes[start:start + limit]
+
+    def wait(self, after_sequence, timeout=None):
+        # Bloqueia até haver alterações depois de after_sequence (ou até o timeout)
+        with self._condition:
+            return self._condition.wait_for(lambda: self._next_sequence - 1 > after_sequence, timeout)
+
+    def subscribe(self, callback, since=None, batch_size=500):
+        "Assinatura que entrega lotes ao callback a partir de since (padrão: só alterações novas)"
+        return ChangeSubscription(self, callback, self.last_sequence if since is None else since, batch_size)
+
+class ChangeSubscription:
+    "Consumidor do change feed: guarda a posição e entrega as alterações em lotes"
+
+    def __init__(self, feed, callback, position, batch_size=500):
+        self._feed = feed
+        self._callback = callback
+        self.position = position  # Última sequência entregue; use-a para retomar depois
+        self.batch_size = batch_size
+        self._thread = None
+        self._stop = threading.Event()
+
+    def poll(self):
+        # Entrega um lote (se houver) e avança a posição somente depois do callback
+        batch = self._feed.read(self.position, self.batch_size)
+        if batch:
+            self._callback(batch)
+            self.position = batch[-1].sequence
+        return len(batch)
+
+    def drain(self):
+        delivered = 0
+        while True:
+            count = self.poll()
+            if not count:
+                return delivered
+            delivered += count
+
+    def start(self, timeout=1.0):
+        # Entrega em segundo plano assim que novas alterações chegam
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                if self._feed.wait(self.position, timeout):
+                    self.drain()
+
+        self._thread = threading.Thread(target=run, name="change-subscription", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class TrackedModel:
+    "Base dos modelos que publicam alterações no change feed depois de cadastrados"
+    _entity = None
+    _tracked = False  # Ligado pelo banco (ou controller) ao cadastrar; construção não gera alterações
+
+    def _changed(self, field, after):
+        # Chamado pelos setters antes da atribuição, enquanto o valor anterior ainda está disponível
+        if self._tracked:
+            before = getattr(self, "_" + field)
+            if before != after:
+                change_feed.record(self._entity, self.id, "update", field, before, after)
+
+    def _track(self, operation):
+        self._tracked = operation != "delete"
+        change_feed.record(self._entity, self.id, operation)
+
+change_feed = ChangeFeed()
+
 #user.py
+import hashlib
+import hmac
+import secrets
 from abc import ABC, abstractmethod
-class User(ABC):
+
+PASSWORD_HASH_ITERATIONS = 600_000  # PBKDF2-SHA256: lento de propósito contra força bruta
+
+def hash_password(password, iterations=PASSWORD_HASH_ITERATIONS, salt=None):
+    "Gera o hash salgado da senha no formato pbkdf2_sha256$iterações$sal$hash"
+    salt = salt or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), iterations)
+    return f"pbkdf2_sha256${iterations}${salt}${digest.hex()}"
+
+# Hash fixo conferido quando o email não existe: a resposta leva o mesmo tempo e não revela quem está cadastrado
+DUMMY_PASSWORD_HASH = f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${'0' * 32}${'0' * 64}"
+
+def verify_password(password, stored_hash):
+    "Confere a senha com o hash armazenado em tempo constante"
+    try:
+        algorithm, iterations, salt, expected = stored_hash.split("$")
+    except ValueError:
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    try:
+        # Iterações não numéricas (ou não positivas) e sal fora do ASCII: hash malformado
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+class User(TrackedModel, ABC):
+    _entity = "user"
+
     def __init__(self, user_id, name, email, password):
         self._id = user_id
         self._name = name
@@ -20,6 +175,7 @@ class User(ABC):
     def name(self, value):
         if not value:
             raise ValueError("O nome não pode ser vazio.")
+        self._changed("name", value)
         self._name = value
 
     @property
@@ -30,17 +186,25 @@ class User(ABC):
     def email(self, value):
         if not value:
             raise ValueError("O email não pode ser vazio.")
+        self._changed("email", value)
         self._email = value
 
     @property
     def password(self):
         return self._password
 
+    # A senha nunca é armazenada em texto puro: o setter guarda apenas o hash
     @password.setter
     def password(self, value):
         if not value:
             raise ValueError("A senha não pode ser vazia.")
-        self._password = value
+        self._password = hash_password(value)
+        if self._tracked:
+            # Hashes não vão para o feed: registra apenas que a senha mudou
+            change_feed.record(self._entity, self.id, "update", "password")
+
+    def check_password(self, password):
+        return verify_password(password, self._password)
 
     @abstractmethod
     def get_role(self):
@@ -65,10 +229,42 @@ class Agent(User):
         return "Agente"
 
 #client.py
+class Preferences:
+    "Perfil de preferências de um cliente: localizações, categorias, faixa de preço e transação"
+
+    def __init__(self, locations=None, categories=None, price_min=None, price_max=None, transaction_type=None):
+        valid_categories = {"Casa", "Apartamento", "Terreno"}
+        categories = [category.capitalize() for category in (categories or [])]
+        if any(category not in valid_categories for category in categories):
+            raise ValueError(f"Categoria inválida. Use: {valid_categories}")
+        if transaction_type and transaction_type not in {"Venda", "Aluguel"}:
+            raise ValueError("Transação inválida. Use: {'Venda', 'Aluguel'}")
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise ValueError("O preço mínimo não pode ser maior que o preço máximo.")
+        self.locations = list(locations or [])
+        self.categories = categories
+        self.price_min = price_min
+        self.price_max = price_max
+        self.transaction_type = transaction_type
+
+    def is_empty(self):
+        return not (self.locations or self.categories or self.transaction_type
+                    or self.price_min is not None or self.price_max is not None)
+
+    def to_dict(self):
+        return {
+            "locations": self.locations,
+            "categories": self.categories,
+            "price_min": self.price_min,
+            "price_max": self.price_max,
+            "transaction_type": self.transaction_type
+        }
+
 class Client(User):
     def __init__(self, user_id, name, email, password):
         super().__init__(user_id, name, email, password)
         self._scheduled_visits = []
+        self._preferences = Preferences()
 
     def schedule_visit(self, visit):
         self._scheduled_visits.append(visit)
@@ -76,35 +272,221 @@ class Client(User):
     def list_scheduled_visits(self):
         return self._scheduled_visits
 
+    @property
+    def preferences(self):
+        return self._preferences
+
+    def update_preferences(self, **kwargs):
+        # Substitui apenas os campos informados, validando o perfil completo
+        current = self._preferences.to_dict()
+        current.update(kwargs)
+        self._preferences = Preferences(**current)
+        return self._preferences
+
     def get_role(self):
         return "Cliente"
 
 #inquiry.py
-class Inquiry:
+import heapq
+import math
+import threading
+from datetime import datetime
+class Inquiry(TrackedModel):
+    _entity = "inquiry"
+    STATUSES = ("Pendente", "Em atendimento", "Respondida", "Encerrada")
+
     def __init__(self, id, client, property, message):
         self._id = id
         self._client = client
         self._property = property
+        self._agent = property.agent  # Agente responsável pelo anúncio recebe a consulta
         self._message = message
         self._status = "Pendente"
+        self._created_at = datetime.now()
+        self._on_status_change = None  # Definido pelo controller que indexa a consulta (grava o status sob a trava dele)
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def agent(self):
+        return self._agent
+
+    @property
+    def message(self):
+        return self._message
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def created_at(self):
+        return self._created_at
+
+    # Declarado por último: dentro da classe, o nome passa a esconder o decorador embutido
+    @property
+    def property(self):
+        return self._property
 
     def update_status(self, status):
-        self._status = status
+        if status not in self.STATUSES:
+            raise ValueError(f"Status inválido. Use: {self.STATUSES}")
+        if self._on_status_change is not None:
+            self._on_status_change(self, status)
+        else:
+            self._set_status(status)
+
+    def _set_status(self, status):
+        self._changed("status", status)
+        previous, self._status = self._status, status
+        return previous
 
     def __str__(self):
         return f"Consulta #{self._id} - {self._property.title} | Status: {self._status}"
 
 class InquiryController:
-    def __init__(self):
-        self._inquiries = []
+    "Consultas indexadas por agente, propriedade e status, com fila de prioridade de pendentes por agente"
+
+    def __init__(self, value_weight_hours=24):
+        # Prioridade = idade + value_weight_hours para cada fator 10 no valor do imóvel
+        self.value_weight_hours = value_weight_hours
+        self._inquiries = {}   # id -> consulta (ordem de criação)
+        self._by_agent = {}    # agente -> {id: consulta}
+        self._by_property = {} # id da propriedade -> {id: consulta}
+        self._by_status = {}   # status -> {id: consulta}
+        self._by_agent_status = {}  # (agente, status) -> {id: consulta}
+        self._queues = {}      # agente -> heap de (prioridade, id) das pendentes
+        self._queued = {}      # id -> entrada válida no heap (as demais são descartadas ao sair)
+        self._next_id = 1
+        self._lock = threading.RLock()  # Protege IDs, índices e filas; reentrante para update_status
+        db.add_compaction_hook(self._purge_removed)
+
+    def _priority(self, inquiry):
+        # Chave fixa no tempo: todas as idades crescem juntas, então basta a data deslocada pelo valor
+        value = max(inquiry.property.price, 1)
+        return inquiry.created_at.timestamp() - self.value_weight_hours * 3600 * math.log10(value)
+
+    def _enqueue(self, inquiry):
+        entry = (self._priority(inquiry), inquiry.id)
+        self._queued[inquiry.id] = entry
+        heapq.heappush(self._queues.setdefault(inquiry.agent, []), entry)
 
     def add_inquiry(self, client, property, message):
-        new_inquiry = Inquiry(len(self._inquiries) + 1, client, property, message)
-        self._inquiries.append(new_inquiry)
+        with self._lock:
+            new_inquiry = Inquiry(self._next_id, client, property, message)
+            self._next_id += 1
+            self._inquiries[new_inquiry.id] = new_inquiry
+            self._by_agent.setdefault(new_inquiry.agent, {})[new_inquiry.id] = new_inquiry
+            self._by_property.setdefault(property.id, {})[new_inquiry.id] = new_inquiry
+            self._by_status.setdefault(new_inquiry.status, {})[new_inquiry.id] = new_inquiry
+            self._by_agent_status.setdefault((new_inquiry.agent, new_inquiry.status), {})[new_inquiry.id] = new_inquiry
+            self._enqueue(new_inquiry)
+            new_inquiry._on_status_change = self._change_status
+            new_inquiry._track("create")
         return new_inquiry
 
+    def _change_status(self, inquiry, status):
+        # Chamado por Inquiry.update_status: grava o status e move a consulta entre os índices em O(1),
+        # tudo sob a trava, para que next_batch nunca veja status e filas em desacordo
+        with self._lock:
+            previous = inquiry._set_status(status)
+            if previous == status:
+                return
+            self._by_status.get(previous, {}).pop(inquiry.id, None)
+            self._by_status.setdefault(inquiry.status, {})[inquiry.id] = inquiry
+            self._by_agent_status.get((inquiry.agent, previous), {}).pop(inquiry.id, None)
+            self._by_agent_status.setdefault((inquiry.agent, inquiry.status), {})[inquiry.id] = inquiry
+            if inquiry.status == "Pendente":
+                self._enqueue(inquiry)
+            else:
+                self._queued.pop(inquiry.id, None)  # A entrada no heap vira obsoleta
+
+    def update_status(self, inquiry_id, status):
+        with self._lock:
+            inquiry = self._inquiries.get(inquiry_id)
+            if inquiry is None:
+                raise ValueError("Consulta não encontrada.")
+            inquiry.update_status(status)
+            return inquiry
+
+    def find_inquiry_by_id(self, inquiry_id):
+        with self._lock:
+            return self._inquiries.get(inquiry_id)
+
     def list_inquiries(self):
-        return [inquiry for inquiry in self._inquiries]
+        with self._lock:
+            return list(self._inquiries.values())
+
+    def list_by_agent(self, agent, status=None):
+        with self._lock:
+            if status is None:
+                return list(self._by_agent.get(agent, {}).values())
+            # Índice (agente, status): custo proporcional ao resultado, não ao total do agente
+            inquiries = self._by_agent_status.get((agent, status), {}).values()
+            return sorted(inquiries, key=lambda inquiry: inquiry.id)
+
+    def list_by_property(self, property_id):
+        with self._lock:
+            return list(self._by_property.get(property_id, {}).values())
+
+    def list_by_status(self, status):
+        with self._lock:
+            return list(self._by_status.get(status, {}).values())
+
+    def count_by_status(self):
+        with self._lock:
+            return {status: len(inquiries) for status, inquiries in self._by_status.items() if inquiries}
+
+    def next_batch(self, agent, size=20, claim=False):
+        "Próximas consultas pendentes do agente por prioridade; com claim=True passam a 'Em atendimento'"
+        with self._lock:
+            queue = self._queues.get(agent, [])
+            batch = []
+            while queue and len(batch) < size:
+                entry = heapq.heappop(queue)
+                if self._queued.get(entry[1]) is entry:
+                    batch.append(entry)
+            if claim:
+                for _, inquiry_id in batch:
+                    self._inquiries[inquiry_id].update_status("Em atendimento")
+            else:
+                for entry in batch:
+                    heapq.heappush(queue, entry)
+            return [self._inquiries[inquiry_id] for _, inquiry_id in batch]
+
+    def _purge_removed(self, property_ids, user_ids):
+        # Chamado pela compactação do banco: descarta consultas de propriedades ou clientes excluídos
+        with self._lock:
+            removed = [
+                inquiry for inquiry in self._inquiries.values()
+                if inquiry.property.id in property_ids or inquiry.client.id in user_ids
+            ]
+            for inquiry in removed:
+                del self._inquiries[inquiry.id]
+                self._by_agent[inquiry.agent].pop(inquiry.id, None)
+                self._by_property[inquiry.property.id].pop(inquiry.id, None)
+                self._by_status[inquiry.status].pop(inquiry.id, None)
+                self._by_agent_status[(inquiry.agent, inquiry.status)].pop(inquiry.id, None)
+                self._queued.pop(inquiry.id, None)
+                inquiry._on_status_change = None
+                inquiry._track("delete")
+            for index in (self._by_agent, self._by_property, self._by_agent_status):
+                for key in [key for key, inquiries in index.items() if not inquiries]:
+                    del index[key]
+            # Reconstrói os heaps sem as entradas obsoletas
+            if removed:
+                self._queues = {}
+                for inquiry_id, entry in self._queued.items():
+                    self._queues.setdefault(self._inquiries[inquiry_id].agent, []).append(entry)
+                for queue in self._queues.values():
+                    heapq.heapify(queue)
+            return len(removed)
 
 # market_analysis.py
 class MarketAnalysis:
@@ -172,6 +554,7 @@ class MarketAnalysis:
         return f"Análise de Mercado: Preço Médio = R${self.get_average_price():.2f}"
 
 #mortgage.py
+import numpy as np
 class Mortgage:
     def __init__(self, loan_amount, annual_rate, years):
         # Validação básica das entradas
@@ -201,6 +584,48 @@ class Mortgage:
     def _calculate_total_payment(self):
         return self.monthly_payment * self.months
 
+    @staticmethod
+    def max_loan_amount(monthly_payment, annual_rate, years):
+        "Maior empréstimo cuja parcela não passa de monthly_payment (fórmula da parcela invertida)"
+        if monthly_payment <= 0:
+            raise ValueError("A parcela máxima deve ser positiva.")
+        if annual_rate < 0:
+            raise ValueError("A taxa anual não pode ser negativa.")
+        if years <= 0:
+            raise ValueError("O prazo deve ser positivo.")
+        rate = annual_rate / 100 / 12
+        months = years * 12
+        if rate == 0:
+            return monthly_payment * months
+        return monthly_payment * (1 - (1 + rate) ** -months) / rate
+
+    @staticmethod
+    def max_affordable_price(monthly_payment, annual_rate, years, down_payment=0):
+        "Preço máximo do imóvel: maior empréstimo possível mais a entrada"
+        if down_payment < 0:
+            raise ValueError("A entrada não pode ser negativa.")
+        return Mortgage.max_loan_amount(monthly_payment, annual_rate, years) + down_payment
+
+    @staticmethod
+    def max_affordable_prices(monthly_payments, annual_rates, years, down_payments=0):
+        "Versão vetorizada (NumPy) de max_affordable_price para muitos perfis; escalares são replicados"
+        monthly_payments, annual_rates, years, down_payments = np.broadcast_arrays(
+            *(np.asarray(values, dtype=np.float64) for values in (monthly_payments, annual_rates, years, down_payments)))
+        if np.any(monthly_payments <= 0):
+            raise ValueError("A parcela máxima deve ser positiva.")
+        if np.any(annual_rates < 0):
+            raise ValueError("A taxa anual não pode ser negativa.")
+        if np.any(years <= 0):
+            raise ValueError("O prazo deve ser positivo.")
+        if np.any(down_payments < 0):
+            raise ValueError("A entrada não pode ser negativa.")
+        rates = annual_rates / 100 / 12
+        months = years * 12
+        # Com taxa zero o fator é o próprio número de meses (evita a divisão por zero)
+        safe_rates = np.where(rates == 0, 1.0, rates)
+        factors = np.where(rates == 0, months, (1 - (1 + safe_rates) ** -months) / safe_rates)
+        return monthly_payments * factors + down_payments
+
     def __str__(self):
         return (
             f"Parcela mensal: R${self.monthly_payment:.2f}\n"
@@ -208,6 +633,8 @@ class Mortgage:
         )
 
 #property.py
+from contextlib import nullcontext
+from datetime import datetime
 from geopy.geocoders import Nominatim
 geolocator = Nominatim(user_agent="myGeocoder")
 
@@ -282,7 +709,9 @@ class PropertyFactory:
         creator = PropertyFactory.get_property_creator(property_type)
         return creator.create_property(property_id, title, description, price, location, transaction_type, agent, virtual_tour_url)
 
-class Property:
+class Property(TrackedModel):
+    _entity = "property"
+
     def __init__(self, id, title, description, price, location, property_category, transaction_type, agent, virtual_tour_url=None):
         self._id = id
         self.title = title
@@ -294,6 +723,7 @@ class Property:
         self._agent = agent
         self._available = True
         self.virtual_tour_url = virtual_tour_url
+        self._listed_at = datetime.now()
 
     # Validações e getters/setters
     @property
@@ -304,7 +734,9 @@ class Property:
     def title(self, value):
         if not value:
             raise ValueError("Título não pode ser vazio.")
-        self._title = value
+        with self._reindexing():
+            self._changed("title", value)
+            self._title = value
 
     @property
     def description(self):
@@ -314,7 +746,9 @@ class Property:
     def description(self, value):
         if not value:
             raise ValueError("Descrição não pode ser vazia.")
-        self._description = value
+        with self._reindexing():
+            self._changed("description", value)
+            self._description = value
 
     @property
     def price(self):
@@ -324,7 +758,9 @@ class Property:
     def price(self, value):
         if value < 0:
             raise ValueError("Preço não pode ser negativo.")
-        self._price = value
+        with self._reindexing():
+            self._changed("price", value)
+            self._price = value
 
     @property
     def location(self):
@@ -334,7 +770,9 @@ class Property:
     def location(self, value):
         if not value:
             raise ValueError("Localização não pode ser vazia.")
-        self._location = value
+        with self._reindexing():
+            self._changed("location", value)
+            self._location = value
 
     @property
     def property_category(self):
@@ -345,7 +783,9 @@ class Property:
         valid_categories = {"Casa", "Apartamento", "Terreno"}
         if value not in valid_categories:
             raise ValueError(f"Categoria inválida. Use: {valid_categories}")
-        self._property_category = value
+        with self._reindexing():
+            self._changed("property_category", value)
+            self._property_category = value
 
     @property
     def transaction_type(self):
@@ -356,7 +796,9 @@ class Property:
         valid_transactions = {"Venda", "Aluguel"}
         if value not in valid_transactions:
             raise ValueError(f"Transação inválida. Use: {valid_transactions}")
-        self._transaction_type = value
+        with self._reindexing():
+            self._changed("transaction_type", value)
+            self._transaction_type = value
 
     # Ajuste para acessar o ID
     @property
@@ -371,6 +813,7 @@ class Property:
     def agent(self, value):
         if not value:
             raise ValueError("Agente não pode ser vazio.")
+        self._changed("agent", value)
         self._agent = value
 
     @property
@@ -381,6 +824,14 @@ class Property:
     def available(self, value):
         if not isinstance(value, bool):
             raise ValueError("Disponibilidade deve ser um valor booleano.")
+        if self._tracked:
+            # Propriedade cadastrada: a troca passa pelo banco para manter índices e cache coerentes
+            db.set_property_availability(self, value)
+        else:
+            self._set_available(value)
+
+    def _set_available(self, value):
+        self._changed("available", value)
         self._available = value
 
     @property
@@ -389,23 +840,42 @@ class Property:
 
     @virtual_tour_url.setter
     def virtual_tour_url(self, value):
+        self._changed("virtual_tour_url", value)
         self._virtual_tour_url = value
 
     def remove_virtual_tour(self):
         self.virtual_tour_url = None
 
+    @property
+    def listed_at(self):
+        return self._listed_at
+
+    @listed_at.setter
+    def listed_at(self, value):
+        if not isinstance(value, datetime):
+            raise ValueError("Data de anúncio inválida.")
+        with self._reindexing():  # Renova a versão do segmento usado pela sugestão de preço
+            self._changed("listed_at", value)
+            self._listed_at = value
+
+    def _reindexing(self):
+        # Propriedade cadastrada: sai dos índices (e das partições do cache) e volta com os novos valores
+        return db.updating_property(self) if self._tracked else nullcontext()
+
     def update_details(self, **kwargs):
-        for attr, value in kwargs.items():
-            if hasattr(self, attr):
-                setattr(self, attr, value)
+        with self._reindexing():  # Uma única reindexação para todos os campos alterados
+            for attr, value in kwargs.items():
+                if hasattr(self, attr):
+                    setattr(self, attr, value)
 
     def switch_status(self):
-        self._available = not self._available
+        self.available = not self._available
 
     def get_coordinates(self):
-        location = geolocator.geocode(self.location)
-        if location:
-            return location.latitude, location.longitude
+        # Pelo cache global: cada localização é geocodificada uma única vez
+        coordinates = geocode_cache.coordinates(self.location)
+        if coordinates:
+            return coordinates
         return None, None
 
     def get_google_maps_link(self):
@@ -429,14 +899,21 @@ class Property:
 
 #review.py
 from datetime import datetime
-class Review:
+class Review(TrackedModel):
+    _entity = "review"
+
     def __init__(self, property_id, user, rating, comment):
+        self._id = None  # Atribuído pelo banco de dados no cadastro
         self._property_id = property_id
         self._user = user
         self._rating = rating
         self._comment = comment
         self._date = datetime.now()
 
+    @property
+    def id(self):
+        return self._id
+
     # Getter para property_id
     @property
     def property_id(self):
@@ -451,6 +928,7 @@ class Review:
     def rating(self, value):
         if not (1 <= value <= 5):
             raise ValueError("A avaliação deve estar entre 1 e 5.")
+        self._changed("rating", value)
         self._rating = value
 
     # Getters e setters para comment
@@ -462,6 +940,7 @@ class Review:
     def comment(self, value):
         if not value:
             raise ValueError("O comentário não pode ser vazio.")
+        self._changed("comment", value)
         self._comment = value
 
     # Getter para a data formatada
@@ -477,7 +956,9 @@ class Review:
             self.comment = comment  # Usa o setter
 
 #Visit.py
-class Visit:
+class Visit(TrackedModel):
+    _entity = "visit"
+
     def __init__(self, id, client, agent, property, date_time):
         if not all([client, agent, property, date_time]):
             raise ValueError("Todos os campos (cliente, agente, propriedade, data/hora) são obrigatórios.")
@@ -488,6 +969,10 @@ class Visit:
         self._date_time = date_time
         self._status = "Agendado!"
 
+    @property
+    def id(self):
+        return self._id
+
     def __str__(self):
         return f"Visita #{self._id} - {self._property.title} | Data: {self._date_time} | Status: {self._status}"
 
@@ -500,6 +985,7 @@ class Visit:
     def date_time(self, value):
         if not value:
             raise ValueError("A data e hora não podem ser vazias.")
+        self._changed("date_time", value)
         self._date_time = value
 
     # Getter para status (somente leitura)
@@ -510,58 +996,944 @@ class Visit:
     # Método para reagendar a visita
     def reschedule(self, new_date_time):
         self.date_time = new_date_time  # Usa o setter
+        self._changed("status", "Reagendado!")
         self._status = "Reagendado!"
 
     # Método para cancelar a visita
     def cancel(self):
+        self._changed("status", "Cancelado!")
         self._status = "Cancelado!"
 
+#rw_lock.py
+import threading
+from contextlib import contextmanager
+class ReadWriteLock:
+    "Trava leitores-escritor reentrante: vários leitores em paralelo ou um único escritor"
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None             # Thread que detém a escrita
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()  # Profundidade de leitura por thread
+
+    def _read_depth(self):
+        return getattr(self._local, "depth", 0)
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        # Leituras aninhadas (ou feitas pelo próprio escritor) não esperam de novo
+        if self._writer == me or self._read_depth() > 0:
+            self._local.depth = self._read_depth() + 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        with self._condition:
+            # Escritores em espera têm preferência para não sofrerem inanição
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+            return
+        if self._read_depth() > 0:
+            raise RuntimeError("Não é possível promover uma leitura para escrita.")
+
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = None
+                self._write_depth = 0
+                self._condition.notify_all()
+
+#property_index.py
+from bisect import bisect_left, bisect_right, insort
+class PartitionVersions:
+    "Contadores de versão por partição de dados, incrementados a cada alteração"
+
+    def __init__(self):
+        self._versions = {}
+
+    def get(self, partition):
+        return self._versions.get(partition, 0)
+
+    def snapshot(self, partitions):
+        return {partition: self.get(partition) for partition in partitions}
+
+    def is_current(self, snapshot):
+        return all(self.get(partition) == version for partition, version in snapshot.items())
+
+    def bump(self, *partitions):
+        for partition in partitions:
+            self._versions[partition] = self._versions.get(partition, 0) + 1
+
+#duplicate_detection.py
+import re
+import unicodedata
+import zlib
+import numpy as np
+def normalize_text(text):
+    "Minúsculas, sem acentos nem pontuação e com espaços únicos"
+    # NFKD separa os acentos das letras; a codificação ASCII descarta os acentos
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[\W_]+", " ", text).strip()
+
+class DuplicateDetector:
+    "Detecção de anúncios quase duplicados com assinaturas MinHash e buckets LSH"
+    PRIME = (1 << 31) - 1  # Primo de Mersenne: (a * x + b) cabe em 64 bits para x < 2^32
+
+    def __init__(self, num_perm=128, bands=16, shingle_size=4, threshold=0.7, seed=1):
+        if num_perm % bands:
+            raise ValueError("O número de permutações deve ser múltiplo do número de bandas.")
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self.PRIME, size=num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, self.PRIME, size=num_perm, dtype=np.uint64)[:, None]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self._signatures = {}  # id -> (assinatura, segmento)
+        self._buckets = {}     # (banda, hash da fatia) -> {ids}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _shingles(self, prop):
+        text = normalize_text(f"{prop.title} {prop.description}")
+        size = self.shingle_size
+        if len(text) <= size:
+            return {text}
+        return {text[start:start + size] for start in range(len(text) - size + 1)}
+
+    def signature(self, prop):
+        # crc32 é estável entre execuções (ao contrário de hash() do Python)
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in self._shingles(prop)), dtype=np.uint64)
+        return ((self._a * hashes + self._b) % self.PRIME).min(axis=1)
+
+    @staticmethod
+    def segment(prop):
+        # Só são comparados anúncios da mesma categoria na mesma cidade ("Centro, Recife" -> "recife")
+        return prop.property_category, normalize_text(prop.location.rsplit(",", 1)[-1])
+
+    def _band_keys(self, signature, segment):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, segment, chunk.tobytes()
+
+    def similarity(self, first, second):
+        # Estimativa do índice de Jaccard entre os conjuntos de shingles
+        return float(np.mean(first == second))
+
+    def find_duplicates(self, prop, signature=None):
+        "Lista (id, similaridade) de anúncios indexados parecidos com prop, sem varrer o catálogo"
+        signature = self.signature(prop) if signature is None else signature
+        segment = self.segment(prop)
+        candidates = set()
+        for key in self._band_keys(signature, segment):
+            candidates.update(self._buckets.get(key, ()))
+        candidates.discard(prop.id)
+        matches = []
+        for candidate in candidates:
+            score = self.similarity(signature, self._signatures[candidate][0])
+            if score >= self.threshold:
+                matches.append((candidate, score))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, prop, signature=None):
+        signature = self.signature(prop) if signature is None else signature
+        segment = self.segment(prop)
+        self._signatures[prop.id] = (signature, segment)
+        for key in self._band_keys(signature, segment):
+            self._buckets.setdefault(key, set()).add(prop.id)
+
+    def remove(self, prop):
+        entry = self._signatures.pop(prop.id, None)
+        if entry is None:
+            return
+        signature, segment = entry
+        for key in self._band_keys(signature, segment):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(prop.id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def clusters(self):
+        "Agrupa todo o catálogo em conjuntos de duplicatas (somente grupos com mais de um anúncio)"
+        parent = {}
+
+        def find(item):
+            parent.setdefault(item, item)
+            while parent[item] != item:
+                parent[item] = parent[parent[item]]
+                item = parent[item]
+            return item
+
+        # Cada bucket gera pares candidatos; só os confirmados pela assinatura completa são unidos
+        checked = set()
+        for members in self._buckets.values():
+            if len(members) < 2:
+                continue
+            members = sorted(members)
+            for position, first in enumerate(members):
+                for second in members[position + 1:]:
+                    if (first, second) in checked:
+                        continue
+                    checked.add((first, second))
+                    if self.similarity(self._signatures[first][0], self._signatures[second][0]) >= self.threshold:
+                        parent[find(second)] = find(first)
+
+        groups = {}
+        for item in list(parent):
+            groups.setdefault(find(item), []).append(item)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=lambda group: group[0])
+
+#rental_yield.py
+class RentalYieldIndex:
+    "Preços ordenados de venda e aluguel por segmento (cidade, categoria), atualizados a cada inclusão ou remoção"
+    ALL_CATEGORIES = "Todas"  # Segmento com todas as categorias da cidade
+
+    def __init__(self):
+        self._prices = {}   # (cidade minúscula, categoria, transação) -> lista ordenada de preços
+        self._cities = {}   # cidade minúscula -> nome exibido
+        self._entries = {}  # id -> (chaves, preço) usados na inclusão (para remoção)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, prop):
+        # "Centro, São Paulo" -> "São Paulo"; cada preço entra na categoria e no total da cidade
+        city = prop.location.rsplit(",", 1)[-1].strip()
+        self._cities.setdefault(city.lower(), city)
+        keys = [
+            (city.lower(), category, prop.transaction_type)
+            for category in (prop.property_category, self.ALL_CATEGORIES)
+        ]
+        for key in keys:
+            insort(self._prices.setdefault(key, []), prop.price)
+        self._entries[prop.id] = (keys, prop.price)
+
+    def remove(self, prop):
+        entry = self._entries.pop(prop.id, None)
+        if entry is None:
+            return
+        keys, price = entry
+        for key in keys:
+            prices = self._prices[key]
+            del prices[bisect_left(prices, price)]
+            if not prices:
+                del self._prices[key]
+
+    @staticmethod
+    def _median(prices):
+        middle = len(prices) // 2
+        return prices[middle] if len(prices) % 2 else (prices[middle - 1] + prices[middle]) / 2
+
+    def segment(self, city, property_category=None):
+        "Rendimento bruto (aluguel mediano anual / venda mediana) de um segmento, ou None sem venda e aluguel"
+        key = (city.strip().lower(), property_category or self.ALL_CATEGORIES)
+        sales = self._prices.get(key + ("Venda",))
+        rents = self._prices.get(key + ("Aluguel",))
+        if not sales or not rents:
+            return None
+        median_sale = self._median(sales)
+        median_rent = self._median(rents)
+        return {
+            "city": self._cities[key[0]],
+            "property_category": key[1],
+            "median_rent": median_rent,
+            "median_sale": median_sale,
+            "gross_yield": median_rent * 12 / median_sale if median_sale else None,
+            "num_rent": len(rents),
+            "num_sale": len(sales)
+        }
+
+    def table(self, by_category=True, min_listings=1):
+        "Segmentos com venda e aluguel, do maior para o menor rendimento bruto"
+        rows = []
+        for city, category, transaction in list(self._prices):
+            if transaction != "Venda" or (category != self.ALL_CATEGORIES) != by_category:
+                continue
+            row = self.segment(city, category)
+            if row and row["gross_yield"] is not None and min(row["num_rent"], row["num_sale"]) >= min_listings:
+                rows.append(row)
+        return sorted(rows, key=lambda row: (-row["gross_yield"], row["city"], row["property_category"]))
+
+YIELD_FIELDS = ["city", "property_category", "median_rent", "median_sale", "gross_yield", "num_rent", "num_sale"]
+
+#facet_index.py
+# np.bitwise_count só existe a partir do NumPy 2.0; antes disso, a contagem usa uma tabela por byte
+_bitwise_count = getattr(np, "bitwise_count", None)
+_POPCOUNT_TABLE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+def _popcount(words):
+    "Total de bits ligados num bitmap de palavras uint64"
+    if _bitwise_count is not None:
+        return int(_bitwise_count(words).sum())
+    return int(_POPCOUNT_TABLE[np.ascontiguousarray(words).view(np.uint8)].sum(dtype=np.int64))
+
+class FacetIndex:
+    "Bitmaps (palavras uint64 do NumPy) por valor de faceta, com uma posição densa por propriedade"
+    FACETS = ("property_category", "transaction_type", "available", "city")
+
+    def __init__(self, capacity=1024):
+        self._words = max(-(-capacity // 64), 1)
+        self._slots = {}     # id -> posição do bit
+        self._free = []      # posições liberadas por remoções, reaproveitadas
+        self._next_slot = 0
+        self._live = np.zeros(self._words, dtype=np.uint64)
+        self._prices = np.zeros(self._words * 64)  # preço por posição, para filtrar faixas vetorialmente
+        self._bitmaps = {facet: {} for facet in self.FACETS}  # faceta -> valor -> bitmap
+        self._locations = {}  # localização (minúscula) -> {posições}: conjunto compacto, há muitos valores
+        self._values = {}     # id -> (valores das facetas, localização) usados na inclusão
+        self._labels = {}     # cidade (minúscula) -> nome exibido
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _grow(self):
+        # Dobra a capacidade de todos os bitmaps de uma vez (custo amortizado constante por inclusão)
+        extra = self._words
+        self._words += extra
+        self._live = np.concatenate([self._live, np.zeros(extra, dtype=np.uint64)])
+        self._prices = np.concatenate([self._prices, np.zeros(extra * 64)])
+        for bitmaps in self._bitmaps.values():
+            for value in bitmaps:
+                bitmaps[value] = np.concatenate([bitmaps[value], np.zeros(extra, dtype=np.uint64)])
+
+    def _bitmap(self, facet, value):
+        bitmaps = self._bitmaps[facet]
+        if value not in bitmaps:
+            bitmaps[value] = np.zeros(self._words, dtype=np.uint64)
+        return bitmaps[value]
+
+    @staticmethod
+    def _set(bitmap, slot):
+        bitmap[slot >> 6] |= np.uint64(1 << (slot & 63))
+
+    @staticmethod
+    def _clear(bitmap, slot):
+        bitmap[slot >> 6] &= ~np.uint64(1 << (slot & 63))
+
+    def add(self, prop):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._next_slot
+            self._next_slot += 1
+            if slot >= self._words * 64:
+                self._grow()
+        city = prop.location.rsplit(",", 1)[-1].strip()
+        self._labels.setdefault(city.lower(), city)
+        values = (prop.property_category.lower(), prop.transaction_type, prop.available, city.lower())
+        location = prop.location.lower()
+        self._slots[prop.id] = slot
+        self._values[prop.id] = (values, location)
+        self._set(self._live, slot)
+        self._prices[slot] = prop.price
+        for facet, value in zip(self.FACETS, values):
+            self._set(self._bitmap(facet, value), slot)
+        self._locations.setdefault(location, set()).add(slot)
+
+    def remove(self, prop):
+        slot = self._slots.pop(prop.id, None)
+        if slot is None:
+            return
+        values, location = self._values.pop(prop.id)
+        self._clear(self._live, slot)
+        for facet, value in zip(self.FACETS, values):
+            self._clear(self._bitmaps[facet][value], slot)
+        slots = self._locations[location]
+        slots.discard(slot)
+        if not slots:
+            del self._locations[location]
+        self._free.append(slot)
+
+    def update_available(self, prop):
+        # Troca só o bit de disponibilidade, sem reindexar as demais facetas
+        slot = self._slots.get(prop.id)
+        if slot is None:
+            return
+        values, location = self._values[prop.id]
+        if values[2] == prop.available:
+            return
+        self._clear(self._bitmaps["available"][values[2]], slot)
+        self._set(self._bitmap("available", prop.available), slot)
+        self._values[prop.id] = (values[:2] + (prop.available,) + values[3:], location)
+
+    def _slots_bitmap(self, slots):
+        bitmap = np.zeros(self._words, dtype=np.uint64)
+        slots = np.fromiter(slots, dtype=np.int64)
+        np.bitwise_or.at(bitmap, slots >> 6, np.left_shift(np.uint64(1), (slots & 63).astype(np.uint64)))
+        return bitmap
+
+    def _price_bitmap(self, price_min, price_max):
+        matches = np.ones(len(self._prices), dtype=bool)
+        if price_min is not None:
+            matches &= self._prices >= price_min
+        if price_max is not None:
+            matches &= self._prices <= price_max
+        # Bit i da palavra i // 64: mesma disposição dos demais bitmaps
+        return np.packbits(matches, bitorder="little").view("<u8").astype(np.uint64)
+
+    def _filters(self, query):
+        # Um bitmap por critério da consulta; a localização é uma busca por substring, como nas buscas
+        filters = {}
+        if query.property_category:
+            filters["property_category"] = self._bitmaps["property_category"].get(query.property_category.lower())
+        if query.transaction_type:
+            filters["transaction_type"] = self._bitmaps["transaction_type"].get(query.transaction_type)
+        if query.available is not None:
+            filters["available"] = self._bitmaps["available"].get(query.available)
+        if query.location:
+            term = query.location.lower()
+            filters["location"] = self._slots_bitmap(
+                slot for key, slots in self._locations.items() if term in key for slot in slots)
+        if query.price_min is not None or query.price_max is not None:
+            filters["price"] = self._price_bitmap(query.price_min, query.price_max)
+        return {name: np.zeros(self._words, dtype=np.uint64) if bitmap is None else bitmap
+                for name, bitmap in filters.items()}
+
+    def _intersect(self, filters, skip=None):
+        mask = self._live
+        for name, bitmap in filters.items():
+            if name != skip:
+                mask = mask & bitmap
+        return mask
+
+    def counts(self, query):
+        "Total e contagens por valor de faceta; cada faceta ignora o próprio critério (facetas disjuntivas)"
+        filters = self._filters(query)
+        total = _popcount(self._intersect(filters))
+        facets = {}
+        for facet, bitmaps in self._bitmaps.items():
+            mask = self._intersect(filters, skip=facet)
+            counts = {}
+            for value, bitmap in bitmaps.items():
+                count = _popcount(mask & bitmap)
+                if count:
+                    label = self._labels[value] if facet == "city" else value
+                    counts[label.capitalize() if facet == "property_category" else label] = count
+            facets[facet] = dict(sorted(counts.items(), key=lambda item: (-item[1], str(item[0]))))
+        return {"total": total, "facets": facets}
+
+class PropertyIndex:
+    "Índices secundários de propriedades por ID, categoria, transação, localização e preço"
+    CATALOG = ("catalog",)        # Partição alterada por qualquer mutação
+    LOCATIONS = ("locations",)    # Partição alterada quando uma localização surge ou desaparece
+
+    @staticmethod
+    def segment_partition(property_category, transaction_type):
+        # Partição (categoria, transação) alterada quando um anúncio entra, sai ou é reindexado no segmento;
+        # mudanças só de disponibilidade não a alteram
+        return ("segment", property_category.lower(), transaction_type)
+
+    def __init__(self):
+        self.versions = PartitionVersions()
+        self.duplicates = DuplicateDetector()  # Assinaturas MinHash para quase duplicatas
+        self.yields = RentalYieldIndex()       # Medianas de venda e aluguel por cidade e categoria
+        self.facets = FacetIndex()             # Bitmaps para contagens de facetas
+        self._by_id = {}            # id -> propriedade
+        self._by_category = {}      # categoria (minúscula) -> {id: propriedade}
+        self._by_transaction = {}   # transação -> {id: propriedade}
+        self._by_location = {}      # localização (minúscula) -> {id: propriedade}
+        self._by_price = []         # Lista ordenada de (preço, id)
+        self._by_transaction_price = {}  # transação -> lista ordenada de (preço, id)
+        self._price_arrays = {}     # transação -> (versão do catálogo, preços ordenados em NumPy)
+        self._by_title_location = {}  # (título, localização) -> id, para detectar duplicatas
+        self._indexed_keys = {}     # id -> chaves usadas na indexação (para remoção)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, property, duplicate_signature=None):
+        keys = (
+            property.property_category.lower(),
+            property.transaction_type,
+            property.location.lower(),
+            property.price,
+            (property.title, property.location)
+        )
+        category, transaction, location, price, title_location = keys
+        if location not in self._by_location:
+            self.versions.bump(self.LOCATIONS)
+        self._by_id[property.id] = property
+        self._by_category.setdefault(category, {})[property.id] = property
+        self._by_transaction.setdefault(transaction, {})[property.id] = property
+        self._by_location.setdefault(location, {})[property.id] = property
+        insort(self._by_price, (price, property.id))
+        insort(self._by_transaction_price.setdefault(transaction, []), (price, property.id))
+        self._by_title_location[title_location] = property.id
+        self._indexed_keys[property.id] = keys
+        self.duplicates.add(property, duplicate_signature)
+        self.yields.add(property)
+        self.facets.add(property)
+        self.versions.bump(self.segment_partition(category, transaction))
+        self._bump(category, location)
+
+    def remove(self, property):
+        keys = self._indexed_keys.pop(property.id, None)
+        if keys is None:
+            return
+        category, transaction, location, price, title_location = keys
+        del self._by_id[property.id]
+        if self._by_title_location.get(title_location) == property.id:
+            del self._by_title_location[title_location]
+        self.duplicates.remove(property)
+        self.yields.remove(property)
+        self.facets.remove(property)
+        self._discard(self._by_category, category, property.id)
+        self._discard(self._by_transaction, transaction, property.id)
+        self._discard(self._by_location, location, property.id)
+        if location not in self._by_location:
+            self.versions.bump(self.LOCATIONS)
+        self._remove_sorted(self._by_price, (price, property.id))
+        self._remove_sorted(self._by_transaction_price.get(transaction, []), (price, property.id))
+        self.versions.bump(self.segment_partition(category, transaction))
+        self._bump(category, location)
+
+    def update(self, property):
+        # Reindexa uma propriedade cujos atributos foram alterados
+        self.remove(property)
+        self.add(property)
+
+    def update_available(self, property):
+        # Só a disponibilidade mudou: atualiza o bitmap e invalida as buscas dependentes
+        self.facets.update_available(property)
+        category, _, location = self._indexed_keys[property.id][:3]
+        self._bump(category, location)
+
+    def facet_counts(self, query):
+        return self.facets.counts(query)
+
+    def _bump(self, category, location):
+        self.versions.bump(self.CATALOG, ("category", category), ("location", location))
+
+    def partitions_for(self, location=None, property_category=None):
+        # Partições das quais depende o resultado de uma busca com esses critérios
+        if location:
+            term = location.lower()
+            return [self.LOCATIONS] + [("location", key) for key in self._by_location if term in key]
+        if property_category:
+            return [("category", property_category.lower())]
+        return [self.CATALOG]
+
+    @staticmethod
+    def _remove_sorted(items, item):
+        position = bisect_left(items, item)
+        if position < len(items) and items[position] == item:
+            del items[position]
+
+    @staticmethod
+    def _discard(index, key, property_id):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(property_id, None)
+        if not bucket:
+            del index[key]
+
+    def get(self, property_id):
+        return self._by_id.get(property_id)
+
+    def contains_title_location(self, title, location):
+        return (title, location) in self._by_title_location
+
+    def all(self):
+        return self._by_id.values()
+
+    def by_category(self, property_category):
+        return self._by_category.get(property_category.lower(), {}).values()
+
+    def by_transaction(self, transaction_type):
+        return self._by_transaction.get(transaction_type, {}).values()
+
+    def location_buckets(self, location):
+        # Busca por substring: percorre apenas as localizações distintas, não as propriedades
+        term = location.lower()
+        return [bucket for key, bucket in self._by_location.items() if term in key]
+
+    def _price_bounds(self, price_min=None, price_max=None):
+        start = 0 if price_min is None else bisect_left(self._by_price, (price_min,))
+        end = len(self._by_price) if price_max is None else bisect_right(self._by_price, (price_max, float("inf")))
+        return start, end
+
+    def count_price_range(self, price_min=None, price_max=None):
+        start, end = self._price_bounds(price_min, price_max)
+        return max(end - start, 0)
+
+    def by_price_range(self, price_min=None, price_max=None, descending=False):
+        # Gera as propriedades da faixa em ordem de preço, sem materializar a lista
+        start, end = self._price_bounds(price_min, price_max)
+        positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+        for position in positions:
+            yield self._by_id[self._by_price[position][1]]
+
+    def by_transaction_price(self, transaction_type, price_max=None, descending=True):
+        # Propriedades de uma transação até price_max: O(log n) para achar o teto, O(1) por item gerado
+        prices = self._by_transaction_price.get(transaction_type, [])
+        end = len(prices) if price_max is None else bisect_right(prices, (price_max, float("inf")))
+        positions = range(end - 1, -1, -1) if descending else range(end)
+        for position in positions:
+            yield self._by_id[prices[position][1]]
+
+    def transaction_price_array(self, transaction_type):
+        # Cópia NumPy dos preços ordenados dos anúncios disponíveis, refeita apenas quando o catálogo muda
+        # (mudanças de disponibilidade também renovam a versão do catálogo)
+        version = self.versions.get(self.CATALOG)
+        cached = self._price_arrays.get(transaction_type)
+        if cached is None or cached[0] != version:
+            prices = self._by_transaction_price.get(transaction_type, [])
+            available = (price for price, property_id in prices if self._by_id[property_id].available)
+            cached = (version, np.fromiter(available, dtype=np.float64))
+            self._price_arrays[transaction_type] = cached
+        return cached[1]
+
+#session_store.py
+import time
+class SessionStore:
+    "Sessões em memória com tokens opacos e tempo de vida limitado"
+
+    def __init__(self, ttl_seconds=3600):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}  # token -> (usuário, expira_em)
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+
+    def create(self, user):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = (user, time.monotonic() + self.ttl_seconds)
+        return token
+
+    def get(self, token):
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        user, expires_at = session
+        if expires_at <= time.monotonic():
+            self.revoke(token)
+            return None
+        return user
+
+    def revoke(self, token):
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def revoke_user(self, user):
+        with self._lock:
+            tokens = [token for token, (owner, _) in self._sessions.items() if owner is user]
+            for token in tokens:
+                del self._sessions[token]
+        return len(tokens)
+
+    def sweep(self):
+        # Remove as sessões expiradas e devolve quantas foram removidas
+        now = time.monotonic()
+        with self._lock:
+            expired = [token for token, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for token in expired:
+                del self._sessions[token]
+        return len(expired)
+
+    def start_sweeper(self, interval_seconds=60):
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop_sweeper.clear()
+
+        def run():
+            while not self._stop_sweeper.wait(interval_seconds):
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_sweeper.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+#query_cache.py
+from collections import OrderedDict
+class QueryCache:
+    "Cache LRU de resultados de consultas, invalidado por versões de partição"
+
+    def __init__(self, versions, capacity=256):
+        if capacity <= 0:
+            raise ValueError("A capacidade do cache deve ser positiva.")
+        self._versions = versions
+        self._capacity = capacity
+        self._entries = OrderedDict()  # chave -> (versões das dependências, resultado)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, partitions, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                snapshot, result = entry
+                if self._versions.is_current(snapshot):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+            # As versões são lidas antes do cálculo: uma escrita concorrente invalida o resultado
+            snapshot = self._versions.snapshot(partitions)
+
+        # O cálculo acontece fora da trava do cache para não serializar as buscas
+        result = compute()
+        with self._lock:
+            self._entries[key] = (snapshot, result)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "capacity": self._capacity,
+                "hit_rate": self.hits / lookups if lookups else 0
+            }
+
+#tombstone_list.py
+import weakref
+class TombstoneList:
+    "Lista com remoção O(1): o item removido vira uma lápide até a compactação"
+    _TOMBSTONE = object()
+
+    def __init__(self, items=()):
+        self._items = []
+        self._positions = {}  # id(item) -> posição na lista
+        self._removed = []    # itens com lápide, aguardando a compactação
+        for item in items:
+            self.append(item)
+
+    def append(self, item):
+        self._positions[id(item)] = len(self._items)
+        self._items.append(item)
+
+    def remove(self, item):
+        position = self._positions.pop(id(item), None)
+        if position is None:
+            raise ValueError("Item não encontrado na lista.")
+        self._items[position] = self._TOMBSTONE
+        self._removed.append(item)
+
+    def __contains__(self, item):
+        return id(item) in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __iter__(self):
+        if not self._removed:
+            return iter(self._items)
+        return (item for item in self._items if item is not self._TOMBSTONE)
+
+    @property
+    def tombstones(self):
+        return len(self._removed)
+
+    def removed(self):
+        return list(self._removed)
+
+    def compact(self):
+        "Descarta as lápides e devolve os itens removidos desde a última compactação"
+        if not self._removed:
+            return []
+        self._items = [item for item in self._items if item is not self._TOMBSTONE]
+        self._positions = {id(item): position for position, item in enumerate(self._items)}
+        removed, self._removed = self._removed, []
+        return removed
+
 #database.py
 # Simulação de Banco de Dados em Memória
 class Database:
     def __init__(self):
-        self.users = []         # Lista de usuários (Clientes e Agentes)
-        self.properties = []    # Lista de propriedades
-        self.visits = []        # Lista de visitas agendadas
-        self.reviews = []       # Lista de avaliações
+        # Listas com remoção O(1) por lápide; compact() recupera o espaço e limpa os registros relacionados
+        self.users = TombstoneList()       # Usuários (Clientes e Agentes)
+        self._users_by_email = {}  # Índice de usuários por email
+        self._users_by_id = {}     # Índice de usuários por ID
+        self.properties = TombstoneList()  # Propriedades
+        self.visits = TombstoneList()      # Visitas agendadas
+        self.reviews = TombstoneList()     # Avaliações
+        self.property_index = PropertyIndex()  # Índices secundários de propriedades
+        self.possible_duplicates = {}          # id -> ids de anúncios parecidos detectados no cadastro
+        self.lock = ReadWriteLock()            # Leitores em paralelo, escritas exclusivas
         self._next_property_id = 1
+        self._next_user_id = 1
+        self._next_visit_id = 1
+        self._next_review_id = 1
+        self._compaction_hooks = []  # Funções chamadas com os IDs removidos a cada compactação
+        self._compactor = None
+        self._stop_compactor = threading.Event()
 
         # Inicializa os dados do banco de dados
         self.initialize_data()
 
     # Adiciona um novo usuário à lista
     def add_user(self, user: User):
-        self.users.append(user)
+        with self.lock.write():
+            self.users.append(user)
+            self._users_by_email[user.email] = user
+            self._users_by_id[user.id] = user
+            self._next_user_id = max(self._next_user_id, user.id + 1)
+            user._track("create")
+
+    # Próximo ID livre de usuário (chamar sob a trava de escrita, antes de add_user)
+    def new_user_id(self):
+        return self._next_user_id
+
+    # Remove um usuário em O(1): fica uma lápide até a compactação
+    def remove_user(self, user: User):
+        with self.lock.write():
+            self.users.remove(user)
+            self._users_by_email.pop(user.email, None)
+            self._users_by_id.pop(user.id, None)
+            user._track("delete")
+
+    # Busca um usuário pelo ID em O(1)
+    def find_user_by_id(self, user_id):
+        with self.lock.read():
+            return self._users_by_id.get(user_id)
 
-    # Retorna todos os usuários na lista
+    # Busca um usuário pelo email em O(1)
+    def find_user_by_email(self, email):
+        with self.lock.read():
+            return self._users_by_email.get(email)
+
+    # Retorna todos os usuários na lista (quem percorrer a lista deve manter a trava de leitura)
     def get_users(self):
         return self.users
 
     # Retorna apenas os clientes
     def get_clients(self):
-        return [user for user in self.users if user.user_type == "Cliente"]
+        with self.lock.read():
+            return [user for user in self.users if user.user_type == "Cliente"]
 
     # Retorna apenas os agentes
     def get_agents(self):
-        return [user for user in self.users if user.user_type == "Agente"]
+        with self.lock.read():
+            return [user for user in self.users if user.user_type == "Agente"]
 
     # Adiciona uma propriedade
     def add_property(self, property: Property):
-        # Verifica se já existe uma propriedade com o mesmo título e localização
-        if any(prop.title == property.title and prop.location == property.location for prop in self.properties):
-            raise ValueError("Propriedade já cadastrada.")
-
-        property._id = self._next_property_id
-        self.properties.append(property)
-        self._next_property_id += 1
-
-    # Retorna todas as propriedades
+        with self.lock.write():
+            # Verifica se já existe uma propriedade com o mesmo título e localização (consulta ao índice)
+            if self.property_index.contains_title_location(property.title, property.location):
+                raise ValueError("Propriedade já cadastrada.")
+
+            # Quase duplicatas não bloqueiam o cadastro, apenas ficam sinalizadas para revisão
+            property._id = self._next_property_id
+            signature = self.property_index.duplicates.signature(property)  # Calculada uma única vez
+            duplicates = self.property_index.duplicates.find_duplicates(property, signature)
+            if duplicates:
+                self.possible_duplicates[property.id] = [duplicate_id for duplicate_id, _ in duplicates]
+            self.properties.append(property)
+            self.property_index.add(property, duplicate_signature=signature)
+            self._next_property_id += 1
+            property._track("create")
+
+    # Remove uma propriedade em O(1) da lista (lápide) e dos índices
+    def remove_property(self, property: Property):
+        with self.lock.write():
+            self.properties.remove(property)
+            self.property_index.remove(property)
+            property._track("delete")
+
+    # IDs ainda cadastrados que foram sinalizados como possíveis duplicatas da propriedade
+    def get_possible_duplicates(self, property_id):
+        with self.lock.read():
+            return [other for other in self.possible_duplicates.get(property_id, []) if self.property_index.get(other)]
+
+    # Alteração de campos indexados: a propriedade sai dos índices e volta uma única vez ao final
+    @contextmanager
+    def updating_property(self, property: Property):
+        with self.lock.write():
+            if self.property_index.get(property.id) is not property:
+                yield  # Alteração aninhada (ou propriedade já removida): quem abriu a primeira reindexa
+                return
+            self.property_index.remove(property)
+            try:
+                yield
+            finally:
+                self.property_index.add(property)
+
+    # Altera a disponibilidade mantendo índices e cache coerentes
+    def set_property_availability(self, property: Property, available):
+        with self.lock.write():
+            property._set_available(available)
+            self.property_index.update_available(property)
+
+    # Retorna todas as propriedades (quem percorrer a lista deve manter a trava de leitura)
     def get_properties(self):
         return self.properties
 
     # Adiciona uma visita
     def add_visit(self, visit: Visit):
-        self.visits.append(visit)
+        with self.lock.write():
+            # Sem ID, a visita recebe o próximo livre sob a mesma trava da inserção
+            if visit._id is None:
+                visit._id = self._next_visit_id
+            self.visits.append(visit)
+            self._next_visit_id = max(self._next_visit_id, visit._id + 1)
+            visit._track("create")
+
+    # Próximo ID livre de visita (para cargas em lote; add_visit atribui o ID de visitas sem ID)
+    def new_visit_id(self):
+        return self._next_visit_id
 
     # Retorna todas as visitas
     def get_visits(self):
@@ -569,12 +1941,97 @@ class Database:
 
     # Adiciona uma avaliação
     def add_review(self, review: Review):
-        self.reviews.append(review)
+        with self.lock.write():
+            review._id = self._next_review_id
+            self._next_review_id += 1
+            self.reviews.append(review)
+            review._track("create")
 
     # Retorna todas as avaliações
     def get_reviews(self):
         return self.reviews
 
+    # Remove uma avaliação em O(1) (lápide)
+    def remove_review(self, review: Review):
+        with self.lock.write():
+            self.reviews.remove(review)
+            review._track("delete")
+
+    # Registra uma função chamada a cada compactação com os IDs de propriedades e usuários removidos
+    def add_compaction_hook(self, hook):
+        # Métodos são guardados por referência fraca para não manter o controller vivo
+        self._compaction_hooks.append(weakref.WeakMethod(hook) if hasattr(hook, "__self__") else (lambda: hook))
+
+    def tombstones(self):
+        return self.properties.tombstones + self.users.tombstones + self.visits.tombstones + self.reviews.tombstones
+
+    def compact(self):
+        "Descarta as lápides e remove em lote visitas, avaliações e consultas de propriedades e usuários excluídos"
+        with self.lock.write():
+            removed_properties = self.properties.compact()
+            removed_users = self.users.compact()
+            property_ids = {prop.id for prop in removed_properties}
+            user_ids = {user.id for user in removed_users}
+
+            # Visitas e avaliações ligadas aos registros removidos ganham lápides e saem na mesma passada
+            for visit in self.visits:
+                if visit._property.id in property_ids or visit._client.id in user_ids \
+                        or getattr(visit._agent, "id", None) in user_ids:
+                    self.visits.remove(visit)
+            for review in self.reviews:
+                if review.property_id in property_ids or review._user in user_ids:
+                    self.reviews.remove(review)
+            removed_visits = self.visits.compact()
+            removed_reviews = self.reviews.compact()
+            for record in removed_visits + removed_reviews:
+                if record._tracked:
+                    record._track("delete")  # Removidos em cascata (os excluídos diretamente já registraram)
+
+            # Listas mantidas por agentes e clientes
+            for agent in {id(prop.agent): prop.agent for prop in removed_properties if isinstance(prop.agent, Agent)}.values():
+                agent._properties = [prop for prop in agent._properties if prop.id not in property_ids]
+            removed_visit_ids = {id(visit) for visit in removed_visits}
+            for client in {id(visit._client): visit._client for visit in removed_visits}.values():
+                client._scheduled_visits = [v for v in client._scheduled_visits if id(v) not in removed_visit_ids]
+            for property_id in property_ids:
+                self.possible_duplicates.pop(property_id, None)
+
+            summary = {
+                "properties": len(removed_properties),
+                "users": len(removed_users),
+                "visits": len(removed_visits),
+                "reviews": len(removed_reviews),
+                "inquiries": 0
+            }
+            live_hooks = []
+            for reference in self._compaction_hooks:
+                hook = reference()
+                if hook is not None:
+                    summary["inquiries"] += hook(property_ids, user_ids) or 0
+                    live_hooks.append(reference)
+            self._compaction_hooks = live_hooks
+        return summary
+
+    def start_compactor(self, interval_seconds=60, min_tombstones=1000):
+        # Compacta em segundo plano quando as lápides acumuladas passam do limite
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._stop_compactor.clear()
+
+        def run():
+            while not self._stop_compactor.wait(interval_seconds):
+                if self.tombstones() >= min_tombstones:
+                    self.compact()
+
+        self._compactor = threading.Thread(target=run, name="database-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        self._stop_compactor.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
     # Database inicial de propriedades
     def initialize_data(self):
         # Propriedades predefinidas
@@ -618,12 +2075,45 @@ class Database:
 # Instância global do banco de dados para ser usada em todo o sistema
 db = Database()
 
+# Cache global de resultados de buscas e análises de mercado
+query_cache = QueryCache(db.property_index.versions)
+
+# Sessões autenticadas compartilhadas pelos pontos de entrada
+session_store = SessionStore()
+
 #market_analysis_controller.py
 class MarketAnalysisController:
     def __init__(self, property_controller):
         self.property_controller = property_controller
+        self.valuation = ValuationModel()
 
     def get_market_analysis(self, location):
+        with db.lock.read():
+            partitions = db.property_index.partitions_for(location=location)
+            analysis = query_cache.get_or_compute(
+                ("market", location.lower()), partitions, lambda: self._compute_market_analysis(location)
+            )
+        return dict(analysis) if analysis else analysis
+
+    def get_market_report(self, group_by="location", workers=None):
+        # Todas as localizações de uma vez, sem uma varredura do catálogo por cidade
+        return build_market_report(group_by, workers)
+
+    def get_rental_yields(self, by_category=True, min_listings=1, limit=None):
+        # Ranking a partir dos agregados mantidos pelo índice, sem percorrer as propriedades
+        with db.lock.read():
+            table = db.property_index.yields.table(by_category, min_listings)
+        return table[:limit] if limit else table
+
+    def get_rental_yield(self, city, property_category=None):
+        with db.lock.read():
+            return db.property_index.yields.segment(city, property_category)
+
+    def estimate_price(self, prop, k=None):
+        # Comparáveis próximos e recentes da mesma categoria e transação (árvore k-d pré-calculada por segmento)
+        return self.valuation.estimate_property(prop, k)
+
+    def _compute_market_analysis(self, location):
         # Obtém todas as propriedades na localização selecionada
         properties = self.property_controller.search_property_by_location(location)
 
@@ -648,26 +2138,334 @@ class MarketAnalysisController:
             "num_rent": num_rent     
         }
 
+#market_report.py
+import csv
+from concurrent.futures import ProcessPoolExecutor
+class LocationAggregate:
+    "Estatísticas parciais de uma localização; agregados parciais podem ser combinados com merge()"
+
+    def __init__(self):
+        self.count = 0
+        self.total_price = 0.0
+        self.min_price = None
+        self.max_price = None
+        self.num_sale = 0
+        self.num_rent = 0
+        self.sale_total = 0.0
+        self.rent_total = 0.0
+        self.num_available = 0
+        self.rating_sum = 0.0
+        self.rating_count = 0
+
+    def add(self, price, transaction_type, available, rating_sum, rating_count):
+        self.count += 1
+        self.total_price += price
+        self.min_price = price if self.min_price is None else min(self.min_price, price)
+        self.max_price = price if self.max_price is None else max(self.max_price, price)
+        if transaction_type == "Venda":
+            self.num_sale += 1
+            self.sale_total += price
+        else:
+            self.num_rent += 1
+            self.rent_total += price
+        if available:
+            self.num_available += 1
+        self.rating_sum += rating_sum
+        self.rating_count += rating_count
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_price += other.total_price
+        for bound, pick in (("min_price", min), ("max_price", max)):
+            mine, theirs = getattr(self, bound), getattr(other, bound)
+            setattr(self, bound, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        self.num_sale += other.num_sale
+        self.num_rent += other.num_rent
+        self.sale_total += other.sale_total
+        self.rent_total += other.rent_total
+        self.num_available += other.num_available
+        self.rating_sum += other.rating_sum
+        self.rating_count += other.rating_count
+        return self
+
+    def to_dict(self, location):
+        return {
+            "location": location,
+            "num_properties": self.count,
+            "avg_price": self.total_price / self.count if self.count else 0,
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+            "num_sale": self.num_sale,
+            "num_rent": self.num_rent,
+            "avg_sale_price": self.sale_total / self.num_sale if self.num_sale else None,
+            "avg_rent_price": self.rent_total / self.num_rent if self.num_rent else None,
+            "num_available": self.num_available,
+            "num_reviews": self.rating_count,
+            "avg_rating": self.rating_sum / self.rating_count if self.rating_count else None
+        }
+
+REPORT_FIELDS = list(LocationAggregate().to_dict("").keys())
+
+def aggregate_rows(rows):
+    "Agrupa linhas (chave, preço, transação, disponível, soma das notas, nº de notas) em uma passada"
+    partial = {}
+    for key, price, transaction_type, available, rating_sum, rating_count in rows:
+        aggregate = partial.get(key)
+        if aggregate is None:
+            aggregate = partial[key] = LocationAggregate()
+        aggregate.add(price, transaction_type, available, rating_sum, rating_count)
+    return partial
+
+def report_group_key(location, group_by):
+    # "city" usa o trecho após a última vírgula ("Centro, São Paulo" -> "São Paulo")
+    if group_by == "city":
+        return location.rsplit(",", 1)[-1].strip()
+    return location
+
+def build_market_report(group_by="location", workers=None, parallel_threshold=200_000):
+    "Relatório por localização em uma única passada sobre o catálogo, opcionalmente em vários processos"
+    if group_by not in ("location", "city"):
+        raise ValueError("Agrupamento inválido. Use: location ou city")
+    with db.lock.read():
+        ratings = {}
+        for review in db.reviews:
+            rating_sum, rating_count = ratings.get(review.property_id, (0, 0))
+            ratings[review.property_id] = (rating_sum + review.rating, rating_count + 1)
+        # Linhas compactas (tuplas) são baratas de enviar aos processos auxiliares
+        rows = [
+            (report_group_key(prop.location, group_by), prop.price, prop.transaction_type, prop.available)
+            + ratings.get(prop.id, (0, 0))
+            for prop in db.properties
+        ]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(rows) >= parallel_threshold:
+        chunk_size = -(-len(rows) // workers)
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(aggregate_rows, chunks))
+    else:
+        partials = [aggregate_rows(rows)]
+
+    merged = partials[0]
+    for partial in partials[1:]:
+        for key, aggregate in partial.items():
+            if key in merged:
+                merged[key].merge(aggregate)
+            else:
+                merged[key] = aggregate
+    return [merged[key].to_dict(key) for key in sorted(merged)]
+
+def write_market_report(report, output, output_format="jsonl", fields=None):
+    "Grava o relatório linha a linha em CSV ou JSONL"
+    if output_format == "csv":
+        writer = csv.DictWriter(output, fieldnames=fields or REPORT_FIELDS)
+        writer.writeheader()
+        for row in report:
+            writer.writerow(row)
+    elif output_format == "jsonl":
+        for row in report:
+            output.write(json.dumps(row, ensure_ascii=False) + "\n")
+    else:
+        raise ValueError("Formato inválido. Use: csv ou jsonl")
+
 #mortgage_controller.py
 class MortgageController:
     def calculate_mortgage(self, loan_amount, annual_rate, years):
         calculator = Mortgage(loan_amount, annual_rate, years)
         return calculator
 
+#property_query.py
+from heapq import nlargest, nsmallest
+from itertools import islice
+class PropertyQuery:
+    "Consulta composta de propriedades: cada critério é opcional e os métodos podem ser encadeados"
+    SORT_FIELDS = {"id", "price", "title", "location"}
+
+    def __init__(self):
+        self.location = None
+        self.property_category = None
+        self.transaction_type = None
+        self.price_min = None
+        self.price_max = None
+        self.available = None
+        self.sort_by = None
+        self.descending = False
+        self.limit = None
+        self.offset = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        "Monta a consulta a partir de um dicionário (parâmetros HTTP ou linhas JSON)"
+        def value(name, convert=str, default=None):
+            raw = data.get(name)
+            if raw is None or raw == "":
+                return default
+            if convert is bool and isinstance(raw, str):
+                return raw.lower() in ("1", "true", "sim", "s")
+            try:
+                return convert(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"Parâmetro inválido: {name}")
+
+        query = (
+            cls()
+            .where_location(value("location"))
+            .where_category(value("category"))
+            .where_transaction(value("transaction"))
+            .where_price(value("min_price", float), value("max_price", float))
+            .paginate(value("limit", int), value("offset", int, 0))
+        )
+        available = value("available", bool)
+        if available is not None:
+            query.where_available(available)
+        if value("sort"):
+            query.order_by(value("sort"), value("desc", bool, False))
+        return query
+
+    def where_location(self, location):
+        self.location = location or None
+        return self
+
+    def where_category(self, property_category):
+        self.property_category = property_category or None
+        return self
+
+    def where_transaction(self, transaction_type):
+        self.transaction_type = transaction_type or None
+        return self
+
+    def where_price(self, price_min=None, price_max=None):
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise ValueError("O preço mínimo não pode ser maior que o preço máximo.")
+        self.price_min = price_min
+        self.price_max = price_max
+        return self
+
+    def where_available(self, available=True):
+        self.available = available
+        return self
+
+    def order_by(self, field, descending=False):
+        if field not in self.SORT_FIELDS:
+            raise ValueError(f"Campo de ordenação inválido. Use: {self.SORT_FIELDS}")
+        self.sort_by = field
+        self.descending = descending
+        return self
+
+    def paginate(self, limit=None, offset=0):
+        if limit is not None and limit < 0:
+            raise ValueError("O limite não pode ser negativo.")
+        if offset < 0:
+            raise ValueError("O deslocamento não pode ser negativo.")
+        self.limit = limit
+        self.offset = offset
+        return self
+
+    def key(self):
+        # Forma normalizada da consulta (útil para comparar ou armazenar consultas equivalentes)
+        return (
+            self.location.lower() if self.location else None,
+            self.property_category.lower() if self.property_category else None,
+            self.transaction_type,
+            self.price_min,
+            self.price_max,
+            self.available,
+            self.sort_by,
+            self.descending,
+            self.limit,
+            self.offset
+        )
+
+    def matches(self, prop):
+        if self.location and self.location.lower() not in prop.location.lower():
+            return False
+        if self.property_category and prop.property_category.lower() != self.property_category.lower():
+            return False
+        if self.transaction_type and prop.transaction_type != self.transaction_type:
+            return False
+        if self.price_min is not None and prop.price < self.price_min:
+            return False
+        if self.price_max is not None and prop.price > self.price_max:
+            return False
+        if self.available is not None and prop.available != self.available:
+            return False
+        return True
+
+    def __str__(self):
+        return f"Consulta: {self.key()}"
+
+class QueryPlanner:
+    "Escolhe o índice mais seletivo para uma consulta e avalia os demais critérios sob demanda"
+
+    def __init__(self, index):
+        self._index = index
+
+    def plan(self, query):
+        # Estima o número de candidatos de cada índice aplicável e escolhe o menor
+        options = []
+        if query.property_category:
+            bucket = self._index.by_category(query.property_category)
+            options.append((len(bucket), "category", lambda bucket=bucket: iter(bucket)))
+        if query.transaction_type:
+            bucket = self._index.by_transaction(query.transaction_type)
+            options.append((len(bucket), "transaction", lambda bucket=bucket: iter(bucket)))
+        if query.location:
+            buckets = self._index.location_buckets(query.location)
+            options.append((
+                sum(len(bucket) for bucket in buckets),
+                "location",
+                lambda: (prop for bucket in buckets for prop in bucket.values())
+            ))
+        if query.price_min is not None or query.price_max is not None:
+            descending = query.sort_by == "price" and query.descending
+            options.append((
+                self._index.count_price_range(query.price_min, query.price_max),
+                "price",
+                lambda: self._index.by_price_range(query.price_min, query.price_max, descending)
+            ))
+
+        if not options:
+            if query.sort_by == "price":
+                # Sem filtros indexados: percorre o índice de preço já na ordem pedida
+                return "price", lambda: self._index.by_price_range(descending=query.descending)
+            return "scan", lambda: iter(list(self._index.all()))
+
+        _, index_name, candidates = min(options, key=lambda option: option[0])
+        return index_name, candidates
+
+    def execute(self, query):
+        index_name, candidates = self.plan(query)
+        # Os critérios são reavaliados de forma preguiçosa sobre os candidatos
+        results = (prop for prop in candidates() if query.matches(prop))
+
+        already_sorted = query.sort_by is None or (query.sort_by == "price" and index_name == "price")
+        if not already_sorted:
+            sort_key = lambda prop: (getattr(prop, query.sort_by), prop.id)
+            if query.limit is not None:
+                # Só os primeiros offset + limit elementos precisam ser ordenados
+                select = nlargest if query.descending else nsmallest
+                results = iter(select(query.offset + query.limit, results, key=sort_key))
+            else:
+                results = iter(sorted(results, key=sort_key, reverse=query.descending))
+
+        stop = None if query.limit is None else query.offset + query.limit
+        return list(islice(results, query.offset, stop))
+
 #property_controller.py
 class PropertyController:
     def __init__(self):
         self._properties = db.get_properties()
 
     def add_property(self, property):
-        # Verifica se já existe uma propriedade com o mesmo título e localização
-        if any(prop.title == property.title and prop.location == property.location for prop in self._properties):
-            raise ValueError("Propriedade já cadastrada.")
+        # A verificação de duplicidade (mesmo título e localização) é feita pelo banco de dados
+        # sob a trava de escrita, evitando que duas threads cadastrem a mesma propriedade
         db.add_property(property)               # Adiciona a propriedade ao banco de dados
         self._properties = db.get_properties()  # Adiciona a propriedade à lista local
         return property
     
-    def create_property(self, property_type, title, description, price, location, transaction_type, agent, virtual_tour_url=None): #Cria uma nova propriedade usando o Factory Pattern
+    def create_property(self, property_type, title, description, price, location, transaction_type, agent, virtual_tour_url=None,
+                        available=True, listed_at=None): #Cria uma nova propriedade usando o Factory Pattern
         # Usa o PropertyFactory para criar a propriedade do tipo adequado
         property = PropertyFactory.create_property(
             property_type = property_type,
@@ -680,45 +2478,125 @@ class PropertyController:
             agent = agent,
             virtual_tour_url = virtual_tour_url
         )
+        # Disponibilidade e data do anúncio são definidas antes da inserção, já indexadas com o restante
+        property.available = available
+        if listed_at is not None:
+            property.listed_at = listed_at
         
         # Adiciona a propriedade criada ao banco de dados
         return self.add_property(property)
 
     def list_properties(self):
-        return [vars(prop) for prop in self._properties]
+        with db.lock.read():
+            return [vars(prop) for prop in self._properties]
 
     def find_property_by_id(self, property_id):
-        for prop in self._properties:
-            if prop.id == property_id:
-                return prop
-        return None
+        with db.lock.read():
+            return db.property_index.get(property_id)
 
     def update_property(self, property_id, title=None, description=None, price=None, location=None):
-        property_to_update = self.find_property_by_id(property_id)
-        if property_to_update:
-            property_to_update.update_details(title, description, price, location)
-            return property_to_update
-        return None
+        with db.lock.write():
+            property_to_update = self.find_property_by_id(property_id)
+            if property_to_update:
+                changes = {"title": title, "description": description, "price": price, "location": location}
+                # Os setters da propriedade reindexam no banco (uma vez só, ao final de update_details)
+                property_to_update.update_details(**{attr: value for attr, value in changes.items() if value is not None})
+                return property_to_update
+            return None
+
+    def switch_property_status(self, property_id):
+        with db.lock.write():
+            prop = self.find_property_by_id(property_id)
+            if prop:
+                db.set_property_availability(prop, not prop.available)
+            return prop
 
     def delete_property(self, property_id):
-        property_to_delete = self.find_property_by_id(property_id)
-        if property_to_delete:
-            db.properties.remove(property_to_delete)     # Remove do banco de dados
-            self._properties.remove(property_to_delete)  # Remove da lista local
-            return True
-        return False
+        with db.lock.write():
+            property_to_delete = self.find_property_by_id(property_id)
+            if property_to_delete:
+                # Lápide em O(1); visitas, avaliações e consultas relacionadas saem na compactação
+                db.remove_property(property_to_delete)
+                return True
+            return False
 
     def search_all_properties(self):
-        return [prop for prop in self._properties]
+        with db.lock.read():
+            return [prop for prop in self._properties]
+
+    # As buscas passam pelo cache global; cada chamada recebe uma cópia da lista
+    def _cached_search(self, key, partitions, compute):
+        with db.lock.read():
+            return list(query_cache.get_or_compute(key, partitions(), compute))
 
     def search_property_by_type(self, property_category ):
-        return [prop for prop in self._properties if prop.property_category.lower() == property_category.lower()]
+        return self._cached_search(
+            ("type", property_category.lower()),
+            lambda: db.property_index.partitions_for(property_category=property_category),
+            lambda: [prop for prop in self._properties if prop.property_category.lower() == property_category.lower()]
+        )
 
     def search_property_by_location(self, location):
-        return [prop for prop in self._properties if location.lower() in prop.location.lower()]
+        return self._cached_search(
+            ("location", location.lower()),
+            lambda: db.property_index.partitions_for(location=location),
+            lambda: [prop for prop in self._properties if location.lower() in prop.location.lower()]
+        )
 
     def search_property_by_price_range(self, price_min, price_max):
-        return [prop for prop in self._properties if price_min <= prop.price <= price_max]
+        return self._cached_search(
+            ("price", price_min, price_max),
+            db.property_index.partitions_for,
+            lambda: [prop for prop in self._properties if price_min <= prop.price <= price_max]
+        )
+
+    def search_properties(self, query):
+        # Busca combinada: o planejador escolhe o índice mais seletivo para a consulta
+        return self._cached_search(
+            ("query", query.key()),
+            lambda: db.property_index.partitions_for(query.location, query.property_category),
+            lambda: QueryPlanner(db.property_index).execute(query)
+        )
+
+    def search_affordable(self, max_monthly_payment, annual_rate, years, down_payment=0, limit=20):
+        # Inverte a fórmula da parcela e percorre o índice de preços de "Venda" a partir do teto
+        max_price = Mortgage.max_affordable_price(max_monthly_payment, annual_rate, years, down_payment)
+        with db.lock.read():
+            listings = (prop for prop in db.property_index.by_transaction_price("Venda", max_price) if prop.available)
+            return max_price, list(islice(listings, limit))
+
+    def search_affordable_many(self, max_monthly_payments, annual_rates, years, down_payments=0, limit=20):
+        # Muitos perfis em uma chamada: preços máximos vetorizados e contagens por searchsorted
+        # (contagens e listas consideram apenas anúncios disponíveis)
+        max_prices = Mortgage.max_affordable_prices(max_monthly_payments, annual_rates, years, down_payments)
+        with db.lock.read():
+            sale_prices = db.property_index.transaction_price_array("Venda")
+            within_budget = np.searchsorted(sale_prices, max_prices, side="right")
+            results = []
+            for max_price, count in zip(max_prices.tolist(), within_budget.tolist()):
+                listings = (prop for prop in db.property_index.by_transaction_price("Venda", max_price) if prop.available)
+                results.append({
+                    "max_price": max_price,
+                    "within_budget": count,
+                    "properties": list(islice(listings, limit)) if limit else []
+                })
+            return results
+
+    def facet_counts(self, query):
+        # Contagens por categoria, transação, disponibilidade e cidade por interseção de bitmaps
+        with db.lock.read():
+            return db.property_index.facet_counts(query)
+
+    def cache_stats(self):
+        return query_cache.stats()
+
+    def find_possible_duplicates(self, property_id):
+        return db.get_possible_duplicates(property_id)
+
+    def find_duplicate_clusters(self):
+        # Tarefa em lote: agrupa todas as quase duplicatas do catálogo
+        with db.lock.read():
+            return db.property_index.duplicates.clusters()
 
 #review_controller.py
 class ReviewController:
@@ -741,26 +2619,32 @@ class ReviewController:
         return new_review
 
     def list_reviews(self):
-        return [vars(review) for review in db.reviews]
+        with db.lock.read():
+            return [vars(review) for review in db.reviews]
 
     def find_review_by_id(self, review_id):
-        for review in db.reviews:
-            if review.id == review_id:
-                return review
-        return None
+        with db.lock.read():
+            for review in db.reviews:
+                if review.id == review_id:
+                    return review
+            return None
 
     def delete_review(self, review_id):
-        review_to_delete = self.find_review_by_id(review_id)
-        if review_to_delete:
-            db.reviews.remove(review_to_delete)
-            return True
-        return False
+        with db.lock.write():
+            review_to_delete = self.find_review_by_id(review_id)
+            if review_to_delete:
+                db.remove_review(review_to_delete)
+                return True
+            return False
 
     def list_all_reviews(self):
-        return db.get_reviews()
+        # Cópia da lista, para que o chamador possa percorrê-la sem manter a trava
+        with db.lock.read():
+            return list(db.get_reviews())
 
     def get_reviews_by_property(self, property_id):
-        return [review for review in db.reviews if review.property_id == property_id]
+        with db.lock.read():
+            return [review for review in db.reviews if review.property_id == property_id]
 
     def get_average_rating(self, property_id):
         reviews = self.get_reviews_by_property(property_id)
@@ -775,8 +2659,7 @@ class UserController:
         email = input("Digite seu email: ")
         password = input("Digite sua senha: ")
 
-        # Procura o usuário com o email e senha correspondentes
-        user = next((user for user in db.get_users() if user.email == email and user.password == password), None)
+        user = self.authenticate(email, password)
 
         if user:
             print(f"Login realizado com sucesso! Bem-vindo, {user.name}.")
@@ -785,6 +2668,30 @@ class UserController:
             print("Erro: Email ou senha incorretos.")
             return None
 
+    # Confere email e senha sem interação com o terminal
+    def authenticate(self, email, password):
+        user = db.find_user_by_email(email)
+        if user is None:
+            verify_password(password, DUMMY_PASSWORD_HASH)
+            return None
+        if user.check_password(password):
+            return user
+        return None
+
+    # Autentica uma vez e devolve um token de sessão opaco (ou None)
+    def create_session(self, email, password):
+        user = self.authenticate(email, password)
+        if user is None:
+            return None
+        return session_store.create(user)
+
+    # Autenticação por requisição: apenas uma consulta ao armazenamento de sessões
+    def user_from_token(self, token):
+        return session_store.get(token)
+
+    def end_session(self, token):
+        return session_store.revoke(token)
+
     # Cadastra um novo usuário
     def register_user(self, name, email, password, user_type):
         # Valida o tipo de usuário
@@ -793,25 +2700,35 @@ class UserController:
             print(f"Erro: Tipo de usuário inválido. Escolha entre {valid_types}.")
             return None
 
-        # Verifica se o email já foi cadastrado
-        if any(user.email == email for user in db.get_users()):
+        # Verifica se o email já foi cadastrado antes de gastar o hash
+        if db.find_user_by_email(email):
             print(f"Erro: O email {email} já está em uso.")
             return None
 
-        # Cria um novo usuário (instanciando Client ou Agent)
-        if user_type.capitalize() == "Cliente":
-            new_user = Client(len(db.get_users()) + 1, name, email, password)
-        elif user_type.capitalize() == "Agente":
-            new_user = Agent(len(db.get_users()) + 1, name, email, password)
+        # O hash é lento de propósito e roda fora da trava, sem bloquear leitores e escritores
+        password_hash = hash_password(password)
+
+        # Nova verificação do email, geração do ID e inserção acontecem sob a mesma trava de escrita
+        with db.lock.write():
+            if db.find_user_by_email(email):
+                print(f"Erro: O email {email} já está em uso.")
+                return None
 
-        # Adiciona o novo usuário ao banco de dados
-        db.add_user(new_user)
+            # Cria um novo usuário (instanciando Client ou Agent) com a senha já transformada em hash
+            if user_type.capitalize() == "Cliente":
+                new_user = Client(db.new_user_id(), name, email, password_hash)
+            elif user_type.capitalize() == "Agente":
+                new_user = Agent(db.new_user_id(), name, email, password_hash)
+
+            # Adiciona o novo usuário ao banco de dados
+            db.add_user(new_user)
         print(f"Usuário {name} registrado com sucesso como {user_type.capitalize()}!")
         return new_user
 
     # Lista todos os usuários
     def list_users(self):
-        users = db.get_users()
+        with db.lock.read():
+            users = list(db.get_users())
         if not users:
             print("Nenhum usuário cadastrado.")
         for user in users:
@@ -819,10 +2736,13 @@ class UserController:
 
     # Deleta um usuário pelo ID
     def delete_user(self, user_id):
-        users = db.get_users()
-        user_to_delete = next((user for user in users if user.id == user_id), None)
+        # Remoção O(1) por lápide; visitas, avaliações e consultas do usuário saem na compactação
+        with db.lock.write():
+            user_to_delete = db.find_user_by_id(user_id)
+            if user_to_delete:
+                db.remove_user(user_to_delete)
+                session_store.revoke_user(user_to_delete)
         if user_to_delete:
-            db.users.remove(user_to_delete)
             print(f"Usuário {user_to_delete.name} excluído com sucesso.")
             return True
         print(f"Erro: Usuário com ID {user_id} não encontrado.")
@@ -845,10 +2765,7 @@ class UserController:
             print(agent)
 
     def find_user_by_id(self, user_id):
-        for user in db.get_users():
-            if user.id == user_id:
-                return user
-        return None
+        return db.find_user_by_id(user_id)
 
 #visit controller
 class VisitController:
@@ -870,36 +2787,2062 @@ class VisitController:
         if not client:
             raise ValueError("Cliente não encontrado.")
 
-        # Cria a visita
+        # Cria a visita (com id=None o ID é atribuído pelo banco de dados)
         new_visit = Visit(id, client, agent, property_obj, date_time)
         db.add_visit(new_visit)
         return new_visit
 
     def list_visits(self):
-        return db.get_visits()  # Retorna todas as visitas do banco de dados
+        with db.lock.read():
+            return list(db.get_visits())  # Retorna uma cópia de todas as visitas do banco de dados
+
+    def list_visits_for(self, user):
+        # Visitas em que o usuário é o cliente ou o agente responsável
+        with db.lock.read():
+            return [visit for visit in db.get_visits() if visit._client is user or visit._agent is user]
 
     def find_visit_by_id(self, visit_id):
-        for visit in db.get_visits():
-            if visit._id == visit_id:
-                return visit
-        return None
+        with db.lock.read():
+            for visit in db.get_visits():
+                if visit._id == visit_id:
+                    return visit
+            return None
 
     def cancel_visit(self, visit_id):
-        visit_to_cancel = self.find_visit_by_id(visit_id)
-        if visit_to_cancel:
-            visit_to_cancel.cancel()  # Altera o status para "Cancelado!"
-            return True
-        return False
+        with db.lock.write():
+            visit_to_cancel = self.find_visit_by_id(visit_id)
+            if visit_to_cancel:
+                visit_to_cancel.cancel()  # Altera o status para "Cancelado!"
+                return True
+            return False
 
     def reschedule_visit(self, visit_id, new_date_time):
-        visit_to_reschedule = self.find_visit_by_id(visit_id)
-        if visit_to_reschedule:
-            visit_to_reschedule.reschedule(new_date_time)  # Reagenda a visita
-            return True
-        return False
+        with db.lock.write():
+            visit_to_reschedule = self.find_visit_by_id(visit_id)
+            if visit_to_reschedule:
+                visit_to_reschedule.reschedule(new_date_time)  # Reagenda a visita
+                return True
+            return False
+
+#instrumentation.py
+import os
+from functools import wraps
+class MethodMetrics:
+    "Contadores e histograma de latência de um método instrumentado"
+
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * len(buckets)
+        self.clear()
+
+    def clear(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.bucket_counts = [0] * len(self.bucket_counts)
+
+class MetricsRegistry:
+    "Registro de métricas por (classe, método), exportável em texto Prometheus ou JSON"
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)  # segundos
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def metric(self, owner, method):
+        with self._lock:
+            return self._metrics.setdefault((owner, method), MethodMetrics(self.BUCKETS))
+
+    def observe(self, metric, seconds, failed):
+        position = bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            metric.calls += 1
+            metric.total_seconds += seconds
+            if failed:
+                metric.errors += 1
+            if position < len(self.BUCKETS):
+                metric.bucket_counts[position] += 1
+
+    def reset(self):
+        # Zera no lugar: os métodos instrumentados guardam referências aos próprios objetos de métrica
+        with self._lock:
+            for metric in self._metrics.values():
+                metric.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: (metric.calls, metric.errors, metric.total_seconds, list(metric.bucket_counts))
+                for key, metric in self._metrics.items()
+            }
+
+    def to_json(self):
+        result = []
+        for (owner, method), (calls, errors, total, buckets) in sorted(self.snapshot().items()):
+            result.append({
+                "class": owner,
+                "method": method,
+                "calls": calls,
+                "errors": errors,
+                "total_seconds": total,
+                "mean_seconds": total / calls if calls else 0,
+                "buckets": {str(bound): count for bound, count in zip(self.BUCKETS, buckets)}
+            })
+        return result
+
+    def to_prometheus(self):
+        snapshot = sorted(self.snapshot().items())
+        labels = lambda owner, method: f'class="{owner}",method="{method}"'
+        lines = [
+            "# HELP portal_calls_total Chamadas por método instrumentado.",
+            "# TYPE portal_calls_total counter"
+        ]
+        lines += [f"portal_calls_total{{{labels(*key)}}} {calls}" for key, (calls, _, _, _) in snapshot]
+        lines += [
+            "# HELP portal_errors_total Chamadas que terminaram com exceção.",
+            "# TYPE portal_errors_total counter"
+        ]
+        lines += [f"portal_errors_total{{{labels(*key)}}} {errors}" for key, (_, errors, _, _) in snapshot]
+        lines += [
+            "# HELP portal_call_duration_seconds Latência das chamadas.",
+            "# TYPE portal_call_duration_seconds histogram"
+        ]
+        for key, (calls, _, total, buckets) in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, buckets):
+                cumulative += count
+                lines.append(f'portal_call_duration_seconds_bucket{{{labels(*key)},le="{bound}"}} {cumulative}')
+            lines.append(f'portal_call_duration_seconds_bucket{{{labels(*key)},le="+Inf"}} {calls}')
+            lines.append(f"portal_call_duration_seconds_sum{{{labels(*key)}}} {total}")
+            lines.append(f"portal_call_duration_seconds_count{{{labels(*key)}}} {calls}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+INSTRUMENTED_CLASSES = [
+    "PropertyController", "UserController", "VisitController", "ReviewController",
+    "MarketAnalysisController", "MortgageController"
+]
+_original_methods = {}  # (classe, nome) -> função original
+
+def _instrument(owner, name, function):
+    metric = metrics.metric(owner.__name__, name)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.observe(metric, time.perf_counter() - start, failed)
+    return wrapper
+
+def enable_instrumentation():
+    "Envolve os métodos públicos dos controllers e Property.get_coordinates com coleta de métricas"
+    # Quando desativada, os métodos originais ficam intactos e o custo é zero
+    targets = [(globals()[name], method) for name in INSTRUMENTED_CLASSES
+               for method, value in vars(globals()[name]).items()
+               if callable(value) and not method.startswith("_")]
+    targets.append((Property, "get_coordinates"))
+    for owner, name in targets:
+        if (owner, name) in _original_methods:
+            continue
+        original = vars(owner)[name]
+        _original_methods[(owner, name)] = original
+        setattr(owner, name, _instrument(owner, name, original))
+
+def disable_instrumentation():
+    "Restaura os métodos originais"
+    for (owner, name), original in _original_methods.items():
+        setattr(owner, name, original)
+    _original_methods.clear()
+
+def instrumentation_enabled():
+    return bool(_original_methods)
+
+#recommender.py
+import numpy as np
+class PropertyRecommender:
+    "Recomendações por similaridade de cosseno entre vetores de características das propriedades"
+    CATEGORIES = ["Casa", "Apartamento", "Terreno"]
+    TRANSACTIONS = ["Venda", "Aluguel"]
+    WEIGHTS = {"category": 1.0, "transaction": 1.0, "city": 1.5, "price": 1.0, "available": 0.3}
+    # Colunas densas: categorias, transações, preço e disponibilidade. A cidade não vira colunas one-hot:
+    # cada linha guarda o código inteiro da cidade e o peso normalizado dela
+    PRICE_COLUMN = len(CATEGORIES) + len(TRANSACTIONS)
+    DENSE_COLUMNS = PRICE_COLUMN + 2
+
+    def __init__(self, weights=None, auto_refresh=True):
+        self.weights = dict(self.WEIGHTS, **(weights or {}))
+        self.auto_refresh = auto_refresh
+        self._version = None
+        self._feed_position = 0
+        self._lock = threading.RLock()
+
+    # Campos que mudam o vetor de uma propriedade; os demais são ignorados pelo recomendador
+    VECTOR_FIELDS = {"price", "available", "location", "property_category", "transaction_type"}
+
+    def is_stale(self):
+        return self._version != db.property_index.versions.get(PropertyIndex.CATALOG) \
+            or self._feed_position != change_feed.last_sequence
+
+    def _ensure_fresh(self):
+        if self._version is None:
+            self.fit()
+        elif self.auto_refresh and self.is_stale() and not self._apply_changes():
+            self.fit()
+
+    def _apply_changes(self):
+        # Consome o change feed linha a linha: cadastros acrescentam linhas, exclusões as retiram do segmento
+        # e alterações refazem só a linha afetada
+        limit = max(self._size // 10, 100)  # Muitas alterações: o fit completo sai mais barato
+        try:
+            changes = change_feed.read(self._feed_position, limit=limit + 1)
+        except ValueError:
+            return False
+        if len(changes) > limit or self._removed > self._size // 2:
+            return False
+        touched = set()
+        removed = set()
+        for change in changes:
+            if change.entity != "property":
+                continue
+            if change.operation == "delete":
+                removed.add(change.entity_id)
+                touched.discard(change.entity_id)
+            elif change.operation == "create" or change.field in self.VECTOR_FIELDS:
+                touched.add(change.entity_id)
+                removed.discard(change.entity_id)
+        with db.lock.read():
+            for property_id in removed:
+                self._remove_row(property_id)
+            for property_id in touched:
+                prop = db.property_index.get(property_id)
+                if prop is None:
+                    self._remove_row(property_id)
+                elif property_id in self._rows:
+                    self._update_row(self._rows[property_id], prop)
+                else:
+                    self._append_row(prop)
+            self._version = db.property_index.versions.get(PropertyIndex.CATALOG)
+        self._feed_position = changes[-1].sequence if changes else self._feed_position
+        return True
+
+    def _city_code(self, location):
+        city = report_group_key(location, "city").lower()
+        if city not in self._city_codes:
+            self._city_codes[city] = len(self._city_codes)
+        return self._city_codes[city]
+
+    def _segment_key(self, row):
+        return int(self._transactions[row]), int(self._categories[row])
+
+    def _update_row(self, row, prop):
+        # As estatísticas de preço do último fit são mantidas até o próximo fit completo
+        old_key = self._segment_key(row)
+        self._prices[row] = prop.price
+        self._available[row] = prop.available
+        self._transactions[row] = self.TRANSACTIONS.index(prop.transaction_type)
+        self._categories[row] = self.CATEGORIES.index(prop.property_category)
+        self._cities[row] = self._city_code(prop.location)
+        mean, std = self._price_stats[int(self._transactions[row])]
+        vector = np.zeros(self.DENSE_COLUMNS)
+        vector[self._categories[row]] = self.weights["category"]
+        vector[len(self.CATEGORIES) + self._transactions[row]] = self.weights["transaction"]
+        vector[self.PRICE_COLUMN] = (np.log1p(prop.price) - mean) / std * self.weights["price"]
+        vector[self.PRICE_COLUMN + 1] = prop.available * self.weights["available"]
+        norm = math.sqrt(float(vector @ vector) + self.weights["city"] ** 2) or 1
+        self._dense[row] = vector / norm
+        self._city_weights[row] = self.weights["city"] / norm
+        new_key = self._segment_key(row)
+        if new_key != old_key:
+            self._segments[old_key] = self._segments[old_key][self._segments[old_key] != row]
+            self._segments[new_key] = np.append(self._segments[new_key], row)
+
+    def _append_row(self, prop):
+        if self._size == len(self._ids):
+            # Capacidade dobrada: inclusões custam O(1) amortizado
+            capacity = max(2 * self._size, 16)
+            for name in ("_ids", "_prices", "_available", "_transactions", "_categories", "_cities",
+                         "_dense", "_city_weights"):
+                array = getattr(self, name)
+                grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+        row = self._size
+        self._size += 1
+        self._ids[row] = prop.id
+        self._rows[prop.id] = row
+        # Segmento provisório; _update_row coloca a linha no segmento certo
+        self._transactions[row] = self.TRANSACTIONS.index(prop.transaction_type)
+        self._categories[row] = self.CATEGORIES.index(prop.property_category)
+        key = self._segment_key(row)
+        self._segments[key] = np.append(self._segments[key], row)
+        self._update_row(row, prop)
+
+    def _remove_row(self, property_id):
+        row = self._rows.pop(property_id, None)
+        if row is None:
+            return
+        key = self._segment_key(row)
+        self._segments[key] = self._segments[key][self._segments[key] != row]
+        self._removed += 1
+
+    def fit(self):
+        "Pré-calcula as colunas densas normalizadas, os códigos de cidade e as linhas de cada segmento (transação, categoria)"
+        with self._lock:
+            with db.lock.read():
+                self._version = db.property_index.versions.get(PropertyIndex.CATALOG)
+                self._feed_position = change_feed.last_sequence
+                properties = list(db.properties)
+
+            count = len(properties)
+            self._size = count
+            self._removed = 0
+            self._city_codes = {}
+            self._ids = np.fromiter((prop.id for prop in properties), dtype=np.int64, count=count)
+            self._rows = {property_id: row for row, property_id in enumerate(self._ids.tolist())}
+            self._prices = np.fromiter((prop.price for prop in properties), dtype=np.float64, count=count)
+            self._available = np.fromiter((prop.available for prop in properties), dtype=bool, count=count)
+            self._transactions = np.fromiter(
+                (self.TRANSACTIONS.index(prop.transaction_type) for prop in properties), dtype=np.int8, count=count)
+            self._categories = np.fromiter(
+                (self.CATEGORIES.index(prop.property_category) for prop in properties), dtype=np.int8, count=count)
+            self._cities = np.fromiter(
+                (self._city_code(prop.location) for prop in properties), dtype=np.int32, count=count)
+
+            # Preço em escala log, padronizado por tipo de transação (aluguel e venda têm escalas diferentes)
+            log_prices = np.log1p(self._prices)
+            self._price_stats = {}
+            standardized = np.zeros(count)
+            for code in range(len(self.TRANSACTIONS)):
+                mask = self._transactions == code
+                mean, std = (log_prices[mask].mean(), log_prices[mask].std() or 1.0) if mask.any() else (0.0, 1.0)
+                self._price_stats[code] = (mean, std)
+                standardized[mask] = (log_prices[mask] - mean) / std
+
+            dense = np.zeros((count, self.DENSE_COLUMNS), dtype=np.float32)
+            rows = np.arange(count)
+            dense[rows, self._categories] = self.weights["category"]
+            dense[rows, len(self.CATEGORIES) + self._transactions] = self.weights["transaction"]
+            dense[:, self.PRICE_COLUMN] = standardized * self.weights["price"]
+            dense[:, self.PRICE_COLUMN + 1] = self._available * self.weights["available"]
+            # Norma do vetor completo: colunas densas mais a única coluna de cidade ativa
+            norms = np.sqrt((dense ** 2).sum(axis=1) + self.weights["city"] ** 2)
+            norms[norms == 0] = 1
+            self._dense = dense / norms[:, None]
+            self._city_weights = (self.weights["city"] / norms).astype(np.float32)
+
+            # (transação, categoria) -> linhas do segmento
+            segment_keys = self._transactions.astype(np.int64) * len(self.CATEGORIES) + self._categories
+            self._segments = {
+                (transaction, category): np.flatnonzero(segment_keys == transaction * len(self.CATEGORIES) + category)
+                for transaction in range(len(self.TRANSACTIONS)) for category in range(len(self.CATEGORIES))
+            }
+        return self
+
+    def _scores(self, rows, dense, city_weights):
+        # Produto interno com o vetor de consulta: parte densa mais o termo da cidade de cada linha
+        return self._dense[rows] @ dense + self._city_weights[rows] * city_weights[self._cities[rows]]
+
+    def _top_k(self, dense, city_weights, segments, k, exclude=(), filters=None):
+        offsets = np.concatenate(segments) if segments else np.zeros(0, dtype=np.int64)
+        if filters is not None:
+            offsets = offsets[filters(offsets)]
+        excluded = [self._rows[property_id] for property_id in exclude if property_id in self._rows]
+        if excluded:
+            offsets = offsets[~np.isin(offsets, excluded)]
+        if offsets.size == 0:
+            return []
+        scores = self._scores(offsets, dense, city_weights)
+        k = min(k, scores.size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self._ids[offsets[i]]), float(scores[i])) for i in best]
+
+    def similar_to(self, property_id, k=10):
+        "Propriedades mais parecidas com a informada (mesma transação e categoria), como pares (id, similaridade)"
+        with self._lock:
+            self._ensure_fresh()
+            row = self._rows.get(property_id)
+            if row is None:
+                raise ValueError("Propriedade não encontrada.")
+            city_weights = np.zeros(len(self._city_codes), dtype=np.float32)
+            city_weights[self._cities[row]] = self._city_weights[row]
+            return self._top_k(self._dense[row], city_weights, [self._segments[self._segment_key(row)]], k,
+                               exclude=[property_id])
+
+    def for_client(self, client, k=10):
+        "Recomendações para o cliente a partir das preferências e do histórico de visitas"
+        with self._lock:
+            self._ensure_fresh()
+            return self._for_client(client, k)
+
+    def _for_client(self, client, k):
+        preferences = client.preferences
+        visited = {visit._property.id for visit in client.list_scheduled_visits()}
+        dense = np.zeros(self.DENSE_COLUMNS, dtype=np.float32)
+        city_weights = np.zeros(len(self._city_codes), dtype=np.float32)
+
+        for category in preferences.categories:
+            dense[self.CATEGORIES.index(category)] = self.weights["category"] / len(preferences.categories)
+        codes = [self.TRANSACTIONS.index(preferences.transaction_type)] if preferences.transaction_type \
+            else list(range(len(self.TRANSACTIONS)))
+        for code in codes:
+            dense[len(self.CATEGORIES) + code] = self.weights["transaction"] / len(codes)
+        cities = [report_group_key(location, "city").lower() for location in preferences.locations]
+        known_cities = [city for city in cities if city in self._city_codes]
+        for city in known_cities:
+            city_weights[self._city_codes[city]] = self.weights["city"] / len(known_cities)
+        if preferences.price_min is not None or preferences.price_max is not None:
+            bounds = [bound for bound in (preferences.price_min, preferences.price_max) if bound is not None]
+            mean, std = self._price_stats[codes[0]]
+            dense[self.PRICE_COLUMN] = (np.log1p(sum(bounds) / len(bounds)) - mean) / std * self.weights["price"]
+        dense[self.PRICE_COLUMN + 1] = self.weights["available"]
+
+        # O histórico de visitas complementa o perfil declarado
+        visited_rows = [self._rows[property_id] for property_id in visited if property_id in self._rows]
+        if visited_rows:
+            history_dense = self._dense[visited_rows].mean(axis=0)
+            history_cities = np.zeros_like(city_weights)
+            np.add.at(history_cities, self._cities[visited_rows], self._city_weights[visited_rows] / len(visited_rows))
+            if preferences.is_empty():
+                dense, city_weights = history_dense, history_cities
+            else:
+                norm = math.sqrt(float(dense @ dense) + float(city_weights @ city_weights)) or 1
+                dense = (dense / norm + history_dense) / 2
+                city_weights = (city_weights / norm + history_cities) / 2
+
+        category_codes = [self.CATEGORIES.index(category) for category in preferences.categories] \
+            or list(range(len(self.CATEGORIES)))
+        segments = [self._segments[(code, category)] for code in codes for category in category_codes]
+
+        def filters(offsets):
+            # Filtros rígidos: somente disponíveis e dentro da faixa de preço
+            keep = self._available[offsets].copy()
+            if preferences.price_min is not None:
+                keep &= self._prices[offsets] >= preferences.price_min
+            if preferences.price_max is not None:
+                keep &= self._prices[offsets] <= preferences.price_max
+            return keep
+
+        return self._top_k(dense, city_weights, segments, k, exclude=visited, filters=filters)
+
+#valuation.py
+import math
+from heapq import heappush, heappushpop
+class KDTree:
+    "Árvore k-d estática sobre NumPy para consultas de k vizinhos mais próximos"
+    LEAF_SIZE = 32
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        self._order = np.arange(len(points))
+        # Nó interno: (eixo, corte, esquerdo, direito); folha: (-1, início, fim)
+        self._nodes = []
+        self._points = points
+        if len(points):
+            self._build(0, len(points))
+        # Pontos reordenados: cada folha é uma fatia contígua
+        self._points = points[self._order]
+
+    def __len__(self):
+        return len(self._order)
+
+    def _build(self, start, end):
+        position = len(self._nodes)
+        self._nodes.append(None)
+        if end - start <= self.LEAF_SIZE:
+            self._nodes[position] = (-1, start, end)
+            return position
+        rows = self._order[start:end]
+        block = self._points[rows]
+        axis = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+        middle = (end - start) // 2
+        partition = np.argpartition(block[:, axis], middle)
+        self._order[start:end] = rows[partition]
+        split = float(block[partition[middle], axis])
+        left = self._build(start, start + middle)
+        right = self._build(start + middle, end)
+        self._nodes[position] = (axis, split, left, right)
+        return position
+
+    def query(self, point, k):
+        "Os k pontos mais próximos como pares (distância, linha original), do mais próximo ao mais distante"
+        if not self._nodes or k <= 0:
+            return []
+        point = np.asarray(point, dtype=np.float64)
+        best = []  # heap máximo de (-distância², linha)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, tuple):
+                # Lado distante adiado: só é visitado se ainda puder conter um vizinho melhor
+                node, gap = node
+                if len(best) == k and gap >= -best[0][0]:
+                    continue
+            axis, split, *children = self._nodes[node]
+            if axis < 0:
+                first, second = split, children[0]
+                distances = ((self._points[first:second] - point) ** 2).sum(axis=1)
+                if len(distances) > k:
+                    candidates = np.argpartition(distances, k - 1)[:k]
+                else:
+                    candidates = range(len(distances))
+                for offset in candidates:
+                    item = (-float(distances[offset]), first + int(offset))
+                    if len(best) < k:
+                        heappush(best, item)
+                    elif item > best[0]:
+                        heappushpop(best, item)
+                continue
+            left, right = children
+            difference = point[axis] - split
+            near, far = (left, right) if difference < 0 else (right, left)
+            stack.append((far, difference * difference))
+            stack.append(near)
+        return [(math.sqrt(-distance), int(self._order[row])) for distance, row in sorted(best, reverse=True)]
+
+class GeocodeCache:
+    "Coordenadas por localização, geocodificadas uma única vez (inclusive as não encontradas)"
+
+    def __init__(self, geocoder=None):
+        self._geocoder = geocoder
+        self._coordinates = {}
+        self._lock = threading.Lock()
+
+    def coordinates(self, location):
+        key = location.strip().lower()
+        with self._lock:
+            if key in self._coordinates:
+                return self._coordinates[key]
+        # Sem o geocodificador explícito, usa o global (que pode ser trocado por use_geocoder)
+        point = (self._geocoder or geolocator).geocode(location)
+        coordinates = (point.latitude, point.longitude) if point else None
+        with self._lock:
+            self._coordinates[key] = coordinates
+        return coordinates
+
+    def clear(self):
+        with self._lock:
+            self._coordinates.clear()
+
+geocode_cache = GeocodeCache()
+
+def use_geocoder(geocoder):
+    "Troca o geocodificador global (por exemplo, pelo LocalGeocoder offline) e descarta o cache"
+    global geolocator
+    geolocator = geocoder
+    geocode_cache.clear()
+
+class ValuationModel:
+    "Sugestão de preço por k comparáveis mais próximos (mesma categoria e transação), ponderados por distância e recência"
+    KM_PER_DEGREE = 111.32
+    Z_95 = 1.96
+
+    def __init__(self, k=10, days_per_km=90, geocodes=None, auto_refresh=True):
+        # days_per_km: quantos dias de diferença na data do anúncio equivalem a 1 km de distância
+        if k <= 0 or days_per_km <= 0:
+            raise ValueError("Parâmetros de avaliação devem ser positivos.")
+        self.k = k
+        self.days_per_km = days_per_km
+        self.geocodes = geocodes or geocode_cache
+        self.auto_refresh = auto_refresh
+        self._segments = {}  # (categoria, transação) -> árvore e dados do segmento, com a versão usada
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _segment_version(key):
+        return db.property_index.versions.get(PropertyIndex.segment_partition(*key))
+
+    def is_stale(self, key=None):
+        # Sem segmento informado: verdadeiro se algum segmento já montado ficou desatualizado
+        keys = [key] if key is not None else list(self._segments)
+        return any(k not in self._segments or self._segments[k]["version"] != self._segment_version(k) for k in keys)
+
+    def _segment(self, key):
+        # Só o segmento consultado é (re)montado, e apenas se ele mudou desde a última montagem
+        segment = self._segments.get(key)
+        if segment is None or (self.auto_refresh and segment["version"] != self._segment_version(key)):
+            with self._lock:
+                segment = self._segments.get(key)
+                if segment is None or (self.auto_refresh and segment["version"] != self._segment_version(key)):
+                    segment = self._fit_segment(key)
+        return segment
+
+    def _project(self, latitude, longitude):
+        # Projeção equirretangular local: suficiente para distâncias entre imóveis próximos
+        return (
+            longitude * self.KM_PER_DEGREE * math.cos(math.radians(latitude)),
+            latitude * self.KM_PER_DEGREE
+        )
+
+    def _time_axis(self, reference, listed_at):
+        return (reference - listed_at).total_seconds() / 86400 / self.days_per_km
+
+    def _fit_segment(self, key):
+        "Árvore k-d de um segmento (categoria, transação) sobre coordenadas e data do anúncio"
+        category, transaction = key
+        with db.lock.read():
+            version = self._segment_version(key)
+            properties = [
+                prop for prop in db.property_index.by_category(category)
+                if prop.transaction_type == transaction and prop.price > 0
+            ]
+
+        # Geocodifica cada localização distinta uma vez (o cache vale para todos os segmentos), fora da trava
+        coordinates = {location: self.geocodes.coordinates(location) for location in {p.location for p in properties}}
+        items = [(prop, coordinates[prop.location]) for prop in properties if coordinates[prop.location] is not None]
+        segment = {"version": version, "tree": None}
+        if items:
+            # O eixo do tempo conta a partir do anúncio mais recente do segmento
+            reference = max(prop.listed_at for prop, _ in items)
+            points = np.array([
+                (*self._project(*point), self._time_axis(reference, prop.listed_at)) for prop, point in items
+            ])
+            segment.update(
+                tree=KDTree(points),
+                ids=np.fromiter((prop.id for prop, _ in items), dtype=np.int64, count=len(items)),
+                log_prices=np.log(np.fromiter((prop.price for prop, _ in items), dtype=np.float64, count=len(items))),
+                points=points
+            )
+        self._segments[key] = segment
+        return segment
+
+    def fit(self):
+        "Monta (ou remonta) todos os segmentos presentes no catálogo"
+        with db.lock.read():
+            keys = {(prop.property_category, prop.transaction_type) for prop in db.properties}
+        with self._lock:
+            self._segments = {}
+            for key in keys:
+                self._fit_segment(key)
+        return self
+
+    def estimate(self, location, property_category, transaction_type, k=None, exclude_id=None):
+        "Preço sugerido com intervalo de 95% e os comparáveis usados"
+        point = self.geocodes.coordinates(location)
+        if point is None:
+            raise ValueError("Localização não encontrada.")
+        segment = self._segment((property_category, transaction_type))
+        if segment["tree"] is None:
+            raise ValueError("Não há comparáveis para esta categoria e transação.")
+        k = k or self.k
+        # Um novo anúncio é tão recente quanto o mais recente do segmento
+        query = (*self._project(*point), 0.0)
+        neighbors = [
+            (distance, row) for distance, row in segment["tree"].query(query, k + 1)
+            if int(segment["ids"][row]) != exclude_id
+        ][:k]
+        if not neighbors:
+            raise ValueError("Não há comparáveis para esta categoria e transação.")
+
+        distances = np.array([distance for distance, _ in neighbors])
+        rows = np.array([row for _, row in neighbors])
+        weights = 1 / (1 + distances)
+        log_prices = segment["log_prices"][rows]
+        mean_log = float(np.average(log_prices, weights=weights))
+        variance = float(np.average((log_prices - mean_log) ** 2, weights=weights))
+        effective = weights.sum() ** 2 / (weights ** 2).sum()
+        # Intervalo de predição em escala log: dispersão dos comparáveis mais a incerteza da média
+        margin = self.Z_95 * math.sqrt(variance * (1 + 1 / effective))
+        query_x, query_y = query[:2]
+        return {
+            "estimate": round(math.exp(mean_log), 2),
+            "low": round(math.exp(mean_log - margin), 2),
+            "high": round(math.exp(mean_log + margin), 2),
+            "comparables": [
+                {
+                    "id": int(segment["ids"][row]),
+                    "price": round(math.exp(segment["log_prices"][row]), 2),
+                    "distance_km": round(math.hypot(
+                        segment["points"][row][0] - query_x, segment["points"][row][1] - query_y), 3),
+                    "age_days": round(float(segment["points"][row][2]) * self.days_per_km, 1),
+                    "weight": round(float(weight), 4)
+                }
+                for row, weight in zip(rows.tolist(), weights)
+            ]
+        }
+
+    def estimate_property(self, prop, k=None):
+        "Sugestão de preço para uma propriedade (nova ou já cadastrada, que é excluída dos próprios comparáveis)"
+        return self.estimate(prop.location, prop.property_category, prop.transaction_type, k, exclude_id=prop.id)
+
+#http_service.py
+import asyncio
+import json
+import re
+from collections import namedtuple
+from collections.abc import Iterator
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+class HttpError(Exception):
+    "Erro de requisição convertido em resposta JSON com o status HTTP correspondente"
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def property_to_dict(prop):
+    return {
+        "id": prop.id,
+        "title": prop.title,
+        "description": prop.description,
+        "price": prop.price,
+        "location": prop.location,
+        "property_category": prop.property_category,
+        "transaction_type": prop.transaction_type,
+        "agent": prop.agent.name if isinstance(prop.agent, User) else prop.agent,
+        "available": prop.available,
+        "virtual_tour_url": prop.virtual_tour_url,
+        "listed_at": prop.listed_at.isoformat(timespec="seconds")
+    }
+
+def review_to_dict(review):
+    return {
+        "id": review.id,
+        "property_id": review.property_id,
+        "reviewer_id": review._user,
+        "rating": review.rating,
+        "comment": review.comment,
+        "date": review.date
+    }
+
+def change_value(value):
+    # Valores do change feed em JSON: usuários pelo nome (como em property_to_dict) e datas em ISO
+    if isinstance(value, User):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    return value
+
+def change_to_dict(change):
+    if change.entity == User._entity:
+        # Dados pessoais (nome, email) não saem no feed: só o fato de o usuário ter mudado
+        return dict(change._asdict(), before=None, after=None)
+    return dict(change._asdict(), before=change_value(change.before), after=change_value(change.after))
+
+def inquiry_to_dict(inquiry):
+    return {
+        "id": inquiry.id,
+        "property_id": inquiry.property.id,
+        "client_id": inquiry.client.id,
+        "message": inquiry.message,
+        "status": inquiry.status,
+        "created_at": inquiry.created_at.isoformat(timespec="seconds")
+    }
+
+def visit_to_dict(visit):
+    return {
+        "id": visit._id,
+        "client_id": visit._client.id,
+        "property_id": visit._property.id,
+        "date_time": visit.date_time,
+        "status": visit.status
+    }
+
+Session = namedtuple("Session", ["token", "user"])
+
+class PortalService:
+    "Camada de serviço JSON sobre os controllers, independente do transporte HTTP"
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 5000
+
+    def __init__(self, executor=None):
+        self.user_controller = UserController()
+        self.property_controller = PropertyController()
+        self.mortgage_controller = MortgageController()
+        self.visit_controller = VisitController(self.property_controller, self.user_controller)
+        self.market_analysis_controller = MarketAnalysisController(self.property_controller)
+        self.review_controller = ReviewController()
+        self.recommender = PropertyRecommender()
+        self.inquiry_controller = InquiryController()
+        self._executor = executor  # None usa o executor padrão do loop
+        # Rotas autenticadas recebem a sessão (token e usuário) logo após o corpo da requisição
+        self._routes = [
+            ("GET", r"/health", self.health, False),
+            ("GET", r"/properties", self.search_properties, False),
+            ("POST", r"/properties", self.create_property, True),
+            ("GET", r"/properties/facets", self.facet_counts, False),
+            ("GET", r"/properties/(\d+)", self.get_property, False),
+            ("GET", r"/properties/(\d+)/coordinates", self.get_coordinates, False),
+            ("GET", r"/properties/(\d+)/reviews", self.get_reviews, False),
+            ("GET", r"/properties/(\d+)/similar", self.similar_properties, False),
+            ("GET", r"/recommendations", self.recommendations, True),
+            ("PUT", r"/preferences", self.update_preferences, True),
+            ("POST", r"/reviews", self.add_review, True),
+            ("POST", r"/inquiries", self.add_inquiry, True),
+            ("GET", r"/inquiries", self.list_inquiries, True),
+            ("POST", r"/inquiries/next", self.next_inquiries, True),
+            ("PUT", r"/inquiries/(\d+)", self.update_inquiry, True),
+            ("GET", r"/visits", self.list_visits, True),
+            ("POST", r"/visits", self.schedule_visit, True),
+            ("GET", r"/mortgage", self.calculate_mortgage, False),
+            ("GET", r"/affordable", self.search_affordable, False),
+            ("GET", r"/market", self.market_analysis, False),
+            ("GET", r"/valuation", self.estimate_price, False),
+            ("GET", r"/yields", self.rental_yields, False),
+            ("GET", r"/properties/(\d+)/valuation", self.estimate_property_price, False),
+            ("POST", r"/users", self.register_user, False),
+            ("POST", r"/sessions", self.create_session, False),
+            ("DELETE", r"/sessions", self.end_session, True),
+            ("GET", r"/metrics", self.get_metrics, False),
+            ("GET", r"/changes", self.list_changes, True),
+        ]
+        self._routes = [
+            (method, re.compile(f"^{pattern}$"), handler, requires_auth)
+            for method, pattern, handler, requires_auth in self._routes
+        ]
+
+    async def dispatch(self, method, path, params, body, headers=None):
+        path_matched = False
+        for route_method, pattern, handler, requires_auth in self._routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method != method:
+                continue
+            # Os handlers tomam a trava do banco, fazem hash de senhas ou percorrem o catálogo:
+            # todos rodam no executor para que um escritor (ou uma consulta pesada) não pare o loop de eventos
+            if requires_auth:
+                return await self.run_blocking(
+                    lambda: handler(params, body, self._session(headers), *match.groups()))
+            return await self.run_blocking(handler, params, body, *match.groups())
+        if path_matched:
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Método não permitido.")
+        raise HttpError(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+
+    @staticmethod
+    def _param(params, name, convert=str, default=None):
+        values = params.get(name)
+        if not values or values[-1] == "":
+            return default
+        try:
+            return convert(values[-1])
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Parâmetro inválido: {name}")
+
+    @staticmethod
+    def _check_type(name, value, kind):
+        # bool é subclasse de int, mas true/false não valem como número
+        if not isinstance(value, kind) or (isinstance(value, bool) and kind is not bool):
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Campo inválido: {name}")
+        return value
+
+    @classmethod
+    def _field(cls, body, name, kind=str):
+        if not isinstance(body, dict) or name not in body:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Campo obrigatório ausente: {name}")
+        return cls._check_type(name, body[name], kind)
+
+    @staticmethod
+    def _token(headers):
+        scheme, _, token = (headers or {}).get("authorization", "").partition(" ")
+        return token.strip() if scheme.lower() == "bearer" else None
+
+    def _session(self, headers):
+        token = self._token(headers)
+        user = self.user_controller.user_from_token(token) if token else None
+        if user is None:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Sessão inválida ou expirada.")
+        return Session(token, user)
+
+    def _property(self, property_id):
+        prop = self.property_controller.find_property_by_id(int(property_id))
+        if prop is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Propriedade não encontrada.")
+        return prop
+
+    def health(self, params, body):
+        return HTTPStatus.OK, {"status": "ok"}
+
+    def search_properties(self, params, body):
+        query = PropertyQuery.from_dict({name: values[-1] for name, values in params.items()})
+        # Sem limite explícito a resposta é paginada; limites acima do máximo são reduzidos
+        limit = self.DEFAULT_PAGE_SIZE if query.limit is None else min(query.limit, self.MAX_PAGE_SIZE)
+        query.paginate(limit, query.offset)
+        # Gerador: o HttpServer serializa um bloco de cada vez, fora do loop de eventos
+        return HTTPStatus.OK, (property_to_dict(prop) for prop in self.property_controller.search_properties(query))
+
+    def facet_counts(self, params, body):
+        query = PropertyQuery.from_dict({name: values[-1] for name, values in params.items()})
+        return HTTPStatus.OK, self.property_controller.facet_counts(query)
+
+    def create_property(self, params, body, session):
+        if session.user.get_role() != "Agente":
+            raise HttpError(HTTPStatus.FORBIDDEN, "Apenas agentes podem cadastrar uma propriedade.")
+        prop = self.property_controller.create_property(
+            property_type=self._field(body, "property_category"),
+            title=self._field(body, "title"),
+            description=self._field(body, "description"),
+            price=self._field(body, "price", (int, float)),
+            location=self._field(body, "location"),
+            transaction_type=self._field(body, "transaction_type"),
+            agent=session.user,
+            virtual_tour_url=body.get("virtual_tour_url")
+        )
+        payload = property_to_dict(prop)
+        payload["possible_duplicates"] = self.property_controller.find_possible_duplicates(prop.id)
+        return HTTPStatus.CREATED, payload
+
+    def get_property(self, params, body, property_id):
+        return HTTPStatus.OK, property_to_dict(self._property(property_id))
+
+    def get_coordinates(self, params, body, property_id):
+        latitude, longitude = self._property(property_id).get_coordinates()
+        if latitude is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Localização não encontrada.")
+        return HTTPStatus.OK, {"latitude": latitude, "longitude": longitude}
+
+    def get_reviews(self, params, body, property_id):
+        prop = self._property(property_id)
+        reviews = self.review_controller.get_reviews_by_property(prop.id)
+        return HTTPStatus.OK, {
+            "average_rating": self.review_controller.get_average_rating(prop.id),
+            "reviews": [review_to_dict(review) for review in reviews]
+        }
+
+    def _recommended(self, pairs):
+        return [
+            dict(property_to_dict(self.property_controller.find_property_by_id(property_id)), score=score)
+            for property_id, score in pairs
+        ]
+
+    def similar_properties(self, params, body, property_id):
+        pairs = self.recommender.similar_to(self._property(property_id).id, self._param(params, "k", int, 10))
+        return HTTPStatus.OK, self._recommended(pairs)
+
+    def _client(self, session):
+        if session.user.get_role() != "Cliente":
+            raise HttpError(HTTPStatus.FORBIDDEN, "Apenas clientes têm preferências e recomendações.")
+        return session.user
+
+    def recommendations(self, params, body, session):
+        pairs = self.recommender.for_client(self._client(session), self._param(params, "k", int, 10))
+        return HTTPStatus.OK, self._recommended(pairs)
+
+    def update_preferences(self, params, body, session):
+        if not isinstance(body, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Corpo JSON obrigatório.")
+        fields = {"locations": list, "categories": list, "price_min": (int, float), "price_max": (int, float),
+                  "transaction_type": str}
+        for name, value in body.items():
+            if name in fields and value is not None:
+                self._check_type(name, value, fields[name])
+                if fields[name] is list:
+                    for item in value:
+                        self._check_type(name, item, str)
+        preferences = self._client(session).update_preferences(
+            **{name: value for name, value in body.items() if name in fields})
+        return HTTPStatus.OK, preferences.to_dict()
+
+    def add_review(self, params, body, session):
+        review = self.review_controller.add_review(
+            reviewer_id=session.user.id,
+            property_id=self._field(body, "property_id", int),
+            rating=self._field(body, "rating", int),
+            comment=self._field(body, "comment")
+        )
+        return HTTPStatus.CREATED, review_to_dict(review)
+
+    def _agent(self, session):
+        if session.user.get_role() != "Agente":
+            raise HttpError(HTTPStatus.FORBIDDEN, "Apenas agentes atendem consultas.")
+        return session.user
+
+    def add_inquiry(self, params, body, session):
+        if session.user.get_role() != "Cliente":
+            raise HttpError(HTTPStatus.FORBIDDEN, "Apenas clientes enviam consultas.")
+        prop = self._property(self._field(body, "property_id", int))
+        inquiry = self.inquiry_controller.add_inquiry(session.user, prop, self._field(body, "message"))
+        return HTTPStatus.CREATED, inquiry_to_dict(inquiry)
+
+    def list_inquiries(self, params, body, session):
+        inquiries = self.inquiry_controller.list_by_agent(self._agent(session), self._param(params, "status"))
+        return HTTPStatus.OK, [inquiry_to_dict(inquiry) for inquiry in inquiries]
+
+    def next_inquiries(self, params, body, session):
+        # Retira da fila as próximas pendentes por prioridade e as marca como "Em atendimento"
+        inquiries = self.inquiry_controller.next_batch(
+            self._agent(session), self._param(params, "size", int, 20), claim=True)
+        return HTTPStatus.OK, [inquiry_to_dict(inquiry) for inquiry in inquiries]
+
+    def update_inquiry(self, params, body, session, inquiry_id):
+        inquiry = self.inquiry_controller.find_inquiry_by_id(int(inquiry_id))
+        if inquiry is None or inquiry.agent is not self._agent(session):
+            raise HttpError(HTTPStatus.NOT_FOUND, "Consulta não encontrada.")
+        inquiry = self.inquiry_controller.update_status(inquiry.id, self._field(body, "status"))
+        return HTTPStatus.OK, inquiry_to_dict(inquiry)
+
+    def list_visits(self, params, body, session):
+        # Clientes veem as próprias visitas; agentes, as visitas aos seus imóveis
+        visits = self.visit_controller.list_visits_for(session.user)
+        return HTTPStatus.OK, [visit_to_dict(visit) for visit in visits]
+
+    def schedule_visit(self, params, body, session):
+        visit = self.visit_controller.schedule_visit(
+            id=None,  # O ID será atribuído pelo banco de dados
+            client_id=session.user.id,
+            property_id=self._field(body, "property_id", int),
+            date_time=self._field(body, "date_time")
+        )
+        return HTTPStatus.CREATED, visit_to_dict(visit)
+
+    def calculate_mortgage(self, params, body):
+        mortgage = self.mortgage_controller.calculate_mortgage(
+            self._param(params, "loan_amount", float, 0),
+            self._param(params, "annual_rate", float, 0),
+            self._param(params, "years", int, 0)
+        )
+        return HTTPStatus.OK, {"monthly_payment": mortgage.monthly_payment, "total_payment": mortgage.total_payment}
+
+    def search_affordable(self, params, body):
+        max_price, properties = self.property_controller.search_affordable(
+            self._param(params, "monthly_payment", float, 0),
+            self._param(params, "annual_rate", float, 0),
+            self._param(params, "years", int, 0),
+            self._param(params, "down_payment", float, 0),
+            self._param(params, "limit", int, 20)
+        )
+        return HTTPStatus.OK, {"max_price": round(max_price, 2), "properties": [property_to_dict(p) for p in properties]}
+
+    def market_analysis(self, params, body):
+        location = self._param(params, "location")
+        if not location:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Parâmetro obrigatório ausente: location")
+        analysis = self.market_analysis_controller.get_market_analysis(location)
+        if analysis is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Nenhuma análise disponível para esta localização.")
+        return HTTPStatus.OK, analysis
+
+    def rental_yields(self, params, body):
+        # ?group_by=city agrega todas as categorias da cidade; o padrão é cidade e categoria
+        group_by = self._param(params, "group_by", default="category")
+        if group_by not in ("category", "city"):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Parâmetro inválido: group_by")
+        return HTTPStatus.OK, self.market_analysis_controller.get_rental_yields(
+            group_by == "category", self._param(params, "min_listings", int, 1), self._param(params, "limit", int))
+
+    def estimate_price(self, params, body):
+        fields = ["location", "property_category", "transaction_type"]
+        values = [self._param(params, name) for name in fields]
+        for name, value in zip(fields, values):
+            if not value:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"Parâmetro obrigatório ausente: {name}")
+        estimate = self.market_analysis_controller.valuation.estimate(*values, self._param(params, "k", int))
+        return HTTPStatus.OK, estimate
+
+    def estimate_property_price(self, params, body, property_id):
+        estimate = self.market_analysis_controller.estimate_price(self._property(property_id), self._param(params, "k", int))
+        return HTTPStatus.OK, estimate
+
+    async def run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def register_user(self, params, body):
+        user = self.user_controller.register_user(
+            self._field(body, "name"), self._field(body, "email"),
+            self._field(body, "password"), self._field(body, "user_type")
+        )
+        if user is None:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Não foi possível registrar o usuário.")
+        return HTTPStatus.CREATED, {"id": user.id, "name": user.name, "email": user.email, "role": user.get_role()}
+
+    def get_metrics(self, params, body):
+        # Texto no formato Prometheus por padrão; ?format=json devolve o dump em JSON
+        if self._param(params, "format") == "json":
+            return HTTPStatus.OK, {"enabled": instrumentation_enabled(), "methods": metrics.to_json()}
+        return HTTPStatus.OK, metrics.to_prometheus()
+
+    def list_changes(self, params, body, session):
+        # Consumidores retomam de onde pararam passando ?since=<última sequência recebida>
+        if session.user.get_role() != "Agente":
+            raise HttpError(HTTPStatus.FORBIDDEN, "Apenas agentes acessam o change feed.")
+        since = self._param(params, "since", int, 0)
+        try:
+            changes = change_feed.read(since, min(self._param(params, "limit", int, 500), 5000))
+        except ValueError as e:
+            raise HttpError(HTTPStatus.GONE, str(e))
+        return HTTPStatus.OK, {
+            "changes": [change_to_dict(change) for change in changes],
+            "next": changes[-1].sequence if changes else since,
+            "last_sequence": change_feed.last_sequence
+        }
+
+    def create_session(self, params, body):
+        # A verificação lenta do hash acontece só aqui; as demais requisições usam o token
+        token = self.user_controller.create_session(self._field(body, "email"), self._field(body, "password"))
+        if token is None:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Email ou senha incorretos.")
+        return HTTPStatus.CREATED, {"token": token, "expires_in": session_store.ttl_seconds}
+
+    def end_session(self, params, body, session):
+        self.user_controller.end_session(session.token)
+        return HTTPStatus.OK, {"status": "sessão encerrada"}
+
+class HttpServer:
+    "Servidor HTTP/1.1 mínimo sobre asyncio, com keep-alive e respostas em streaming"
+    STREAM_THRESHOLD = 200   # Listas maiores que isso são enviadas com Transfer-Encoding: chunked
+    CHUNK_ITEMS = 100
+    MAX_BODY = 1_048_576
+
+    def __init__(self, service, host="127.0.0.1", port=8080):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # Porta real quando port=0
+        return self._server
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                try:
+                    keep_alive = await self._handle_request(head, reader, writer)
+                except ConnectionError:
+                    break  # Cliente desconectou antes de receber a resposta
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def _handle_request(self, head, reader, writer):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._send(writer, HTTPStatus.BAD_REQUEST, {"erro": "Requisição inválida."}, False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Sem um tamanho válido não há como achar o fim do corpo: responde e fecha a conexão
+            await self._send(writer, HTTPStatus.BAD_REQUEST, {"erro": "Content-Length inválido."}, False)
+            return False
+        if length > self.MAX_BODY:
+            await self._send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"erro": "Corpo muito grande."}, False)
+            return False
+        try:
+            raw_body = await reader.readexactly(length) if length else b""
+        except asyncio.IncompleteReadError:
+            await self._send(writer, HTTPStatus.BAD_REQUEST, {"erro": "Corpo menor que o Content-Length."}, False)
+            return False
+
+        url = urlsplit(target)
+        try:
+            body = json.loads(raw_body) if raw_body else None
+            status, payload = await self.service.dispatch(method.upper(), url.path, parse_qs(url.query), body, headers)
+        except json.JSONDecodeError:
+            status, payload = HTTPStatus.BAD_REQUEST, {"erro": "JSON inválido."}
+        except HttpError as e:
+            status, payload = e.status, {"erro": str(e)}
+        except ValueError as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"erro": str(e)}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": f"Erro inesperado: {e}"}
+
+        await self._send(writer, status, payload, keep_alive)
+        return keep_alive
+
+    async def _send(self, writer, status, payload, keep_alive):
+        status = HTTPStatus(status)
+        content_type = "text/plain; version=0.0.4" if isinstance(payload, str) else "application/json"
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if isinstance(payload, list) and len(payload) > self.STREAM_THRESHOLD:
+            payload = iter(payload)
+        if isinstance(payload, Iterator):
+            # Geradores são consumidos um bloco por vez no executor do serviço, sem montar a lista inteira
+            writer.write((head + "Transfer-Encoding: chunked\r\n\r\n").encode("latin-1"))
+            self._write_chunk(writer, b"[")
+            separator = ""
+            while True:
+                try:
+                    data = await self.service.run_blocking(self._encode_items, payload, separator)
+                except Exception:
+                    # O cabeçalho já foi enviado: resta encerrar a conexão sem o bloco final
+                    raise ConnectionAbortedError("Falha ao gerar a resposta em streaming.")
+                if not data:
+                    break
+                self._write_chunk(writer, data)
+                await writer.drain()  # Respeita o controle de fluxo do cliente
+                separator = ","
+            self._write_chunk(writer, b"]")
+            writer.write(b"0\r\n\r\n")
+        else:
+            if isinstance(payload, str):
+                body = payload.encode("utf-8")
+            else:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            writer.write((head + f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    def _encode_items(self, items, separator):
+        items = list(islice(items, self.CHUNK_ITEMS))
+        if not items:
+            return b""
+        return (separator + ",".join(json.dumps(item, ensure_ascii=False) for item in items)).encode("utf-8")
+
+    @staticmethod
+    def _write_chunk(writer, data):
+        writer.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+
+def run_service(host="127.0.0.1", port=8080):
+    "Inicia o serviço HTTP/JSON do portal até ser interrompido"
+    if os.environ.get("PORTAL_METRICS"):
+        enable_instrumentation()
+    server = HttpServer(PortalService(), host, port)
+    session_store.start_sweeper()  # Remove sessões expiradas em segundo plano
+    db.start_compactor()  # Recupera lápides de exclusões e limpa registros relacionados
+    print(f"Serviço do portal em http://{host}:{port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("Serviço encerrado.")
+
+#stress_test.py
+import random
+from concurrent.futures import ThreadPoolExecutor
+def check_database_consistency():
+    "Verifica se listas e índices do banco de dados estão coerentes entre si"
+    with db.lock.read():
+        index = db.property_index
+        if len(db.properties) != len(index):
+            raise RuntimeError("Inconsistência: lista de propriedades e índice com tamanhos diferentes.")
+        if any(index.get(prop.id) is not prop for prop in db.properties):
+            raise RuntimeError("Inconsistência: propriedade ausente do índice por ID.")
+        if index._by_price != sorted(index._by_price) or len(index._by_price) != len(index):
+            raise RuntimeError("Inconsistência: índice de preços desordenado ou incompleto.")
+        for transaction, prices in index._by_transaction_price.items():
+            if prices != sorted(prices) or len(prices) != len(index.by_transaction(transaction)):
+                raise RuntimeError("Inconsistência: índice de preços por transação desordenado ou incompleto.")
+        if len(index.yields) != len(index):
+            raise RuntimeError("Inconsistência: agregados de rendimento incompletos.")
+        if len(index.facets) != len(index):
+            raise RuntimeError("Inconsistência: bitmaps de facetas incompletos.")
+        keys = [(prop.title, prop.location) for prop in db.properties]
+        if len(keys) != len(set(keys)):
+            raise RuntimeError("Inconsistência: propriedades duplicadas.")
+        emails = [user.email for user in db.users]
+        if len(emails) != len(set(emails)):
+            raise RuntimeError("Inconsistência: emails duplicados.")
+
+def run_stress_test(workers=8, operations=2000, seed=42):
+    "Executa leituras e escritas misturadas no banco global a partir de um pool de threads"
+    user_controller = UserController()
+    property_controller = PropertyController()
+    visit_controller = VisitController(property_controller, user_controller)
+    review_controller = ReviewController()
+    market_analysis_controller = MarketAnalysisController(property_controller)
+    categories = ["Casa", "Apartamento", "Terreno"]
+    locations = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Curitiba", "Recife"]
+    client = user_controller.register_user("Cliente Stress", f"stress-{seed}@portal.com", "senha", "Cliente")
+    counter = iter(range(operations))
+    counter_lock = threading.Lock()
+    counts = {}
+
+    def operation(worker_seed):
+        rng = random.Random(worker_seed)
+        kind = rng.choice(["create", "create", "update", "delete", "review", "visit",
+                           "type", "location", "price", "query", "market", "market", "compact"])
+        with counter_lock:
+            number = next(counter)
+            counts[kind] = counts.get(kind, 0) + 1
+        if kind == "create":
+            property_controller.create_property(
+                rng.choice(categories), f"Stress {seed}-{number}", "Imóvel gerado pelo teste de estresse",
+                rng.randint(50_000, 2_000_000), rng.choice(locations), rng.choice(["Venda", "Aluguel"]), "Agente Stress"
+            )
+        elif kind in ("update", "delete", "review", "visit"):
+            properties = property_controller.search_all_properties()
+            target = rng.choice(properties) if properties else None
+            if target is None:
+                return
+            if kind == "update":
+                property_controller.update_property(target.id, price=rng.randint(50_000, 2_000_000))
+            elif kind == "delete":
+                property_controller.delete_property(target.id)
+            elif kind == "review":
+                try:
+                    review_controller.add_review(client.id, target.id, rng.randint(1, 5), "Avaliação de estresse")
+                except ValueError:
+                    pass  # A propriedade pode ter sido removida por outra thread
+            else:
+                try:
+                    visit = visit_controller.schedule_visit(None, client.id, target.id, "2025-03-14 10:00")
+                    visit_controller.reschedule_visit(visit._id, "2025-03-15 14:00")
+                except ValueError:
+                    pass
+        elif kind == "type":
+            property_controller.search_property_by_type(rng.choice(categories))
+        elif kind == "location":
+            property_controller.search_property_by_location(rng.choice(locations))
+        elif kind == "price":
+            low = rng.randint(0, 1_000_000)
+            property_controller.search_property_by_price_range(low, low + 500_000)
+        elif kind == "query":
+            query = PropertyQuery().where_location(rng.choice(locations)).where_category(rng.choice(categories))
+            property_controller.search_properties(query.order_by("price").paginate(10))
+        elif kind == "compact":
+            db.compact()
+        else:
+            market_analysis_controller.get_market_analysis(rng.choice(locations))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list() propaga qualquer exceção levantada nas threads
+        list(executor.map(operation, range(seed, seed + operations)))
+
+    check_database_consistency()
+    return counts
+
+#synthetic_data.py
+from datetime import timedelta
+SYNTHETIC_SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SYNTHETIC_PASSWORD = "senha123"
+SYNTHETIC_CITIES = [
+    "São Paulo", "Rio de Janeiro", "Belo Horizonte", "Curitiba", "Porto Alegre", "Salvador", "Recife",
+    "Fortaleza", "Brasília", "Goiânia", "Manaus", "Belém", "Florianópolis", "Vitória", "Campinas",
+    "Santos", "Natal", "João Pessoa", "Maceió", "Aracaju", "Cuiabá", "Campo Grande", "Teresina",
+    "São Luís", "Londrina", "Joinville", "Ribeirão Preto", "Uberlândia", "Niterói", "Sorocaba"
+]
+SYNTHETIC_NEIGHBORHOODS = [
+    "Centro", "Jardim América", "Vila Nova", "Boa Vista", "Santa Cruz", "Bela Vista", "Alto da Serra",
+    "Parque das Flores", "Vila Mariana", "Liberdade", "Copacabana", "Savassi", "Batel", "Moinhos",
+    "Barra", "Boa Viagem", "Aldeota", "Asa Sul", "Ponta Verde", "Tambaú"
+]
+SYNTHETIC_ADJECTIVES = ["Amplo", "Moderno", "Aconchegante", "Reformado", "Iluminado", "Espaçoso", "Novo", "Charmoso"]
+SYNTHETIC_FEATURES = [
+    "com vista para o mar", "perto do metrô", "com piscina", "com churrasqueira", "em condomínio fechado",
+    "com varanda gourmet", "com jardim", "próximo a escolas", "com garagem para dois carros", "mobiliado"
+]
+SYNTHETIC_PRICE_RANGES = {
+    ("Casa", "Venda"): (250_000, 3_000_000),
+    ("Apartamento", "Venda"): (180_000, 2_500_000),
+    ("Terreno", "Venda"): (80_000, 1_500_000),
+    ("Casa", "Aluguel"): (1_200, 15_000),
+    ("Apartamento", "Aluguel"): (900, 12_000),
+    ("Terreno", "Aluguel"): (500, 5_000),
+}
+
+SYNTHETIC_CITY_COORDINATES = {
+    "São Paulo": (-23.55, -46.63), "Rio de Janeiro": (-22.91, -43.17), "Belo Horizonte": (-19.92, -43.94),
+    "Curitiba": (-25.43, -49.27), "Porto Alegre": (-30.03, -51.23), "Salvador": (-12.97, -38.51),
+    "Recife": (-8.05, -34.88), "Fortaleza": (-3.73, -38.52), "Brasília": (-15.79, -47.88),
+    "Goiânia": (-16.69, -49.26), "Manaus": (-3.12, -60.02), "Belém": (-1.46, -48.49),
+    "Florianópolis": (-27.60, -48.55), "Vitória": (-20.32, -40.34), "Campinas": (-22.91, -47.06),
+    "Santos": (-23.96, -46.33), "Natal": (-5.79, -35.21), "João Pessoa": (-7.12, -34.86),
+    "Maceió": (-9.67, -35.74), "Aracaju": (-10.91, -37.07), "Cuiabá": (-15.60, -56.10),
+    "Campo Grande": (-20.47, -54.62), "Teresina": (-5.09, -42.80), "São Luís": (-2.53, -44.30),
+    "Londrina": (-23.31, -51.16), "Joinville": (-26.30, -48.85), "Ribeirão Preto": (-21.18, -47.81),
+    "Uberlândia": (-18.92, -48.28), "Niterói": (-22.88, -43.10), "Sorocaba": (-23.50, -47.46)
+}
+GeoPoint = namedtuple("GeoPoint", ["latitude", "longitude"])
+
+class LocalGeocoder:
+    "Geocodificador offline para testes e benchmarks: cidade pela tabela, bairro por um deslocamento determinístico"
+
+    def __init__(self, cities=None, radius_km=8.0):
+        self._cities = {normalize_text(city): point for city, point in (cities or SYNTHETIC_CITY_COORDINATES).items()}
+        self.radius_degrees = radius_km / 111.32
+
+    def geocode(self, query):
+        neighborhood, _, city = query.rpartition(",")
+        center = self._cities.get(normalize_text(city))
+        if center is None:
+            return None
+        # O mesmo bairro cai sempre no mesmo ponto, dentro do raio a partir do centro da cidade
+        digest = zlib.crc32(normalize_text(neighborhood).encode())
+        angle = (digest & 0xFFFF) / 0xFFFF * 2 * math.pi
+        distance = (digest >> 16) / 0xFFFF * self.radius_degrees if neighborhood else 0.0
+        return GeoPoint(center[0] + distance * math.sin(angle), center[1] + distance * math.cos(angle))
+
+def synthetic_counts(scale):
+    "Quantidade de cada entidade para uma escala ('10k', '100k', '1m' ou número de propriedades)"
+    if isinstance(scale, str) and scale.lower() in SYNTHETIC_SCALES:
+        properties = SYNTHETIC_SCALES[scale.lower()]
+    else:
+        properties = int(scale)
+    if properties <= 0:
+        raise ValueError("A escala deve ser positiva.")
+    users = max(properties // 5, 2)
+    return {
+        "agents": max(users // 10, 1),
+        "clients": users - max(users // 10, 1),
+        "properties": properties,
+        "visits": properties // 2,
+        "reviews": properties,
+        "inquiries": properties // 4
+    }
+
+def generate_synthetic_data(scale="10k", seed=42, database=None, inquiry_controller=None):
+    "Popula o banco com dados sintéticos determinísticos e devolve as quantidades geradas"
+    database = database or db
+    rng = random.Random(seed)
+    counts = synthetic_counts(scale)
+    # Um único hash real é reaproveitado: calcular o PBKDF2 por usuário tornaria a carga inviável
+    password_hash = hash_password(SYNTHETIC_PASSWORD, salt=f"synthetic{seed}")
+    base_date = datetime(2025, 1, 1, 8, 0)
+    first_user_id = database.new_user_id()
+
+    agents = []
+    for number in range(counts["agents"]):
+        user_id = first_user_id + number
+        agent = Agent(user_id, f"Agente {user_id}", f"agente{user_id}.{seed}@portal.com", password_hash)
+        database.add_user(agent)
+        agents.append(agent)
+    clients = []
+    for number in range(counts["clients"]):
+        user_id = first_user_id + counts["agents"] + number
+        client = Client(user_id, f"Cliente {user_id}", f"cliente{user_id}.{seed}@portal.com", password_hash)
+        database.add_user(client)
+        clients.append(client)
+
+    properties = []
+    categories = ["Casa", "Apartamento", "Terreno"]
+    for number in range(counts["properties"]):
+        category = rng.choice(categories)
+        transaction = "Venda" if rng.random() < 0.6 else "Aluguel"
+        low, high = SYNTHETIC_PRICE_RANGES[(category, transaction)]
+        agent = rng.choice(agents)
+        prop = PropertyFactory.create_property(
+            property_type=category,
+            property_id=None,
+            title=f"{category} {rng.choice(SYNTHETIC_ADJECTIVES)} #{seed}-{number}",
+            description=f"{category} {rng.choice(SYNTHETIC_FEATURES)} e {rng.choice(SYNTHETIC_FEATURES)}",
+            price=round(rng.uniform(low, high), -2),
+            location=f"{rng.choice(SYNTHETIC_NEIGHBORHOODS)}, {rng.choice(SYNTHETIC_CITIES)}",
+            transaction_type=transaction,
+            agent=agent
+        )
+        if rng.random() < 0.15:
+            prop.available = False
+        # Data do anúncio derivada do número, sem consumir a sequência aleatória
+        prop.listed_at = base_date + timedelta(minutes=(number * 7919) % (60 * 24 * 365))
+        database.add_property(prop)
+        agent.add_property(prop)
+        properties.append(prop)
+
+    first_visit_id = database.new_visit_id()
+    for number in range(counts["visits"]):
+        prop = rng.choice(properties)
+        client = rng.choice(clients)
+        date_time = (base_date + timedelta(hours=rng.randint(0, 24 * 365))).strftime("%Y-%m-%d %H:%M")
+        visit = Visit(first_visit_id + number, client, prop.agent, prop, date_time)
+        database.add_visit(visit)
+        client.schedule_visit(visit)
+
+    for _ in range(counts["reviews"]):
+        review = Review(rng.choice(properties).id, rng.choice(clients).id, rng.randint(1, 5), "Avaliação sintética")
+        review._date = base_date + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        database.add_review(review)
+
+    if inquiry_controller is not None:
+        for _ in range(counts["inquiries"]):
+            inquiry_controller.add_inquiry(rng.choice(clients), rng.choice(properties), "Ainda está disponível?")
+    else:
+        counts["inquiries"] = 0
+
+    return counts
+
+#benchmarks.py
+import platform
+import subprocess
+from statistics import mean
+def _git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def _percentile(sorted_values, fraction):
+    position = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[position]
+
+def time_operation(name, operation, iterations, setup=None):
+    "Mede cada chamada de operation() em nanossegundos; setup() roda antes de cada chamada, fora da medição"
+    durations = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        operation()
+        durations.append(time.perf_counter_ns() - start)
+    durations.sort()
+    return {
+        "name": name,
+        "iterations": iterations,
+        "mean_us": mean(durations) / 1000,
+        "p50_us": _percentile(durations, 0.50) / 1000,
+        "p95_us": _percentile(durations, 0.95) / 1000,
+        "min_us": durations[0] / 1000,
+        "max_us": durations[-1] / 1000
+    }
+
+def run_benchmarks(scale="10k", iterations=200, seed=42, output=None, profiler=None):
+    "Carrega dados sintéticos no banco global, mede os caminhos críticos dos controllers e grava JSON"
+    load_start = time.perf_counter()
+    inquiry_controller = InquiryController()
+    counts = generate_synthetic_data(scale, seed, inquiry_controller=inquiry_controller)
+    load_seconds = time.perf_counter() - load_start
+
+    user_controller = UserController()
+    property_controller = PropertyController()
+    visit_controller = VisitController(property_controller, user_controller)
+    review_controller = ReviewController()
+    market_analysis_controller = MarketAnalysisController(property_controller)
+
+    rng = random.Random(seed)
+    with db.lock.read():
+        property_ids = [prop.id for prop in db.properties]
+        users = list(db.users)
+    clients = [user for user in users if user.get_role() == "Cliente"]
+    agents = [user for user in users if user.get_role() == "Agente"]
+    pick_property = lambda: rng.choice(property_ids)
+    pick_city = lambda: rng.choice(SYNTHETIC_CITIES)
+    insert_counter = iter(range(10 ** 9))
+
+    def insert_property():
+        number = next(insert_counter)
+        property_controller.create_property(
+            "Casa", f"Benchmark {seed}-{number}", "Imóvel de benchmark", 500_000,
+            pick_city(), "Venda", "Agente Benchmark"
+        )
+
+    def insert_duplicate():
+        try:
+            property_controller.create_property("Casa", "Casa na Praia", "Duplicada", 1, "Rio de Janeiro", "Venda", "x")
+        except ValueError:
+            pass
+
+    def market_query():
+        return PropertyQuery().where_location(pick_city()).where_category("Apartamento") \
+            .where_transaction("Venda").where_price(200_000, 800_000).order_by("price").paginate(20)
+
+    slow_iterations = max(1, min(iterations, 5))  # Login usa PBKDF2, lento de propósito
+
+    cases = [
+        ("find_property_by_id", lambda: property_controller.find_property_by_id(pick_property()), iterations, None),
+        ("find_user_by_id", lambda: user_controller.find_user_by_id(rng.choice(users).id), iterations, None),
+        ("search_all_properties", property_controller.search_all_properties, max(1, iterations // 10), None),
+        ("search_property_by_type_cold", lambda: property_controller.search_property_by_type("Apartamento"),
+         iterations, query_cache.clear),
+        ("search_property_by_type_warm", lambda: property_controller.search_property_by_type("Apartamento"),
+         iterations, None),
+        ("search_property_by_location_cold", lambda: property_controller.search_property_by_location(pick_city()),
+         iterations, query_cache.clear),
+        ("search_property_by_price_range_cold",
+         lambda: property_controller.search_property_by_price_range(300_000, 600_000), iterations, query_cache.clear),
+        ("search_properties_combined_cold", lambda: property_controller.search_properties(market_query()),
+         iterations, query_cache.clear),
+        ("search_properties_combined_warm", lambda: property_controller.search_properties(market_query()),
+         iterations, None),
+        ("add_property_insert", insert_property, iterations, None),
+        ("add_property_duplicate_check", insert_duplicate, iterations, None),
+        ("get_market_analysis_cold", lambda: market_analysis_controller.get_market_analysis(pick_city()),
+         iterations, query_cache.clear),
+        ("get_market_analysis_warm", lambda: market_analysis_controller.get_market_analysis(pick_city()),
+         iterations, None),
+        ("get_average_rating", lambda: review_controller.get_average_rating(pick_property()), iterations, None),
+        ("schedule_visit", lambda: visit_controller.schedule_visit(
+            None, rng.choice(clients).id, pick_property(), "2025-06-01 10:00"), iterations, None),
+        ("list_inquiries", inquiry_controller.list_inquiries, max(1, iterations // 10), None),
+        ("next_inquiry_batch", lambda: inquiry_controller.next_batch(rng.choice(agents), 20), iterations, None),
+        ("login", lambda: user_controller.authenticate(rng.choice(users).email, SYNTHETIC_PASSWORD),
+         slow_iterations, None),
+    ]
+    profiler = profiler or OperationProfiler()
+    results = []
+    for name, operation, count, setup in cases:
+        with profiler.operation(name):
+            results.append(time_operation(name, operation, count, setup))
+    profiler.write_summary()
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "seed": seed,
+        "counts": counts,
+        "load_seconds": load_seconds,
+        "results": results
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return report
+
+def compare_benchmarks(baseline_path, current_path, threshold=0.10):
+    "Compara dois relatórios de benchmark e devolve as operações cujo p50 piorou além do limite"
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {result["name"]: result for result in json.load(file)["results"]}
+    with open(current_path, encoding="utf-8") as file:
+        current = {result["name"]: result for result in json.load(file)["results"]}
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before and before["p50_us"] > 0:
+            ratio = result["p50_us"] / before["p50_us"]
+            if ratio > 1 + threshold:
+                regressions.append({"name": name, "baseline_p50_us": before["p50_us"],
+                                    "current_p50_us": result["p50_us"], "ratio": ratio})
+    return regressions
+
+#load_test.py
+import contextlib
+from collections import Counter, defaultdict
+LOAD_TEST_DRIVERS = ("threads", "asyncio")
+# Proporção de cada tipo de sessão na carga
+LOAD_TEST_SESSIONS = {"browse": 0.40, "buyer": 0.30, "review": 0.20, "signup": 0.10}
+
+def plan_session(rng, kind, number, seed, client_emails, property_ids):
+    "Roteiro determinístico de uma sessão: lista de (operação, método do cliente, argumentos)"
+    city = rng.choice(SYNTHETIC_CITIES)
+    category = rng.choice(["Casa", "Apartamento", "Terreno"])
+    transaction = "Venda" if rng.random() < 0.6 else "Aluguel"
+    low, high = SYNTHETIC_PRICE_RANGES[(category, transaction)]
+    searches = [
+        ("search_location", "search", {"query": {"location": city, "limit": 20}}),
+        ("search_filtered", "search", {"query": {
+            "location": city, "category": category, "transaction": transaction,
+            "max_price": round(rng.uniform(low, high), -2), "sort": "price", "limit": 20}}),
+        ("search_price", "search", {"query": {
+            "transaction": transaction, "min_price": low, "max_price": round(rng.uniform(low, high), -2), "limit": 20}}),
+        ("facet_counts", "facets", {"query": {"location": city, "category": category}}),
+    ]
+    # Passos sobre um imóvel usam o último resultado de busca; o ID reserva cobre buscas vazias
+    fallback = rng.choice(property_ids)
+    mortgage = ("mortgage", "mortgage", {
+        "loan_amount": round(rng.uniform(100_000, 1_500_000), -3),
+        "annual_rate": round(rng.uniform(7, 12), 2),
+        "years": rng.choice([15, 20, 30, 35])})
+
+    steps = []
+    if kind == "signup":
+        email = f"carga{number}.{seed}@portal.com"
+        steps += [("register", "register", {"name": f"Carga {number}", "email": email}),
+                  ("login", "login", {"email": email}),
+                  searches[1]]
+    elif kind == "browse":
+        steps += rng.sample(searches, rng.randint(2, 4))
+        steps += [("view_property", "view_property", {"fallback": fallback}),
+                  ("coordinates", "coordinates", {"fallback": fallback}),
+                  mortgage]
+        return steps
+    else:
+        steps.append(("login", "login", {"email": rng.choice(client_emails)}))
+        if kind == "buyer":
+            steps += rng.sample(searches[:3], rng.randint(1, 3))
+            date_time = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(8, 18):02d}:00"
+            steps += [("view_property", "view_property", {"fallback": fallback}),
+                      mortgage,
+                      ("schedule_visit", "schedule_visit", {"fallback": fallback, "date_time": date_time})]
+        else:
+            steps += [searches[0],
+                      ("review", "review", {"fallback": fallback, "rating": rng.randint(1, 5)})]
+    steps.append(("logout", "logout", {}))
+    return steps
+
+class ControllerLoadClient:
+    "Executa os passos de uma sessão chamando os controllers diretamente (driver de threads)"
+
+    def __init__(self, user_controller, property_controller, visit_controller, review_controller, mortgage_controller):
+        self.user_controller = user_controller
+        self.property_controller = property_controller
+        self.visit_controller = visit_controller
+        self.review_controller = review_controller
+        self.mortgage_controller = mortgage_controller
+        self.token = None
+        self.user = None
+        self.last_ids = []
+
+    def _target(self, fallback):
+        return self.last_ids[0] if self.last_ids else fallback
+
+    def register(self, name, email):
+        if self.user_controller.register_user(name, email, SYNTHETIC_PASSWORD, "Cliente") is None:
+            raise ValueError("Cadastro recusado.")
+
+    def login(self, email):
+        self.token = self.user_controller.create_session(email, SYNTHETIC_PASSWORD)
+        if self.token is None:
+            raise ValueError("Email ou senha incorretos.")
+        self.user = self.user_controller.user_from_token(self.token)
+
+    def search(self, query):
+        self.last_ids = [prop.id for prop in self.property_controller.search_properties(PropertyQuery.from_dict(query))]
+
+    def facets(self, query):
+        self.property_controller.facet_counts(PropertyQuery.from_dict(query))
+
+    def _property(self, fallback):
+        prop = self.property_controller.find_property_by_id(self._target(fallback))
+        if prop is None:
+            raise ValueError("Propriedade não encontrada.")
+        return prop
+
+    def view_property(self, fallback):
+        self.review_controller.get_average_rating(self._property(fallback).id)
+
+    def coordinates(self, fallback):
+        self._property(fallback).get_coordinates()
+
+    def mortgage(self, loan_amount, annual_rate, years):
+        self.mortgage_controller.calculate_mortgage(loan_amount, annual_rate, years)
+
+    def schedule_visit(self, fallback, date_time):
+        self.visit_controller.schedule_visit(None, self.user.id, self._target(fallback), date_time)
+
+    def review(self, fallback, rating):
+        self.review_controller.add_review(self.user.id, self._target(fallback), rating, "Avaliação do teste de carga")
+
+    def logout(self):
+        self.user_controller.end_session(self.token)
+
+class ServiceLoadClient:
+    "Executa os passos de uma sessão como requisições ao PortalService (driver asyncio)"
+
+    def __init__(self, service):
+        self.service = service
+        self.headers = {}
+        self.last_ids = []
+
+    def _target(self, fallback):
+        return self.last_ids[0] if self.last_ids else fallback
+
+    async def _call(self, method, path, params=None, body=None):
+        # Mesmo formato de parâmetros do HttpServer (parse_qs)
+        params = {name: [str(value)] for name, value in (params or {}).items()}
+        return (await self.service.dispatch(method, path, params, body, self.headers))[1]
+
+    async def register(self, name, email):
+        await self._call("POST", "/users", body={
+            "name": name, "email": email, "password": SYNTHETIC_PASSWORD, "user_type": "Cliente"})
+
+    async def login(self, email):
+        session = await self._call("POST", "/sessions", body={"email": email, "password": SYNTHETIC_PASSWORD})
+        self.headers = {"authorization": f"Bearer {session['token']}"}
+
+    async def search(self, query):
+        self.last_ids = [prop["id"] for prop in await self._call("GET", "/properties", query)]
+
+    async def facets(self, query):
+        await self._call("GET", "/properties/facets", query)
+
+    async def view_property(self, fallback):
+        await self._call("GET", f"/properties/{self._target(fallback)}/reviews")
+
+    async def coordinates(self, fallback):
+        await self._call("GET", f"/properties/{self._target(fallback)}/coordinates")
+
+    async def mortgage(self, loan_amount, annual_rate, years):
+        await self._call("GET", "/mortgage", {"loan_amount": loan_amount, "annual_rate": annual_rate, "years": years})
+
+    async def schedule_visit(self, fallback, date_time):
+        await self._call("POST", "/visits", body={"property_id": self._target(fallback), "date_time": date_time})
+
+    async def review(self, fallback, rating):
+        await self._call("POST", "/reviews", body={
+            "property_id": self._target(fallback), "rating": rating, "comment": "Avaliação do teste de carga"})
+
+    async def logout(self):
+        await self._call("DELETE", "/sessions")
+
+class LoadRecorder:
+    "Latências (ns) e erros por operação, compartilhados entre threads e tarefas"
+
+    def __init__(self):
+        self._durations = defaultdict(list)
+        self._errors = Counter()
+        self._waits = []
+        self._lock = threading.Lock()
+
+    def record(self, name, duration_ns, ok=True):
+        with self._lock:
+            self._durations[name].append(duration_ns)
+            if not ok:
+                self._errors[name] += 1
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self._waits.append(max(seconds, 0.0))
+
+    @staticmethod
+    def _latencies(durations, scale):
+        durations = sorted(durations)
+        return {
+            "mean_ms": mean(durations) / scale,
+            "p50_ms": _percentile(durations, 0.50) / scale,
+            "p95_ms": _percentile(durations, 0.95) / scale,
+            "p99_ms": _percentile(durations, 0.99) / scale,
+            "max_ms": durations[-1] / scale
+        }
+
+    def summary(self, elapsed):
+        with self._lock:
+            operations = []
+            for name, durations in sorted(self._durations.items()):
+                operations.append(dict(
+                    {"name": name, "count": len(durations), "errors": self._errors[name],
+                     "throughput_per_s": len(durations) / elapsed},
+                    **self._latencies(durations, 1_000_000)))
+            # Atraso entre a chegada planejada da sessão e o início do atendimento
+            waits = self._latencies(self._waits, 0.001) if self._waits else None
+        return operations, waits
+
+def _run_threads(plans, arrivals, concurrency, think_time, recorder):
+    user_controller = UserController()
+    property_controller = PropertyController()
+    controllers = (user_controller, property_controller, VisitController(property_controller, user_controller),
+                   ReviewController(), MortgageController())
+
+    def run(plan, scheduled):
+        recorder.record_wait(time.perf_counter() - scheduled)
+        client = ControllerLoadClient(*controllers)
+        for name, method, kwargs in plan:
+            ok = True
+            start = time.perf_counter_ns()
+            try:
+                getattr(client, method)(**kwargs)
+            except ValueError:
+                ok = False
+            recorder.record(name, time.perf_counter_ns() - start, ok)
+            if think_time:
+                time.sleep(think_time)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        futures = []
+        for plan, offset in zip(plans, arrivals):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(run, plan, start + offset))
+        # result() propaga exceções inesperadas das threads
+        for future in futures:
+            future.result()
+
+async def _run_asyncio(plans, arrivals, concurrency, think_time, recorder):
+    # Hash de senhas e geocodificação rodam no executor, com tantas threads quanto sessões simultâneas
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        service = PortalService(executor)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(plan, scheduled):
+            async with semaphore:
+                recorder.record_wait(time.perf_counter() - scheduled)
+                client = ServiceLoadClient(service)
+                for name, method, kwargs in plan:
+                    ok = True
+                    start = time.perf_counter_ns()
+                    try:
+                        await getattr(client, method)(**kwargs)
+                    except (ValueError, HttpError):
+                        ok = False
+                    recorder.record(name, time.perf_counter_ns() - start, ok)
+                    if think_time:
+                        await asyncio.sleep(think_time)
+
+        start = time.perf_counter()
+        tasks = []
+        for plan, offset in zip(plans, arrivals):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(run(plan, start + offset)))
+        await asyncio.gather(*tasks)
+
+def run_load_test(scale="10k", driver="threads", concurrency=16, sessions=500, arrival_rate=None,
+                  think_time=0.0, seed=42, output=None, geocoder=None):
+    "Reproduz sessões de usuários concorrentes sobre dados sintéticos e relata vazão e p50/p95/p99 por operação"
+    if driver not in LOAD_TEST_DRIVERS:
+        raise ValueError(f"Driver inválido. Escolha entre {list(LOAD_TEST_DRIVERS)}.")
+    if concurrency < 1 or sessions < 1:
+        raise ValueError("Concorrência e número de sessões devem ser positivos.")
+    if arrival_rate is not None and arrival_rate <= 0:
+        raise ValueError("A taxa de chegada deve ser positiva.")
+    if think_time < 0:
+        raise ValueError("O tempo de pausa não pode ser negativo.")
+
+    # Geocodificação offline: a carga não depende da rede nem dos limites do Nominatim
+    use_geocoder(geocoder or LocalGeocoder())
+    counts = generate_synthetic_data(scale, seed)
+    with db.lock.read():
+        property_ids = [prop.id for prop in db.properties]
+        client_emails = [user.email for user in db.users if user.get_role() == "Cliente"]
+
+    rng = random.Random(seed)
+    kinds, weights = zip(*LOAD_TEST_SESSIONS.items())
+    session_kinds = rng.choices(kinds, weights, k=sessions)
+    plans = [plan_session(rng, kind, number, seed, client_emails, property_ids)
+             for number, kind in enumerate(session_kinds)]
+    # Sem taxa de chegada, todas as sessões entram de uma vez e a concorrência limita a carga (laço fechado);
+    # com taxa, as chegadas seguem um processo de Poisson (laço aberto)
+    arrivals = [0.0] * sessions
+    if arrival_rate is not None:
+        offset = 0.0
+        for number in range(sessions):
+            offset += rng.expovariate(arrival_rate)
+            arrivals[number] = offset
+
+    recorder = LoadRecorder()
+    # Os controllers imprimem mensagens a cada cadastro; a saída é descartada durante a carga
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        start = time.perf_counter()
+        if driver == "threads":
+            _run_threads(plans, arrivals, concurrency, think_time, recorder)
+        else:
+            asyncio.run(_run_asyncio(plans, arrivals, concurrency, think_time, recorder))
+        elapsed = time.perf_counter() - start
+
+    operations, waits = recorder.summary(elapsed)
+    total = sum(operation["count"] for operation in operations)
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "seed": seed,
+        "counts": counts,
+        "driver": driver,
+        "concurrency": concurrency,
+        "arrival_rate": arrival_rate,
+        "think_time": think_time,
+        "sessions": dict(Counter(session_kinds)),
+        "elapsed_seconds": elapsed,
+        "throughput_sessions_per_s": sessions / elapsed,
+        "throughput_ops_per_s": total / elapsed,
+        "errors": sum(operation["errors"] for operation in operations),
+        "session_wait_ms": waits if arrival_rate is not None else None,
+        "operations": operations
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return report
+
+#profiling.py
+import cProfile
+import io
+import pstats
+import tracemalloc
+class OperationProfiler:
+    "Perfilamento opcional por operação: arquivos pstats, resumo top-N e amostras de alocação"
+
+    def __init__(self, output_dir=None, top_n=20, memory_every=0):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.memory_every = memory_every  # 0 desativa; N tira snapshots a cada N operações
+        self._stats = {}                  # operação -> pstats.Stats acumulado
+        self._allocations = {}            # operação -> linhas com os maiores aumentos de memória
+        self._sequence = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(output_dir, exist_ok=True)
+            if memory_every and not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @classmethod
+    def from_environment(cls, output_dir=None):
+        "Configura pelo argumento ou por PORTAL_PROFILE, PORTAL_PROFILE_TOP e PORTAL_PROFILE_MEMORY"
+        return cls(
+            output_dir or os.environ.get("PORTAL_PROFILE") or None,
+            top_n=int(os.environ.get("PORTAL_PROFILE_TOP", 20)),
+            memory_every=int(os.environ.get("PORTAL_PROFILE_MEMORY", 0))
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.output_dir)
+
+    @contextmanager
+    def operation(self, name):
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        sample_memory = self.memory_every and sequence % self.memory_every == 0
+        before = tracemalloc.take_snapshot() if sample_memory else None
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(os.path.join(self.output_dir, f"{name}-{sequence:04d}.prof"))
+            with self._lock:
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+            if before is not None:
+                self._record_allocations(name, before, tracemalloc.take_snapshot())
+
+    def _record_allocations(self, name, before, after):
+        # Considera apenas alocações feitas neste arquivo (modelos e controllers)
+        only_portal = [tracemalloc.Filter(True, __file__)]
+        differences = after.filter_traces(only_portal).compare_to(before.filter_traces(only_portal), "lineno")
+        lines = [str(difference) for difference in differences[:self.top_n] if difference.size_diff > 0]
+        with self._lock:
+            self._allocations[name] = lines
+
+    def write_summary(self):
+        "Grava summary.txt com as funções mais custosas por operação (tempo acumulado)"
+        if not self.enabled or not self._stats:
+            return None
+        path = os.path.join(self.output_dir, "summary.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            for name, stats in sorted(self._stats.items()):
+                buffer = io.StringIO()
+                stats.stream = buffer
+                stats.sort_stats("cumulative").print_stats(self.top_n)
+                file.write(f"===== {name} =====\n{buffer.getvalue()}\n")
+                if name in self._allocations:
+                    file.write(f"----- Alocações ({name}) -----\n")
+                    file.write("\n".join(self._allocations[name]) + "\n\n")
+        return path
 
 #main.py
-def agendamento_menu(logged_user, visit_controller):
+def agendamento_menu(logged_user, visit_controller, profiler=None):
+    profiler = profiler or OperationProfiler()
     while True:
         print("\n===== Agendamento de Compromissos =====")
         print("1. Agendar visita")
@@ -919,12 +4862,13 @@ def agendamento_menu(logged_user, visit_controller):
 
                 # Agendar visita
                 try:
-                    new_visit = visit_controller.schedule_visit(
-                        id=len(db.get_visits()) + 1,
-                        client_id=logged_user.id,
-                        property_id=property_id,
-                        date_time=date_time
-                    )
+                    with profiler.operation("scheduling"):
+                        new_visit = visit_controller.schedule_visit(
+                            id=None,  # O ID será atribuído pelo banco de dados
+                            client_id=logged_user.id,
+                            property_id=property_id,
+                            date_time=date_time
+                        )
                     print(f"Visita agendada com sucesso!\n{new_visit}")
                 except ValueError as e:
                     print(f"Erro ao agendar a visita: {e}")
@@ -959,7 +4903,8 @@ def agendamento_menu(logged_user, visit_controller):
         else:
             print("Opção inválida. Tente novamente.")
 
-def menu():
+def menu(profiler=None):
+    profiler = profiler or OperationProfiler()  # Sem diretório de saída o perfilamento fica desligado
     user_controller = UserController()
     property_controller = PropertyController()
     mortgage_controller = MortgageController()
@@ -1024,22 +4969,53 @@ def menu():
                         agent = logged_user
                     )
                     print(f"Propriedade '{new_property.title}' cadastrada com sucesso!")
+                    duplicates = property_controller.find_possible_duplicates(new_property.id)
+                    if duplicates:
+                        print(f"Atenção: anúncio parecido com as propriedades {duplicates}.")
 
             elif option == "4":
                 print("\n===== Buscar Propriedades =====")
-                search_by = input("Buscar por: 0 - Todas | 1 - Localização | 2 - Tipo | 3 - Faixa de preço: ")
+                search_by = input("Buscar por: 0 - Todas | 1 - Localização | 2 - Tipo | 3 - Faixa de preço | 4 - Combinada: ")
                 if search_by == "0":
-                    results = property_controller.search_all_properties()
+                    with profiler.operation("search"):
+                        results = property_controller.search_all_properties()
                 elif search_by == "1":
                     location = input("Digite a localização: ")
-                    results = property_controller.search_property_by_location(location)
+                    with profiler.operation("search"):
+                        results = property_controller.search_property_by_location(location)
                 elif search_by == "2":
                     property_category = input("Digite o tipo do imóvel (Casa/Apartamento/Terreno): ")
-                    results = property_controller.search_property_by_type(property_category)
+                    with profiler.operation("search"):
+                        results = property_controller.search_property_by_type(property_category)
                 elif search_by == "3":
                     min_price = float(input("Digite o preço mínimo: "))
                     max_price = float(input("Digite o preço máximo: "))
-                    results = property_controller.search_property_by_price_range(min_price, max_price)
+                    with profiler.operation("search"):
+                        results = property_controller.search_property_by_price_range(min_price, max_price)
+                elif search_by == "4":
+                    # Critérios deixados em branco são ignorados
+                    location = input("Digite a localização (opcional): ")
+                    property_category = input("Digite o tipo do imóvel (opcional): ")
+                    transaction_type = input("Digite o tipo de transação (Venda/Aluguel, opcional): ").capitalize()
+                    min_price = input("Digite o preço mínimo (opcional): ")
+                    max_price = input("Digite o preço máximo (opcional): ")
+                    only_available = input("Somente disponíveis? (s/n): ").lower() == "s"
+                    sort_by = input("Ordenar por (price/title/location, opcional): ")
+                    limit = input("Quantidade máxima de resultados (opcional): ")
+                    query = (
+                        PropertyQuery()
+                        .where_location(location)
+                        .where_category(property_category)
+                        .where_transaction(transaction_type)
+                        .where_price(float(min_price) if min_price else None, float(max_price) if max_price else None)
+                        .paginate(int(limit) if limit else None)
+                    )
+                    if only_available:
+                        query.where_available()
+                    if sort_by:
+                        query.order_by(sort_by)
+                    with profiler.operation("search"):
+                        results = property_controller.search_properties(query)
                 else:
                     print("Opção inválida.")
                     return
@@ -1056,13 +5032,14 @@ def menu():
                 interest_rate = float(input("Digite a taxa de juros anual (em %): "))
                 years = int(input("Digite o período de pagamento (em anos): "))
 
-                mortgage = mortgage_controller.calculate_mortgage(price, interest_rate, years)
+                with profiler.operation("mortgage"):
+                    mortgage = mortgage_controller.calculate_mortgage(price, interest_rate, years)
 
                 print(f"\nValor da parcela mensal: R$ {mortgage.monthly_payment:.2f}")
                 print(f"Valor total do financiamento: R$ {mortgage.total_payment:.2f}")
 
             elif option == "6":
-                agendamento_menu(logged_user, visit_controller)  # Chama o menu de agendamento
+                agendamento_menu(logged_user, visit_controller, profiler)  # Chama o menu de agendamento
 
             elif option == "7":
                 print("\n===== Avaliar Propriedade =====")
@@ -1102,7 +5079,8 @@ def menu():
             elif option == "9":
                 print("\n===== Análise de Mercado =====")
                 location = input("Digite a localização para análise de mercado: ")
-                analysis = market_analysis_controller.get_market_analysis(location)
+                with profiler.operation("market_analysis"):
+                    analysis = market_analysis_controller.get_market_analysis(location)
 
                 if analysis:
                     print(f"\nPreço Médio: R$ {analysis['avg_price']:.2f}")
@@ -1120,6 +5098,9 @@ def menu():
 
             elif option == "0":
                 print("Saindo do sistema...")
+                summary = profiler.write_summary()
+                if summary:
+                    print(f"Resumo do perfilamento gravado em {summary}")
                 break
 
             else:
@@ -1129,5 +5110,333 @@ def menu():
             print(f"\nErro inesperado: {e}")
             print("Voltando ao menu principal...")
 
+#cli.py
+import argparse
+import sys
+@contextmanager
+def _open_stream(path, mode, default):
+    # "-" ou None usam stdin/stdout
+    if path in (None, "-"):
+        yield default
+    else:
+        with open(path, mode, encoding="utf-8") as stream:
+            yield stream
+
+def _write_jsonl(output, record):
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def _read_jsonl(stream):
+    # Linhas vazias são ignoradas; linhas inválidas (ou que não são objetos) viram um registro de erro
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"JSON inválido: {e}"
+            continue
+        if isinstance(data, dict):
+            yield number, data, None
+        else:
+            yield number, None, "Linha inválida: esperado um objeto JSON."
+
+def command_menu(args, profiler):
+    menu(profiler)
+
+def command_serve(args, profiler):
+    run_service(args.host, args.port)
+
+def command_benchmark(args, profiler):
+    report = run_benchmarks(args.scale, args.iterations, args.seed, args.output, profiler)
+    if not args.output:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def command_stress(args, profiler):
+    # Os controllers imprimem uma mensagem por operação; só o resumo vai para a saída
+    try:
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+            counts = run_stress_test(args.workers, args.operations, args.seed)
+    except RuntimeError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps({"operations": counts, "consistent": True}, ensure_ascii=False))
+
+def command_loadtest(args, profiler):
+    report = run_load_test(args.scale, args.driver, args.concurrency, args.sessions, args.rate,
+                           args.think_time, args.seed, args.output)
+    if not args.output:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+def command_search(args, profiler):
+    property_controller = PropertyController()
+    with _open_stream(args.input, "r", sys.stdin) as source, _open_stream(args.output, "w", sys.stdout) as output:
+        for number, data, error in _read_jsonl(source):
+            if error is None:
+                try:
+                    results = property_controller.search_properties(PropertyQuery.from_dict(data))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                _write_jsonl(output, {"line": number, "erro": error})
+                continue
+            records = [prop.id for prop in results] if args.ids_only else [property_to_dict(prop) for prop in results]
+            record = {"line": number, "query": data, "count": len(results), "results": records}
+            if args.facets:
+                record["facets"] = property_controller.facet_counts(PropertyQuery.from_dict(data))
+            _write_jsonl(output, record)
+
+def command_market(args, profiler):
+    market_analysis_controller = MarketAnalysisController(PropertyController())
+    locations = list(args.locations)
+    if args.input:
+        with _open_stream(args.input, "r", sys.stdin) as source:
+            locations += [line.strip() for line in source if line.strip()]
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        for location in locations:
+            analysis = market_analysis_controller.get_market_analysis(location)
+            _write_jsonl(output, {"location": location, "analysis": analysis})
+
+def command_report(args, profiler):
+    report = MarketAnalysisController(PropertyController()).get_market_report(args.group_by, args.workers)
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        write_market_report(report, output, args.format)
+
+def command_yields(args, profiler):
+    table = MarketAnalysisController(PropertyController()).get_rental_yields(
+        args.group_by == "category", args.min_listings, args.limit)
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        write_market_report(table, output, args.format, YIELD_FIELDS)
+
+def command_mortgage(args, profiler):
+    mortgage_controller = MortgageController()
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        for loan_amount in args.amounts:
+            for annual_rate in args.rates:
+                for years in args.years:
+                    mortgage = mortgage_controller.calculate_mortgage(loan_amount, annual_rate, years)
+                    _write_jsonl(output, {
+                        "loan_amount": loan_amount,
+                        "annual_rate": annual_rate,
+                        "years": years,
+                        "monthly_payment": round(mortgage.monthly_payment, 2),
+                        "total_payment": round(mortgage.total_payment, 2)
+                    })
+
+def command_affordable(args, profiler):
+    # Cada perfil é validado isoladamente; os válidos são respondidos em uma única chamada vetorizada
+    fields = ("monthly_payment", "annual_rate", "years", "down_payment")
+    lines = []
+    with _open_stream(args.input, "r", sys.stdin) as source:
+        for number, data, error in _read_jsonl(source):
+            if error is None:
+                try:
+                    Mortgage.max_affordable_price(*(data.get(name, 0) for name in fields))
+                except TypeError:
+                    error = "Perfil inválido: os campos devem ser numéricos."
+                except ValueError as e:
+                    error = str(e)
+            lines.append((number, data, error))
+    profiles = [data for _, data, error in lines if error is None]
+    results = iter(PropertyController().search_affordable_many(
+        *([profile.get(name, 0) for profile in profiles] for name in fields), args.limit
+    ) if profiles else [])
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        for number, profile, error in lines:
+            if error is not None:
+                _write_jsonl(output, {"line": number, "erro": error})
+                continue
+            result = next(results)
+            _write_jsonl(output, dict(
+                profile,
+                max_price=round(result["max_price"], 2),
+                within_budget=result["within_budget"],
+                properties=[prop.id if args.ids_only else property_to_dict(prop) for prop in result["properties"]]
+            ))
+
+def command_import(args, profiler):
+    property_controller = PropertyController()
+    imported = failed = 0
+    with _open_stream(args.input, "r", sys.stdin) as source, _open_stream(args.errors, "w", sys.stderr) as errors:
+        for number, data, error in _read_jsonl(source):
+            if error is None:
+                try:
+                    # Campos opcionais são validados antes da inserção: uma linha inválida não deixa rastro no catálogo
+                    listed_at = data.get("listed_at")
+                    if listed_at:
+                        listed_at = datetime.fromisoformat(listed_at)
+                    property_controller.create_property(
+                        property_type=data.get("property_category"),
+                        title=data.get("title"),
+                        description=data.get("description"),
+                        price=data.get("price"),
+                        location=data.get("location"),
+                        transaction_type=data.get("transaction_type"),
+                        agent=data.get("agent"),
+                        virtual_tour_url=data.get("virtual_tour_url"),
+                        available=data.get("available", True),
+                        listed_at=listed_at or None
+                    )
+                except (TypeError, ValueError) as e:
+                    error = str(e)
+            if error is None:
+                imported += 1
+            else:
+                failed += 1
+                _write_jsonl(errors, {"line": number, "erro": error})
+    print(json.dumps({"imported": imported, "failed": failed}), file=sys.stderr)
+    return imported, failed
+
+def command_duplicates(args, profiler):
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        for cluster in PropertyController().find_duplicate_clusters():
+            _write_jsonl(output, {"ids": cluster, "titles": [db.property_index.get(i).title for i in cluster]})
+
+def command_valuation(args, profiler):
+    valuation = MarketAnalysisController(PropertyController()).valuation
+    with _open_stream(args.input, "r", sys.stdin) as source, _open_stream(args.output, "w", sys.stdout) as output:
+        for number, data, error in _read_jsonl(source):
+            if error is None:
+                try:
+                    estimate = valuation.estimate(
+                        data.get("location"), data.get("property_category"), data.get("transaction_type"), args.k)
+                    _write_jsonl(output, dict(data, **estimate))
+                    continue
+                except (AttributeError, ValueError) as e:
+                    error = str(e)
+            _write_jsonl(output, dict(data or {}, erro=error, line=number))
+
+def command_export(args, profiler):
+    with _open_stream(args.output, "w", sys.stdout) as output:
+        for prop in PropertyController().search_all_properties():
+            _write_jsonl(output, property_to_dict(prop))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Portal de Imóveis")
+    parser.add_argument("--profile", metavar="DIR", help="grava perfis cProfile por operação em DIR")
+    parser.add_argument("--synthetic", metavar="ESCALA", help="carrega dados sintéticos antes do comando (10k, 100k, 1m ou número)")
+    parser.add_argument("--import-file", metavar="ARQUIVO", help="importa propriedades (JSONL) antes do comando")
+    parser.add_argument("--local-geocoder", action="store_true", help="geocodificação offline (cidades dos dados sintéticos)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("menu", help="menu interativo (padrão)").set_defaults(handler=command_menu)
+
+    serve = subparsers.add_parser("serve", help="serviço HTTP/JSON")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.set_defaults(handler=command_serve)
+
+    benchmark = subparsers.add_parser("benchmark", help="benchmark dos controllers com dados sintéticos")
+    benchmark.add_argument("scale", nargs="?", default="10k")
+    benchmark.add_argument("-o", "--output", help="arquivo JSON do relatório")
+    benchmark.add_argument("--iterations", type=int, default=200)
+    benchmark.add_argument("--seed", type=int, default=42)
+    benchmark.set_defaults(handler=command_benchmark)
+
+    stress = subparsers.add_parser("stress", help="leituras e escritas concorrentes seguidas da verificação de consistência")
+    stress.add_argument("--workers", type=int, default=8)
+    stress.add_argument("--operations", type=int, default=2000)
+    stress.add_argument("--seed", type=int, default=42)
+    stress.set_defaults(handler=command_stress)
+
+    loadtest = subparsers.add_parser("loadtest", help="teste de carga com sessões de usuários concorrentes")
+    loadtest.add_argument("scale", nargs="?", default="10k")
+    loadtest.add_argument("--driver", choices=LOAD_TEST_DRIVERS, default="threads",
+                          help="threads chama os controllers; asyncio usa a camada de serviço")
+    loadtest.add_argument("-c", "--concurrency", type=int, default=16, help="sessões simultâneas")
+    loadtest.add_argument("--sessions", type=int, default=500)
+    loadtest.add_argument("--rate", type=float, help="chegadas de sessões por segundo (padrão: todas de uma vez)")
+    loadtest.add_argument("--think-time", type=float, default=0.0, help="pausa em segundos entre os passos")
+    loadtest.add_argument("--seed", type=int, default=42)
+    loadtest.add_argument("-o", "--output", help="arquivo JSON do relatório")
+    loadtest.set_defaults(handler=command_loadtest)
+
+    search = subparsers.add_parser("search", help="executa consultas JSONL (uma por linha) e grava resultados JSONL")
+    search.add_argument("-i", "--input", default="-", help="arquivo de consultas (padrão: stdin)")
+    search.add_argument("-o", "--output", default="-", help="arquivo de resultados (padrão: stdout)")
+    search.add_argument("--ids-only", action="store_true", help="grava apenas os IDs das propriedades")
+    search.add_argument("--facets", action="store_true", help="inclui contagens por categoria, transação, disponibilidade e cidade")
+    search.set_defaults(handler=command_search)
+
+    market = subparsers.add_parser("market", help="relatórios de mercado por localização")
+    market.add_argument("locations", nargs="*", help="localizações")
+    market.add_argument("-i", "--input", help="arquivo com uma localização por linha ('-' para stdin)")
+    market.add_argument("-o", "--output", default="-")
+    market.set_defaults(handler=command_market)
+
+    report = subparsers.add_parser("report", help="relatório de mercado de todas as localizações em uma passada")
+    report.add_argument("--group-by", choices=["location", "city"], default="location")
+    report.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    report.add_argument("--workers", type=int, help="processos auxiliares (padrão: número de CPUs)")
+    report.add_argument("-o", "--output", default="-")
+    report.set_defaults(handler=command_report)
+
+    yields = subparsers.add_parser("yields", help="ranking de rendimento bruto de aluguel por cidade e categoria")
+    yields.add_argument("--group-by", choices=["category", "city"], default="category")
+    yields.add_argument("--min-listings", type=int, default=1, help="mínimo de anúncios de venda e de aluguel")
+    yields.add_argument("--limit", type=int)
+    yields.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    yields.add_argument("-o", "--output", default="-")
+    yields.set_defaults(handler=command_yields)
+
+    mortgage = subparsers.add_parser("mortgage", help="grade de simulações de financiamento")
+    mortgage.add_argument("--amounts", type=float, nargs="+", required=True)
+    mortgage.add_argument("--rates", type=float, nargs="+", required=True)
+    mortgage.add_argument("--years", type=int, nargs="+", required=True)
+    mortgage.add_argument("-o", "--output", default="-")
+    mortgage.set_defaults(handler=command_mortgage)
+
+    affordable = subparsers.add_parser("affordable", help="imóveis à venda que cabem na parcela de cada perfil JSONL")
+    affordable.add_argument("-i", "--input", default="-", help="perfis com monthly_payment, annual_rate, years e down_payment")
+    affordable.add_argument("-o", "--output", default="-")
+    affordable.add_argument("--limit", type=int, default=20, help="imóveis por perfil, do mais caro ao mais barato (0: só contagens)")
+    affordable.add_argument("--ids-only", action="store_true", help="grava apenas os IDs das propriedades")
+    affordable.set_defaults(handler=command_affordable)
+
+    import_parser = subparsers.add_parser("import", help="importa propriedades de um arquivo JSONL")
+    import_parser.add_argument("-i", "--input", default="-")
+    import_parser.add_argument("--errors", default="-", help="arquivo JSONL de erros (padrão: stderr)")
+    import_parser.set_defaults(handler=command_import)
+
+    duplicates = subparsers.add_parser("duplicates", help="agrupa anúncios quase duplicados do catálogo")
+    duplicates.add_argument("-o", "--output", default="-")
+    duplicates.set_defaults(handler=command_duplicates)
+
+    valuation = subparsers.add_parser("valuation", help="sugere preços por comparáveis (JSONL com location, property_category e transaction_type)")
+    valuation.add_argument("-i", "--input", default="-")
+    valuation.add_argument("-o", "--output", default="-")
+    valuation.add_argument("-k", type=int, help="número de comparáveis (padrão: 10)")
+    valuation.set_defaults(handler=command_valuation)
+
+    export = subparsers.add_parser("export", help="exporta as propriedades em JSONL")
+    export.add_argument("-o", "--output", default="-")
+    export.set_defaults(handler=command_export)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # --profile DIR (ou PORTAL_PROFILE=DIR) grava um perfil cProfile por operação
+    profiler = OperationProfiler.from_environment(args.profile)
+    # O serviço usa o geocodificador local por padrão (PORTAL_GEOCODER=nominatim volta ao serviço externo)
+    geocoder = os.environ.get("PORTAL_GEOCODER", "local" if args.command == "serve" else "nominatim")
+    if args.local_geocoder or geocoder == "local":
+        use_geocoder(LocalGeocoder())
+    if args.synthetic:
+        generate_synthetic_data(args.synthetic)
+    if args.import_file:
+        command_import(argparse.Namespace(input=args.import_file, errors="-"), profiler)
+    handler = getattr(args, "handler", command_menu)
+    try:
+        # Comandos em lote formam uma única operação perfilada; o menu perfila cada opção
+        if handler in (command_menu, command_benchmark, command_serve, command_loadtest):
+            handler(args, profiler)
+        else:
+            with profiler.operation(args.command):
+                handler(args, profiler)
+            profiler.write_summary()
+    except BrokenPipeError:
+        # Saída encerrada antes do fim (ex.: "| head"): descarta o restante sem rastreamento de pilha
+        sys.stdout = open(os.devnull, "w")
+
 if __name__ == "__main__":
-    menu()
\ No newline at end of file
+    main()
@@ -0,0 +1,32 @@
+import pathlib
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import Completo
+
+
+@pytest.fixture(autouse=True)
+def offline_geocoder(monkeypatch):
+    "Geocodificação local em todos os testes: nada vai para a rede"
+    monkeypatch.setattr(Completo, "geolocator", Completo.LocalGeocoder())
+    Completo.geocode_cache.clear()
+
+
+@pytest.fixture
+def database(monkeypatch):
+    "Banco novo (com os dados iniciais) no lugar do global, com um cache de consultas próprio"
+    database = Completo.Database()
+    monkeypatch.setattr(Completo, "db", database)
+    # O cache global é invalidado pelas versões do banco original: o teste usa um ligado ao banco novo
+    monkeypatch.setattr(Completo, "query_cache", Completo.QueryCache(database.property_index.versions))
+    return database
+
+
+@pytest.fixture
+def fast_hash(monkeypatch):
+    "PBKDF2 com uma iteração: o custo real do hash não interessa aos testes de comportamento"
+    original = Completo.hash_password
+    monkeypatch.setattr(Completo, "hash_password", lambda password, salt=None: original(password, 1, salt))
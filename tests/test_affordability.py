@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pytest
+
+import Completo
+
+
+def test_max_loan_inverts_the_payment_formula():
+    controller = Completo.MortgageController()
+    for rate, years in ((10, 30), (7.5, 20), (0, 15)):
+        loan = Completo.Mortgage.max_loan_amount(4000, rate, years)
+        assert controller.calculate_mortgage(loan, rate, years).monthly_payment == pytest.approx(4000)
+
+
+def test_vectorized_prices_match_scalar_version():
+    payments, rates, years, down = [3000, 5000, 8000], [0, 9.5, 12], [10, 30, 35], [0, 50_000, 200_000]
+    vectorized = Completo.Mortgage.max_affordable_prices(payments, rates, years, down)
+    scalar = [Completo.Mortgage.max_affordable_price(*profile) for profile in zip(payments, rates, years, down)]
+    assert np.allclose(vectorized, scalar)
+    with pytest.raises(ValueError):
+        Completo.Mortgage.max_affordable_prices([1000, 0], 10, 30)
+
+
+def test_affordable_search_matches_brute_force(database):
+    Completo.generate_synthetic_data(600, database=database)
+    controller = Completo.PropertyController()
+    max_price, found = controller.search_affordable(6000, 10, 30, 100_000, limit=None)
+    expected = [prop for prop in database.properties
+                if prop.transaction_type == "Venda" and prop.available and prop.price <= max_price]
+    assert sorted(prop.id for prop in found) == sorted(prop.id for prop in expected)
+    assert [prop.price for prop in found] == sorted((prop.price for prop in found), reverse=True)
+
+
+def test_budget_counts_ignore_unavailable_listings(database):
+    controller = Completo.PropertyController()
+    prop = controller.create_property("Casa", "Casa Barata", "Teste", 10_000, "Centro, Recife", "Venda", "Agente")
+    before = controller.search_affordable_many([100], [0], [10])[0]
+    assert prop in before["properties"] and before["within_budget"] == len(before["properties"])
+
+    database.set_property_availability(prop, False)
+    after = controller.search_affordable_many([100], [0], [10])[0]
+    assert prop not in after["properties"]
+    assert after["within_budget"] == before["within_budget"] - 1
+
+
+def test_affordable_command_reports_invalid_profiles_per_line(database, tmp_path):
+    source, target = tmp_path / "perfis.jsonl", tmp_path / "saida.jsonl"
+    source.write_text("\n".join([
+        json.dumps({"monthly_payment": 5000, "annual_rate": 10, "years": 30}),
+        json.dumps({"annual_rate": 10, "years": 30}),
+        json.dumps({"monthly_payment": 5000, "annual_rate": -1, "years": 30}),
+        "{nao e json",
+        json.dumps({"monthly_payment": "muito", "annual_rate": 10, "years": 30}),
+        json.dumps({"monthly_payment": 8000, "annual_rate": 9, "years": 20, "down_payment": 10_000}),
+    ]), encoding="utf-8")
+    Completo.main(["affordable", "-i", str(source), "-o", str(target), "--ids-only"])
+
+    records = [json.loads(line) for line in target.read_text(encoding="utf-8").splitlines()]
+    assert [record.get("line") for record in records] == [None, 2, 3, 4, 5, None]
+    assert "positiva" in records[1]["erro"] and "negativa" in records[2]["erro"]
+    assert records[0]["max_price"] < records[5]["max_price"]
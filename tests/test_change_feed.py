@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+import Completo
+from test_http_service import http
+
+
+def filled_feed(count, retention=100):
+    feed = Completo.ChangeFeed(retention=retention)
+    for number in range(1, count + 1):
+        feed.record("property", number, "create")
+    return feed
+
+
+def test_read_resumes_after_a_sequence_number():
+    feed = filled_feed(10)
+    first = feed.read(0, limit=4)
+    assert [change.sequence for change in first] == [1, 2, 3, 4]
+    rest = feed.read(first[-1].sequence)
+    assert [change.sequence for change in rest] == list(range(5, 11))
+    assert feed.read(feed.last_sequence) == []
+
+
+def test_reading_behind_the_retention_window_fails():
+    feed = filled_feed(10, retention=3)
+    assert feed.first_available > 1
+    with pytest.raises(ValueError):
+        feed.read(0)
+    after = feed.first_available - 1
+    assert [change.sequence for change in feed.read(after)] == list(range(feed.first_available, 11))
+
+
+def test_model_updates_carry_before_and_after(database):
+    prop = next(iter(database.properties))
+    start = Completo.change_feed.last_sequence
+    Completo.PropertyController().update_property(prop.id, price=prop.price + 1)
+    change, = Completo.change_feed.read(start)
+    assert (change.entity, change.entity_id, change.operation, change.field) == ("property", prop.id, "update", "price")
+    assert change.after == change.before + 1
+
+
+def test_subscription_advances_only_after_the_callback():
+    feed = filled_feed(5)
+    batches = []
+
+    def callback(batch):
+        if not batches:
+            batches.append(None)
+            raise RuntimeError("consumidor indisponível")
+        batches.append([change.sequence for change in batch])
+
+    subscription = feed.subscribe(callback, since=2, batch_size=2)
+    with pytest.raises(RuntimeError):
+        subscription.poll()
+    assert subscription.position == 2  # O lote que falhou é entregue de novo
+    assert subscription.drain() == 3
+    assert batches[1:] == [[3, 4], [5]] and subscription.position == 5
+
+
+def test_background_subscription_receives_new_changes():
+    feed = filled_feed(3)
+    received = []
+    done = threading.Event()
+
+    def callback(batch):
+        received.extend(change.entity_id for change in batch)
+        if len(received) == 2:
+            done.set()
+
+    subscription = feed.subscribe(callback)  # Só alterações novas
+    subscription.start(timeout=0.05)
+    feed.record("property", 4, "create")
+    feed.record("property", 5, "delete")
+    assert done.wait(5)
+    subscription.stop()
+    assert received == [4, 5]
+
+
+def session(email, role):
+    Completo.UserController().register_user("Teste", email, "segredo", role)
+    return Completo.UserController().create_session(email, "segredo")
+
+
+def test_http_changes_reports_gone_outside_retention(database, monkeypatch, fast_hash):
+    token = session("agente@portal.com", "Agente")
+    monkeypatch.setattr(Completo, "change_feed", filled_feed(10, retention=3))
+    status, _ = http("GET", "/changes?since=0", token=token)
+    assert status == 410
+    status, payload = http("GET", "/changes?since=8&limit=1", token=token)
+    assert status == 200 and payload["next"] == 9 and payload["last_sequence"] == 10
+
+
+def test_http_changes_requires_an_agent_and_hides_user_data(database, fast_hash):
+    client = session("ana@portal.com", "Cliente")
+    agent = session("agente@portal.com", "Agente")
+    start = Completo.change_feed.last_sequence
+    user = Completo.db.find_user_by_email("ana@portal.com")
+    user.name = "Ana Souza"
+
+    assert http("GET", f"/changes?since={start}")[0] == 401
+    assert http("GET", f"/changes?since={start}", token=client)[0] == 403
+    status, payload = http("GET", f"/changes?since={start}", token=agent)
+    assert status == 200
+    change, = [change for change in payload["changes"] if change["entity"] == "user"]
+    assert change["field"] == "name" and change["before"] is None and change["after"] is None
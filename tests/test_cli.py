@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+
+import Completo
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines), encoding="utf-8")
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_search_reports_malformed_lines(database, tmp_path):
+    source, target = tmp_path / "consultas.jsonl", tmp_path / "saida.jsonl"
+    write_lines(source, [{"category": "Casa"}, "[1, 2]", "{quebrado", {"limit": "dez"}, {"location": "Recife", "limit": 2}])
+    Completo.main(["search", "-i", str(source), "-o", str(target), "--ids-only"])
+
+    records = read_records(target)
+    assert [record["line"] for record in records] == [1, 2, 3, 4, 5]
+    assert "objeto JSON" in records[1]["erro"] and "JSON inválido" in records[2]["erro"]
+    assert records[3]["erro"] == "Parâmetro inválido: limit"
+    assert records[0]["count"] == sum(1 for prop in database.properties if prop.property_category == "Casa")
+    assert len(records[4]["results"]) <= 2
+
+
+def test_import_reports_malformed_lines_without_partial_inserts(database, tmp_path):
+    source, errors = tmp_path / "imoveis.jsonl", tmp_path / "erros.jsonl"
+    listing = {"property_category": "Casa", "title": "Casa Importada", "description": "Nova", "price": 400_000,
+               "location": "Centro, Recife", "transaction_type": "Venda", "agent": "Agente"}
+    write_lines(source, [listing, "[1, 2]", "42", dict(listing, title="Outra", listed_at="ontem"),
+                         dict(listing, title="Sem preço", price=None)])
+    before = len(database.properties)
+    Completo.main(["import", "-i", str(source), "--errors", str(errors)])
+
+    assert [record["line"] for record in read_records(errors)] == [2, 3, 4, 5]
+    assert len(database.properties) == before + 1
+    assert database.property_index.contains_title_location("Casa Importada", "Centro, Recife")
+
+
+def test_valuation_reports_malformed_lines(database, tmp_path):
+    source, target = tmp_path / "avaliar.jsonl", tmp_path / "saida.jsonl"
+    write_lines(source, ['"Recife"', {"location": "Boa Viagem, Recife", "property_category": "Casa",
+                                      "transaction_type": "Venda"}])
+    Completo.main(["--local-geocoder", "valuation", "-i", str(source), "-o", str(target)])
+    records = read_records(target)
+    assert records[0]["line"] == 1 and "objeto JSON" in records[0]["erro"]
+    assert records[1]["location"] == "Boa Viagem, Recife"
+
+
+def test_report_writes_one_row_per_group(database, tmp_path, capsys):
+    target = tmp_path / "relatorio.csv"
+    Completo.main(["report", "--group-by", "city", "--format", "csv", "--workers", "1", "-o", str(target)])
+    rows = list(csv.DictReader(io.StringIO(target.read_text(encoding="utf-8"))))
+    cities = {prop.location.rsplit(",", 1)[-1].strip() for prop in database.properties}
+    assert [row["location"] for row in rows] == sorted(cities)
+    assert sum(int(row["num_properties"]) for row in rows) == len(database.properties)
+
+    Completo.main(["report", "--workers", "1"])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == len({prop.location for prop in database.properties})
+    assert all(json.loads(line)["num_properties"] > 0 for line in lines)
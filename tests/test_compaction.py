@@ -0,0 +1,65 @@
+import pytest
+
+import Completo
+
+
+class Item:
+    def __init__(self, id):
+        self.id = id
+
+
+def test_tombstone_list_removes_in_place_until_compaction():
+    items = [Item(number) for number in range(10)]
+    tombstones = Completo.TombstoneList(items)
+    for item in items[::3]:
+        tombstones.remove(item)
+    survivors = [item for item in items if item.id % 3]
+
+    assert list(tombstones) == survivors and len(tombstones) == len(survivors)
+    assert items[0] not in tombstones and items[1] in tombstones
+    assert tombstones.tombstones == 4
+    with pytest.raises(ValueError):
+        tombstones.remove(items[0])
+
+    assert tombstones.compact() == items[::3]
+    assert tombstones.tombstones == 0 and tombstones.compact() == []
+    tombstones.remove(survivors[-1])  # Posições reconstruídas após a compactação
+    assert list(tombstones) == survivors[:-1]
+
+
+def test_compaction_cascades_to_related_records(database, fast_hash):
+    users = Completo.UserController()
+    properties = Completo.PropertyController()
+    client = users.register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    other = users.register_user("Bia", "bia@portal.com", "segredo", "Cliente")
+    doomed, kept = list(database.properties)[:2]
+    visits = Completo.VisitController(properties, users)
+    lost_visit = visits.schedule_visit(None, client.id, doomed.id, "2026-01-01 10:00")
+    kept_visit = visits.schedule_visit(None, client.id, kept.id, "2026-01-02 10:00")
+    other_visit = visits.schedule_visit(None, other.id, kept.id, "2026-01-03 10:00")
+    client.schedule_visit(lost_visit)
+    client.schedule_visit(kept_visit)
+    reviews = Completo.ReviewController()
+    lost_reviews = [reviews.add_review(client.id, doomed.id, 4, "Bom"), reviews.add_review(other.id, kept.id, 5, "Ótimo")]
+    inquiries = Completo.InquiryController()
+    lost_inquiry = inquiries.add_inquiry(client, doomed, "Aceita permuta?")
+    inquiries.add_inquiry(client, kept, "Aceita permuta?")
+
+    properties.delete_property(doomed.id)
+    users.delete_user(other.id)
+    assert lost_visit in database.visits  # Nada é removido em cascata antes da compactação
+    sequence = Completo.change_feed.last_sequence
+
+    summary = database.compact()
+    assert summary == {"properties": 1, "users": 1, "visits": 2, "reviews": 2, "inquiries": 1}
+    assert list(database.visits) == [kept_visit]
+    assert list(database.reviews) == []
+    assert client.list_scheduled_visits() == [kept_visit]
+    assert [inquiry.property for inquiry in inquiries.list_inquiries()] == [kept]
+    if isinstance(doomed.agent, Completo.Agent):
+        assert doomed not in doomed.agent.list_properties()
+    deleted = {(change.entity, change.entity_id) for change in Completo.change_feed.read(sequence)
+               if change.operation == "delete"}
+    assert deleted == {("visit", lost_visit.id), ("visit", other_visit.id), ("inquiry", lost_inquiry.id)} \
+        | {("review", review.id) for review in lost_reviews}
+    assert database.tombstones() == 0
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+import Completo
+
+
+def test_readers_share_the_lock_and_writers_are_exclusive():
+    lock = Completo.ReadWriteLock()
+    active = {"readers": 0, "max_readers": 0, "writers": 0}
+    guard = threading.Lock()
+    errors = []
+
+    def reader():
+        with lock.read():
+            with guard:
+                active["readers"] += 1
+                active["max_readers"] = max(active["max_readers"], active["readers"])
+                if active["writers"]:
+                    errors.append("leitura durante escrita")
+            time.sleep(0.02)
+            with guard:
+                active["readers"] -= 1
+
+    def writer():
+        with lock.write():
+            with guard:
+                active["writers"] += 1
+                if active["readers"] or active["writers"] > 1:
+                    errors.append("escrita concorrente")
+            time.sleep(0.01)
+            with guard:
+                active["writers"] -= 1
+
+    threads = [threading.Thread(target=reader if number % 3 else writer) for number in range(24)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert active["max_readers"] > 1
+
+
+def test_lock_is_reentrant_but_not_upgradable():
+    lock = Completo.ReadWriteLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+    with lock.read():
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                with lock.write():
+                    pass
+
+
+def test_stress_test_leaves_database_consistent(database, fast_hash):
+    counts = Completo.run_stress_test(workers=8, operations=600, seed=7)
+    assert sum(counts.values()) == 600
+    Completo.check_database_consistency()
+
+
+def test_consistency_check_detects_a_broken_index(database):
+    prop = next(iter(database.properties))
+    database.property_index.remove(prop)
+    with pytest.raises(RuntimeError):
+        Completo.check_database_consistency()
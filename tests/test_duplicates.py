@@ -0,0 +1,40 @@
+import Completo
+
+DESCRIPTION = ("Casa ampla com três quartos, suíte, varanda gourmet, quintal com piscina, "
+               "garagem para dois carros e acabamento de alto padrão perto do parque.")
+
+
+def create(controller, title, location, description=DESCRIPTION):
+    return controller.create_property("Casa", title, description, 750_000, location, "Venda", "Agente")
+
+
+def test_near_duplicates_are_flagged_within_the_same_segment(database):
+    controller = Completo.PropertyController()
+    original = create(controller, "Casa com piscina no Espinheiro", "Espinheiro, Recife")
+    copy = create(controller, "Casa c/ piscina no Espinheiro!", "Espinheiro, Recife")
+    elsewhere = create(controller, "Casa com piscina no Espinheiro", "Centro, Curitiba")
+    unrelated = create(controller, "Apartamento compacto", "Boa Viagem, Recife", "Studio mobiliado ao lado do metrô.")
+
+    assert controller.find_possible_duplicates(copy.id) == [original.id]
+    assert controller.find_possible_duplicates(elsewhere.id) == []  # Outra cidade: outro segmento
+    assert controller.find_possible_duplicates(unrelated.id) == []
+    assert [original.id, copy.id] in controller.find_duplicate_clusters()
+
+    controller.delete_property(original.id)
+    assert controller.find_possible_duplicates(copy.id) == []
+    assert all(original.id not in group for group in controller.find_duplicate_clusters())
+
+
+def test_signature_similarity_estimates_jaccard():
+    detector = Completo.DuplicateDetector()
+    base = Completo.PropertyFactory.create_property(
+        property_type="Casa", property_id=1, title="Casa", description=DESCRIPTION,
+        price=1, location="Centro, Recife", transaction_type="Venda", agent="Agente")
+    for cut in (10, 40, 80):
+        other = Completo.PropertyFactory.create_property(
+            property_type="Casa", property_id=2, title="Casa", description=DESCRIPTION[:-cut],
+            price=1, location="Centro, Recife", transaction_type="Venda", agent="Agente")
+        first, second = detector._shingles(base), detector._shingles(other)
+        jaccard = len(first & second) / len(first | second)
+        estimate = detector.similarity(detector.signature(base), detector.signature(other))
+        assert abs(estimate - jaccard) < 0.15, (cut, jaccard, estimate)
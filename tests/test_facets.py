@@ -0,0 +1,58 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import Completo
+
+
+def brute_force(database, query):
+    # Facetas disjuntivas: cada faceta ignora o próprio critério
+    def without(facet):
+        clone = Completo.PropertyQuery()
+        clone.property_category = None if facet == "property_category" else query.property_category
+        clone.transaction_type = None if facet == "transaction_type" else query.transaction_type
+        clone.available = None if facet == "available" else query.available
+        clone.location, clone.price_min, clone.price_max = query.location, query.price_min, query.price_max
+        return [prop for prop in database.properties if clone.matches(prop)]
+
+    keys = {
+        "property_category": lambda prop: prop.property_category.capitalize(),
+        "transaction_type": lambda prop: prop.transaction_type,
+        "available": lambda prop: prop.available,
+        "city": lambda prop: prop.location.rsplit(",", 1)[-1].strip(),
+    }
+    return {
+        "total": sum(1 for prop in database.properties if query.matches(prop)),
+        "facets": {facet: dict(Counter(key(prop) for prop in without(facet))) for facet, key in keys.items()},
+    }
+
+
+@pytest.mark.parametrize("native", [True, False])
+def test_counts_match_brute_force(database, monkeypatch, native):
+    if not native:
+        monkeypatch.setattr(Completo, "_bitwise_count", None)  # Caminho do NumPy < 2.0
+    Completo.generate_synthetic_data(500, database=database)
+    controller = Completo.PropertyController()
+    for prop in list(database.properties)[:40]:
+        controller.switch_property_status(prop.id)
+    controller.delete_property(next(iter(database.properties)).id)
+
+    for query in (Completo.PropertyQuery(),
+                  Completo.PropertyQuery().where_category("Casa").where_available(True),
+                  Completo.PropertyQuery().where_transaction("Aluguel").where_price(1_000, 600_000),
+                  Completo.PropertyQuery().where_location("Recife")):
+        result = controller.facet_counts(query)
+        expected = brute_force(database, query)
+        assert result["total"] == expected["total"]
+        for facet, counts in expected["facets"].items():
+            assert result["facets"][facet] == counts, facet
+
+
+def test_popcount_fallback_matches_native(monkeypatch):
+    words = np.random.default_rng(3).integers(0, 2**63, size=257, dtype=np.int64).astype(np.uint64)
+    words[0] = np.uint64(2**64 - 1)
+    expected = sum(bin(int(word)).count("1") for word in words)
+    monkeypatch.setattr(Completo, "_bitwise_count", None)
+    assert Completo._popcount(words) == expected
+    assert Completo._popcount(words[::2]) == sum(bin(int(word)).count("1") for word in words[::2])
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+
+import Completo
+
+
+def request(raw, eof=False):
+    "Envia bytes crus a um HttpServer novo e devolve (status, corpo JSON)"
+    async def scenario():
+        server = Completo.HttpServer(Completo.PortalService(), port=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(raw)
+        if eof:
+            writer.write_eof()
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        await server.close()
+        return response
+
+    head, _, body = asyncio.run(scenario()).partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), json.loads(body)
+
+
+def http(method, path, body=None, token=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    headers = f"{method} {path} HTTP/1.1\r\nConnection: close\r\nContent-Length: {len(data)}\r\n"
+    if token:
+        headers += f"Authorization: Bearer {token}\r\n"
+    return request(headers.encode() + b"\r\n" + data)
+
+
+def test_invalid_content_length_is_bad_request(database):
+    status, payload = request(b"POST /reviews HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+    assert status == 400 and "Content-Length" in payload["erro"]
+
+
+def test_short_body_is_bad_request(database):
+    status, payload = request(b"POST /users HTTP/1.1\r\nContent-Length: 50\r\n\r\n{\"a\"", eof=True)
+    assert status == 400
+
+
+def test_wrong_field_types_are_bad_request(database, fast_hash):
+    Completo.UserController().register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    token = Completo.UserController().create_session("ana@portal.com", "segredo")
+    prop = next(iter(database.properties))
+
+    status, payload = http("POST", "/reviews", {"property_id": prop.id, "rating": "5", "comment": "Boa"}, token)
+    assert status == 400 and payload["erro"] == "Campo inválido: rating"
+    status, _ = http("POST", "/reviews", {"property_id": prop.id, "rating": True, "comment": "Boa"}, token)
+    assert status == 400
+    status, _ = http("PUT", "/preferences", {"categories": "Casa"}, token)
+    assert status == 400
+    status, payload = http("POST", "/reviews", {"property_id": prop.id, "rating": 5, "comment": "Boa"}, token)
+    assert status == 201 and payload["rating"] == 5
+
+
+def decode_chunked(body):
+    data = b""
+    while True:
+        size, _, rest = body.partition(b"\r\n")
+        size = int(size, 16)
+        if size == 0:
+            return data
+        data += rest[:size]
+        body = rest[size + 2:]
+
+
+def test_properties_are_paginated_and_streamed(database):
+    Completo.generate_synthetic_data(400, database=database)
+
+    async def scenario():
+        server = Completo.HttpServer(Completo.PortalService(), port=0)
+        await server.start()
+        responses = []
+        for path in ("/properties", "/properties?limit=250&sort=price"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(f"GET {path} HTTP/1.1\r\nConnection: close\r\n\r\n".encode())
+            responses.append(await reader.read())
+            writer.close()
+        await server.close()
+        return responses
+
+    for response, expected in zip(asyncio.run(scenario()), (100, 250)):
+        head, _, body = response.partition(b"\r\n\r\n")
+        assert b"Transfer-Encoding: chunked" in head
+        items = json.loads(decode_chunked(body))
+        assert len(items) == expected
+    prices = [item["price"] for item in items]
+    assert prices == sorted(prices)
+
+
+def test_writer_holding_the_lock_does_not_stall_the_event_loop(database):
+    async def scenario():
+        server = Completo.HttpServer(Completo.PortalService(), port=0)
+        await server.start()
+        loop = asyncio.get_running_loop()
+
+        async def get(path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(f"GET {path} HTTP/1.1\r\nConnection: close\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return loop.time(), response
+
+        locked = asyncio.Event()
+
+        def hold_write_lock():
+            with database.lock.write():
+                loop.call_soon_threadsafe(locked.set)
+                time.sleep(0.3)
+
+        holder = loop.run_in_executor(None, hold_write_lock)
+        await locked.wait()
+        start = loop.time()
+        search = asyncio.create_task(get("/properties"))
+        health_done, _ = await get("/health")
+        search_done, _ = await search
+        await holder
+        await server.close()
+        return health_done - start, search_done - start
+
+    health, search = asyncio.run(scenario())
+    assert health < 0.2 <= search
+
+
+def test_visits_are_listed_only_for_the_session_user(database, fast_hash):
+    users = Completo.UserController()
+    visits = Completo.VisitController(Completo.PropertyController(), users)
+    agent = users.register_user("Carlos", "carlos@portal.com", "segredo", "Agente")
+    prop = Completo.PropertyController().create_property(
+        "Casa", "Casa do Carlos", "Teste", 300_000, "Centro, Recife", "Venda", agent)
+    tokens = {}
+    for name in ("ana", "bia"):
+        client = users.register_user(name, f"{name}@portal.com", "segredo", "Cliente")
+        visits.schedule_visit(None, client.id, prop.id, "2026-01-01 10:00")
+        tokens[name] = users.create_session(f"{name}@portal.com", "segredo")
+    tokens["carlos"] = users.create_session("carlos@portal.com", "segredo")
+
+    assert http("GET", "/visits")[0] == 401
+    status, payload = http("GET", "/visits", token=tokens["ana"])
+    ana = Completo.db.find_user_by_email("ana@portal.com")
+    assert status == 200 and [visit["client_id"] for visit in payload] == [ana.id]
+    status, payload = http("GET", "/visits", token=tokens["carlos"])
+    assert status == 200 and len(payload) == 2
@@ -0,0 +1,83 @@
+import random
+import threading
+
+import Completo
+
+
+def make_inquiries(database, count=300):
+    Completo.generate_synthetic_data(400, database=database)
+    controller = Completo.InquiryController()
+    rng = random.Random(5)
+    properties = list(database.properties)
+    clients = [user for user in database.users if user.get_role() == "Cliente"]
+    for _ in range(count):
+        controller.add_inquiry(rng.choice(clients), rng.choice(properties), "Ainda está disponível?")
+    return controller, rng
+
+
+def test_indexes_follow_status_changes(database):
+    controller, rng = make_inquiries(database)
+    for inquiry in rng.sample(controller.list_inquiries(), 120):
+        inquiry.update_status(rng.choice(Completo.Inquiry.STATUSES))
+
+    everything = controller.list_inquiries()
+    agents = {inquiry.agent for inquiry in everything}
+    for agent in agents:
+        for status in Completo.Inquiry.STATUSES:
+            expected = [inquiry for inquiry in everything if inquiry.agent is agent and inquiry.status == status]
+            assert controller.list_by_agent(agent, status) == expected
+    for status in Completo.Inquiry.STATUSES:
+        assert sorted(i.id for i in controller.list_by_status(status)) == \
+            [i.id for i in everything if i.status == status]
+    assert sum(controller.count_by_status().values()) == len(everything)
+
+
+def test_next_batch_pops_pending_by_priority(database):
+    controller, rng = make_inquiries(database)
+    agent = max({i.agent for i in controller.list_inquiries()}, key=lambda a: len(controller.list_by_agent(a)))
+    pending = controller.list_by_agent(agent, "Pendente")
+    pending[0].update_status("Respondida")  # Entrada obsoleta no heap é ignorada
+    expected = sorted(pending[1:], key=controller._priority)
+
+    peek = controller.next_batch(agent, 3)
+    assert peek == expected[:3]
+    claimed = controller.next_batch(agent, 3, claim=True)
+    assert claimed == expected[:3] and all(i.status == "Em atendimento" for i in claimed)
+    assert controller.next_batch(agent, len(expected)) == expected[3:]
+
+
+def test_compaction_purges_inquiries_of_removed_properties(database):
+    controller, _ = make_inquiries(database)
+    target = controller.list_inquiries()[0].property
+    Completo.PropertyController().delete_property(target.id)
+    database.compact()
+    assert controller.list_by_property(target.id) == []
+    assert all(inquiry.property is not target for inquiry in controller.list_inquiries())
+    for agent in {i.agent for i in controller.list_inquiries()}:
+        assert all(i.property is not target for i in controller.list_by_agent(agent, "Pendente"))
+
+
+def test_concurrent_status_changes_keep_indexes_consistent(database):
+    controller, rng = make_inquiries(database, 400)
+    inquiries = controller.list_inquiries()
+    agents = list({inquiry.agent for inquiry in inquiries})
+
+    def reopen(seed):
+        local = random.Random(seed)
+        for _ in range(500):
+            local.choice(inquiries).update_status(local.choice(["Pendente", "Respondida"]))
+
+    def claim():
+        for _ in range(300):
+            controller.next_batch(rng.choice(agents), 5, claim=True)
+
+    threads = [threading.Thread(target=reopen, args=(seed,)) for seed in range(3)]
+    threads.append(threading.Thread(target=claim))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for inquiry in inquiries:
+        assert inquiry in controller.list_by_agent(inquiry.agent, inquiry.status)
+        assert (inquiry.id in controller._queued) == (inquiry.status == "Pendente")
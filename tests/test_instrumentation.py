@@ -0,0 +1,42 @@
+import pytest
+
+import Completo
+
+
+@pytest.fixture
+def instrumented():
+    Completo.metrics.reset()
+    Completo.enable_instrumentation()
+    yield Completo.metrics
+    Completo.disable_instrumentation()
+    Completo.metrics.reset()
+
+
+def calls(registry, method):
+    return {(row["class"], row["method"]): row for row in registry.to_json()}[("PropertyController", method)]
+
+
+def test_counts_survive_a_reset(database, instrumented):
+    controller = Completo.PropertyController()
+    controller.search_property_by_type("Casa")
+    controller.search_property_by_type("Casa")
+    assert calls(instrumented, "search_property_by_type")["calls"] == 2
+
+    instrumented.reset()
+    assert calls(instrumented, "search_property_by_type")["calls"] == 0
+    controller.search_property_by_type("Casa")
+    row = calls(instrumented, "search_property_by_type")
+    assert row["calls"] == 1 and sum(row["buckets"].values()) <= 1
+    assert 'portal_calls_total{class="PropertyController",method="search_property_by_type"} 1' \
+        in instrumented.to_prometheus()
+
+
+def test_errors_are_counted_and_methods_restored(database, instrumented):
+    with pytest.raises(ValueError):
+        Completo.ReviewController().add_review(1, 1, 9, "Nota inválida")
+    row = {(r["class"], r["method"]): r for r in instrumented.to_json()}[("ReviewController", "add_review")]
+    assert (row["calls"], row["errors"]) == (1, 1)
+    Completo.disable_instrumentation()
+    assert not Completo.instrumentation_enabled()
+    Completo.PropertyController().search_property_by_type("Casa")
+    assert calls(instrumented, "search_property_by_type")["calls"] == 0
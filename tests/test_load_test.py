@@ -0,0 +1,20 @@
+import pytest
+
+import Completo
+
+
+@pytest.mark.parametrize("driver", ["threads", "asyncio"])
+def test_load_test_runs_without_errors(database, fast_hash, driver):
+    report = Completo.run_load_test(300, driver=driver, concurrency=4, sessions=40, seed=3)
+    assert report["errors"] == 0
+    assert sum(report["sessions"].values()) == 40 and report["operations"]
+    for operation in report["operations"]:
+        assert operation["count"] > 0
+        assert operation["p50_ms"] <= operation["p95_ms"] <= operation["p99_ms"]
+
+
+def test_load_test_rejects_bad_parameters(database):
+    with pytest.raises(ValueError):
+        Completo.run_load_test(300, driver="processes")
+    with pytest.raises(ValueError):
+        Completo.run_load_test(300, arrival_rate=0)
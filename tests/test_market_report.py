@@ -0,0 +1,36 @@
+import csv
+import io
+
+import pytest
+
+import Completo
+
+
+def approx_rows(rows):
+    return [{key: pytest.approx(value) if isinstance(value, float) else value for key, value in row.items()}
+            for row in rows]
+
+
+@pytest.mark.parametrize("group_by", ["location", "city"])
+def test_parallel_report_matches_the_single_pass(database, group_by):
+    Completo.generate_synthetic_data(600, database=database)
+    serial = Completo.build_market_report(group_by, workers=1)
+    parallel = Completo.build_market_report(group_by, workers=3, parallel_threshold=1)
+    assert parallel == approx_rows(serial)
+
+    city = serial[0]["location"]
+    prices = [prop.price for prop in database.properties
+              if Completo.report_group_key(prop.location, group_by) == city]
+    assert serial[0]["num_properties"] == len(prices)
+    assert (serial[0]["min_price"], serial[0]["max_price"]) == (min(prices), max(prices))
+    assert serial[0]["avg_price"] == pytest.approx(sum(prices) / len(prices))
+
+
+def test_report_is_written_as_csv(database):
+    report = Completo.build_market_report("city", workers=1)
+    output = io.StringIO()
+    Completo.write_market_report(report, output, "csv")
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [row["location"] for row in rows] == [row["location"] for row in report]
+    with pytest.raises(ValueError):
+        Completo.write_market_report(report, output, "xml")
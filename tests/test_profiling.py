@@ -0,0 +1,28 @@
+import pstats
+import tracemalloc
+
+import Completo
+
+
+def test_profiled_command_writes_stats_and_allocations(database, tmp_path, monkeypatch):
+    monkeypatch.setenv("PORTAL_PROFILE_MEMORY", "1")
+    tracing = tracemalloc.is_tracing()
+    profile_dir = tmp_path / "perfis"
+    try:
+        Completo.main(["--profile", str(profile_dir), "report", "--workers", "1", "-o", str(tmp_path / "r.jsonl")])
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    profile, = profile_dir.glob("report-*.prof")
+    assert pstats.Stats(str(profile)).total_calls > 0
+    summary = (profile_dir / "summary.txt").read_text(encoding="utf-8")
+    assert "===== report =====" in summary and "build_market_report" in summary
+    assert "----- Alocações (report) -----" in summary
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    profiler = Completo.OperationProfiler()
+    with profiler.operation("search"):
+        pass
+    assert not profiler.enabled and profiler.write_summary() is None
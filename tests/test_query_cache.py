@@ -0,0 +1,94 @@
+import Completo
+
+
+def brute_force(database, query):
+    return sorted(prop.id for prop in database.properties if query.matches(prop))
+
+
+def cached_ids(query):
+    return sorted(prop.id for prop in Completo.PropertyController().search_properties(query))
+
+
+def queries():
+    return [
+        Completo.PropertyQuery().where_category("Casa"),
+        Completo.PropertyQuery().where_location("Recife"),
+        Completo.PropertyQuery().where_price(100_000, 900_000),
+        Completo.PropertyQuery().where_available(True).where_transaction("Venda"),
+        Completo.PropertyQuery(),
+    ]
+
+
+def assert_fresh(database):
+    for query in queries():
+        assert cached_ids(query) == brute_force(database, query), query
+
+
+def test_searches_are_invalidated_by_every_mutation_path(database):
+    Completo.generate_synthetic_data(300, database=database)
+    controller = Completo.PropertyController()
+    assert_fresh(database)  # Aquece o cache
+
+    created = controller.create_property("Casa", "Casa Nova", "Teste", 500_000, "Boa Viagem, Recife", "Venda", "Agente")
+    assert_fresh(database)
+    controller.update_property(created.id, price=50_000)
+    assert_fresh(database)
+    controller.update_property(created.id, location="Centro, Curitiba")
+    assert_fresh(database)
+    created.price = 900_000  # Setters diretos de campos indexados também passam pelo banco
+    assert_fresh(database)
+    created.location = "Boa Viagem, Recife"
+    assert_fresh(database)
+    created.property_category = "Apartamento"
+    created.transaction_type = "Aluguel"
+    assert_fresh(database)
+    created.update_details(price=20_000, title="Apartamento Novo")
+    assert_fresh(database)
+    controller.switch_property_status(created.id)
+    assert_fresh(database)
+    created.available = True  # Alteração direta no modelo também passa pelo banco
+    assert_fresh(database)
+    created.switch_status()
+    assert_fresh(database)
+    controller.delete_property(created.id)
+    assert_fresh(database)
+    database.compact()
+    assert_fresh(database)
+
+
+def test_cache_serves_repeated_searches_until_a_relevant_write(database):
+    controller = Completo.PropertyController()
+    query = Completo.PropertyQuery().where_category("Casa")
+
+    def hits_after_search():
+        controller.search_properties(query)
+        return Completo.query_cache.stats()["hits"]
+
+    assert hits_after_search() == 0
+    assert hits_after_search() == 1
+    controller.create_property("Apartamento", "Apto Novo", "Teste", 300_000, "Centro, Recife", "Venda", "Agente")
+    assert hits_after_search() == 2  # Outra categoria: a partição da consulta não mudou
+    controller.create_property("Casa", "Casa Nova", "Teste", 300_000, "Centro, Recife", "Venda", "Agente")
+    assert hits_after_search() == 2
+    assert Completo.query_cache.stats()["invalidations"] == 1
+
+
+def test_direct_field_changes_update_every_index(database):
+    controller = Completo.PropertyController()
+    market = Completo.MarketAnalysisController(controller)
+    created = controller.create_property("Casa", "Casa Nova", "Teste", 300_000, "Boa Viagem, Recife", "Venda", "Agente")
+    assert created in controller.search_property_by_price_range(0, 400_000)  # Aquece o cache
+
+    created.price = 900_000
+    assert created not in controller.search_property_by_price_range(0, 400_000)
+    query = Completo.PropertyQuery().where_price(800_000, 1_000_000).where_location("Recife")
+    assert controller.facet_counts(query)["facets"]["city"].get("Recife") == \
+        sum(1 for prop in database.properties if query.matches(prop))
+
+    created.title = "Casa Reformada"
+    created.location = "Centro, Curitiba"
+    assert database.property_index.contains_title_location("Casa Reformada", "Centro, Curitiba")
+    assert not database.property_index.contains_title_location("Casa Nova", "Boa Viagem, Recife")
+    curitiba = market.get_rental_yield("Curitiba")
+    assert curitiba is None or curitiba["num_sale"] == sum(
+        1 for prop in database.properties if prop.location.endswith("Curitiba") and prop.transaction_type == "Venda")
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import Completo
+
+
+def brute_force(database, query):
+    results = [prop for prop in database.properties if query.matches(prop)]
+    if query.sort_by:
+        results.sort(key=lambda prop: (getattr(prop, query.sort_by), prop.id), reverse=query.descending)
+    stop = None if query.limit is None else query.offset + query.limit
+    return [prop.id for prop in results[query.offset:stop]]
+
+
+def random_query(rng):
+    query = Completo.PropertyQuery()
+    if rng.random() < 0.4:
+        query.where_category(rng.choice(["Casa", "apartamento", "Terreno"]))
+    if rng.random() < 0.4:
+        query.where_transaction(rng.choice(["Venda", "Aluguel"]))
+    if rng.random() < 0.3:
+        query.where_location(rng.choice(["Recife", "Centro", "são paulo", "Curitiba"]))
+    if rng.random() < 0.4:
+        low = rng.choice([None, 1_000, 200_000])
+        query.where_price(low, rng.choice([None, 500_000, 2_000_000]))
+    if rng.random() < 0.3:
+        query.where_available(rng.random() < 0.7)
+    if rng.random() < 0.6:
+        query.order_by(rng.choice(sorted(Completo.PropertyQuery.SORT_FIELDS)), rng.random() < 0.5)
+    if rng.random() < 0.5:
+        query.paginate(rng.choice([1, 5, 20]), rng.choice([0, 3, 50]))
+    return query
+
+
+@pytest.fixture
+def catalog(database):
+    Completo.generate_synthetic_data(600, database=database)
+    controller = Completo.PropertyController()
+    for prop in list(database.properties)[::7]:
+        controller.switch_property_status(prop.id)
+    return database
+
+
+def test_planner_matches_brute_force(catalog):
+    rng = random.Random(11)
+    planner = Completo.QueryPlanner(catalog.property_index)
+    for _ in range(300):
+        query = random_query(rng)
+        ids = [prop.id for prop in planner.execute(query)]
+        if query.sort_by:
+            assert ids == brute_force(catalog, query), query.key()
+            continue
+        # Sem ordenação, a ordem (e portanto a página) depende do índice escolhido
+        everything = {prop.id for prop in catalog.properties if query.matches(prop)}
+        assert len(ids) == len(set(ids)) and set(ids) <= everything, query.key()
+        expected = len(everything) if query.limit is None else \
+            max(min(query.limit, len(everything) - query.offset), 0)
+        assert len(ids) == expected, query.key()
+
+
+def test_planner_picks_the_most_selective_index(catalog):
+    planner = Completo.QueryPlanner(catalog.property_index)
+    narrow = Completo.PropertyQuery().where_transaction("Venda").where_price(100_000, 100_500)
+    assert planner.plan(narrow)[0] == "price"
+    assert planner.plan(Completo.PropertyQuery())[0] == "scan"
+    assert planner.plan(Completo.PropertyQuery().order_by("price", True))[0] == "price"
+
+
+def test_paging_walks_the_sorted_results_without_gaps(catalog):
+    controller = Completo.PropertyController()
+    query = Completo.PropertyQuery().where_transaction("Aluguel").order_by("title")
+    expected = brute_force(catalog, query)
+    pages = []
+    for offset in range(0, len(expected) + 25, 25):
+        page = Completo.PropertyQuery().where_transaction("Aluguel").order_by("title").paginate(25, offset)
+        pages.extend(prop.id for prop in controller.search_properties(page))
+    assert pages == expected
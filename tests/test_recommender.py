@@ -0,0 +1,60 @@
+import numpy as np
+
+import Completo
+
+
+def rescored_with(model, price_stats):
+    "Refaz todas as linhas com as estatísticas de preço informadas (as de um fit anterior)"
+    model._price_stats = price_stats
+    for property_id, row in model._rows.items():
+        model._update_row(row, Completo.db.property_index.get(property_id))
+    return model
+
+
+def test_incremental_updates_match_a_full_refit(database, monkeypatch):
+    Completo.generate_synthetic_data(1500, database=database)
+    controller = Completo.PropertyController()
+    model = Completo.PropertyRecommender().fit()
+    fits = []
+    original_fit = model.fit
+    monkeypatch.setattr(model, "fit", lambda: fits.append(1) or original_fit())
+
+    created = [controller.create_property("Casa", f"Nova {n}", "Teste", 300_000 + n, f"Centro, Cidade {n % 3}", "Venda", "Ag")
+               for n in range(12)]
+    live = list(database.properties)
+    for prop in live[:10]:
+        controller.delete_property(prop.id)
+    controller.update_property(live[20].id, price=live[20].price * 2, location="Bairro, Manaus")
+    live[30].available = not live[30].available
+
+    probes = [prop.id for prop in created] + [live[20].id, live[30].id, live[40].id]
+    incremental = {property_id: model.similar_to(property_id, 8) for property_id in probes}
+    assert fits == []
+    assert live[0].id not in model._rows
+
+    reference = rescored_with(Completo.PropertyRecommender().fit(), model._price_stats)
+    for property_id, pairs in incremental.items():
+        expected = reference.similar_to(property_id, 8)
+        assert np.allclose([score for _, score in pairs], [score for _, score in expected], atol=1e-5)
+        assert not {other for other, _ in pairs} & {prop.id for prop in live[:10]}
+
+
+def test_recommendations_respect_preferences_and_history(database, fast_hash):
+    Completo.generate_synthetic_data(800, database=database)
+    client = next(user for user in database.users if user.get_role() == "Cliente")
+    client.update_preferences(locations=["Centro, Recife"], categories=["Apartamento"], price_max=900_000,
+                              transaction_type="Venda")
+    pairs = Completo.PropertyRecommender().for_client(client, 15)
+    assert pairs and [score for _, score in pairs] == sorted((score for _, score in pairs), reverse=True)
+    visited = {visit._property.id for visit in client.list_scheduled_visits()}
+    for property_id, _ in pairs:
+        prop = database.property_index.get(property_id)
+        assert (prop.property_category, prop.transaction_type) == ("Apartamento", "Venda")
+        assert prop.available and prop.price <= 900_000 and property_id not in visited
+
+
+def test_city_is_stored_as_a_code_not_as_columns(database):
+    Completo.generate_synthetic_data(500, database=database)
+    model = Completo.PropertyRecommender().fit()
+    assert model._dense.shape == (len(model._ids), Completo.PropertyRecommender.DENSE_COLUMNS)
+    assert len(model._city_codes) > model._dense.shape[1]
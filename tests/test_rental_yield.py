@@ -0,0 +1,34 @@
+from statistics import median
+
+import pytest
+
+import Completo
+
+
+def brute_force(database, by_category, min_listings):
+    groups = {}
+    for prop in database.properties:
+        city = prop.location.rsplit(",", 1)[-1].strip()
+        category = prop.property_category if by_category else "Todas"
+        groups.setdefault((city, category), {"Venda": [], "Aluguel": []})[prop.transaction_type].append(prop.price)
+    rows = {}
+    for key, prices in groups.items():
+        if min(len(prices["Venda"]), len(prices["Aluguel"])) >= max(min_listings, 1):
+            rows[key] = median(prices["Aluguel"]) * 12 / median(prices["Venda"])
+    return rows
+
+
+@pytest.mark.parametrize("by_category", [True, False])
+def test_yields_follow_updates_and_deletes(database, by_category):
+    Completo.generate_synthetic_data(800, database=database)
+    properties = Completo.PropertyController()
+    for prop in list(database.properties)[::11]:
+        properties.update_property(prop.id, price=prop.price * 1.5)
+    for prop in list(database.properties)[::13]:
+        properties.delete_property(prop.id)
+
+    table = Completo.MarketAnalysisController(properties).get_rental_yields(by_category, min_listings=3)
+    expected = brute_force(database, by_category, 3)
+    assert expected
+    assert {(row["city"], row["property_category"]): pytest.approx(row["gross_yield"]) for row in table} == expected
+    assert [row["gross_yield"] for row in table] == sorted((row["gross_yield"] for row in table), reverse=True)
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import Completo
+
+
+def snapshot(database, skip):
+    # Só os registros gerados: os dados iniciais do banco usam a data atual
+    users, properties, visits, reviews = skip
+    return (
+        [(user.id, user.email, user.get_role()) for user in list(database.users)[users:]],
+        [(prop.id, prop.title, prop.price, prop.location, prop.available, prop.listed_at)
+         for prop in list(database.properties)[properties:]],
+        [(visit.id, visit._client.id, visit._property.id, visit.date_time) for visit in list(database.visits)[visits:]],
+        [(review.property_id, review.rating) for review in list(database.reviews)[reviews:]],
+    )
+
+
+def test_generator_counts_and_determinism(monkeypatch, fast_hash):
+    def generate(seed):
+        database = Completo.Database()
+        monkeypatch.setattr(Completo, "db", database)
+        before = (len(database.users), len(database.properties), len(database.visits), len(database.reviews))
+        inquiries = Completo.InquiryController()
+        counts = Completo.generate_synthetic_data(400, seed, database=database, inquiry_controller=inquiries)
+        assert counts == dict(Completo.synthetic_counts(400))
+        assert (len(database.users) - before[0], len(database.properties) - before[1],
+                len(database.visits) - before[2], len(database.reviews) - before[3]) == \
+            (counts["agents"] + counts["clients"], counts["properties"], counts["visits"], counts["reviews"])
+        assert len(inquiries.list_inquiries()) == counts["inquiries"]
+        return snapshot(database, before)
+
+    assert generate(7) == generate(7)
+    assert generate(7) != generate(8)
+    assert Completo.synthetic_counts("10k")["properties"] == 10_000
+    with pytest.raises(ValueError):
+        Completo.synthetic_counts(0)
+
+
+def test_benchmark_report_shape(database, fast_hash, tmp_path):
+    output = tmp_path / "bench.json"
+    report = Completo.run_benchmarks(300, iterations=3, seed=5, output=str(output))
+    assert json.loads(output.read_text(encoding="utf-8")) == json.loads(json.dumps(report))
+    assert {"commit", "python", "timestamp", "scale", "seed", "counts", "load_seconds", "results"} <= set(report)
+    names = [result["name"] for result in report["results"]]
+    assert len(names) == len(set(names)) and "search_properties_combined_warm" in names
+    for result in report["results"]:
+        assert result["min_us"] <= result["p50_us"] <= result["p95_us"] <= result["max_us"]
+
+    # Comparação com o próprio relatório: nenhuma regressão
+    assert Completo.compare_benchmarks(str(output), str(output)) == []
@@ -0,0 +1,50 @@
+import Completo
+
+
+def test_register_hashes_outside_write_lock(database, monkeypatch):
+    original = Completo.hash_password
+    held = []
+
+    def hash_password(password, salt=None):
+        held.append(database.lock._writer is not None)
+        return original(password, 1, salt)
+
+    monkeypatch.setattr(Completo, "hash_password", hash_password)
+    user = Completo.UserController().register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    assert user is not None and held == [False]
+    assert database.find_user_by_email("ana@portal.com") is user
+
+
+def test_register_rejects_duplicate_email(database, fast_hash):
+    controller = Completo.UserController()
+    assert controller.register_user("Ana", "ana@portal.com", "segredo", "Cliente") is not None
+    assert controller.register_user("Outra", "ana@portal.com", "segredo", "Agente") is None
+
+
+def test_authenticate_checks_dummy_hash_for_unknown_email(database, fast_hash, monkeypatch):
+    controller = Completo.UserController()
+    controller.register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    checked = []
+    original = Completo.verify_password
+    monkeypatch.setattr(Completo, "verify_password", lambda password, stored: checked.append(stored) or original(password, stored))
+
+    assert controller.authenticate("ninguem@portal.com", "segredo") is None
+    assert checked == [Completo.DUMMY_PASSWORD_HASH]
+    assert controller.authenticate("ana@portal.com", "errada") is None
+    assert controller.authenticate("ana@portal.com", "segredo").email == "ana@portal.com"
+
+
+def test_sessions_resolve_and_revoke(database, fast_hash):
+    controller = Completo.UserController()
+    user = controller.register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    token = controller.create_session("ana@portal.com", "segredo")
+    assert controller.user_from_token(token) is user
+    controller.end_session(token)
+    assert controller.user_from_token(token) is None
+
+
+def test_malformed_stored_hashes_do_not_verify():
+    for stored in ("segredo", "pbkdf2_sha256$muitas$00$00", "pbkdf2_sha256$0$00$00",
+                   "pbkdf2_sha256$1$saléé$00", "md5$1$00$00", "pbkdf2_sha256$$$"):
+        assert Completo.verify_password("segredo", stored) is False
+    assert Completo.verify_password("segredo", Completo.hash_password("segredo", 1)) is True
@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+
+import Completo
+
+
+def test_kdtree_matches_brute_force():
+    rng = np.random.default_rng(3)
+    points = rng.uniform(-50, 50, size=(2000, 3))
+    tree = Completo.KDTree(points)
+    for query in rng.uniform(-60, 60, size=(25, 3)):
+        expected = np.sort(np.linalg.norm(points - query, axis=1))[:7]
+        found = [distance for distance, _ in tree.query(query, 7)]
+        assert np.allclose(found, expected)
+        rows = [row for _, row in tree.query(query, 7)]
+        assert np.allclose(np.linalg.norm(points[rows] - query, axis=1), found)
+
+
+def test_estimate_uses_nearest_comparables_of_the_segment(database):
+    Completo.generate_synthetic_data(800, database=database)
+    valuation = Completo.ValuationModel(k=5)
+    estimate = valuation.estimate("Centro, Recife", "Casa", "Venda")
+    assert estimate["low"] <= estimate["estimate"] <= estimate["high"]
+    assert len(estimate["comparables"]) == 5
+    for comparable in estimate["comparables"]:
+        prop = database.property_index.get(comparable["id"])
+        assert (prop.property_category, prop.transaction_type) == ("Casa", "Venda")
+
+
+def test_only_the_changed_segment_is_refit(database, monkeypatch):
+    Completo.generate_synthetic_data(600, database=database)
+    controller = Completo.PropertyController()
+    valuation = Completo.ValuationModel()
+    valuation.estimate("Centro, Recife", "Casa", "Venda")
+    valuation.estimate("Centro, Recife", "Terreno", "Aluguel")
+    fitted = []
+    original = valuation._fit_segment
+    monkeypatch.setattr(valuation, "_fit_segment", lambda key: fitted.append(key) or original(key))
+
+    land = next(prop for prop in database.properties if (prop.property_category, prop.transaction_type) == ("Terreno", "Aluguel"))
+    controller.update_property(land.id, price=land.price + 100)
+    land.available = not land.available
+    valuation.estimate("Centro, Recife", "Casa", "Venda")
+    assert fitted == []
+    valuation.estimate("Centro, Recife", "Terreno", "Aluguel")
+    assert fitted == [("Terreno", "Aluguel")]
+
+
+def test_import_validates_listed_at_before_inserting(database, tmp_path):
+    rows = [
+        {"property_category": "Casa", "title": "Casa Importada", "description": "Teste", "price": 400_000,
+         "location": "Centro, Natal", "transaction_type": "Venda", "agent": "Agente", "listed_at": "ontem"},
+        {"property_category": "Casa", "title": "Casa Importada 2", "description": "Teste", "price": 400_000,
+         "location": "Centro, Natal", "transaction_type": "Venda", "agent": "Agente",
+         "listed_at": "2024-05-01T10:00:00", "available": False},
+    ]
+    source = tmp_path / "imoveis.jsonl"
+    source.write_text("\n".join(json.dumps(row) for row in rows), encoding="utf-8")
+    before = len(database.properties)
+    version = database.property_index.versions.get(Completo.PropertyIndex.segment_partition("Casa", "Venda"))
+
+    imported, failed = Completo.command_import(
+        Completo.argparse.Namespace(input=str(source), errors=str(tmp_path / "erros.jsonl")), None)
+    assert (imported, failed) == (1, 1)
+    assert len(database.properties) == before + 1
+    prop = next(prop for prop in database.properties if prop.title == "Casa Importada 2")
+    assert prop.listed_at.year == 2024 and prop.available is False
+    assert database.property_index.versions.get(Completo.PropertyIndex.segment_partition("Casa", "Venda")) > version
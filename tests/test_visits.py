@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import Completo
+
+
+def test_concurrent_visits_get_unique_ids(database, fast_hash):
+    users = Completo.UserController()
+    properties = Completo.PropertyController()
+    client = users.register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    prop = next(iter(database.properties))
+    controller = Completo.VisitController(properties, users)
+
+    def schedule(number):
+        return controller.schedule_visit(None, client.id, prop.id, f"2026-01-{number % 28 + 1:02d} 10:00").id
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        ids = list(executor.map(schedule, range(400)))
+    assert len(set(ids)) == 400
+    assert database.new_visit_id() == max(ids) + 1
+
+
+def test_explicit_visit_ids_advance_the_allocator(database, fast_hash):
+    users = Completo.UserController()
+    client = users.register_user("Ana", "ana@portal.com", "segredo", "Cliente")
+    prop = next(iter(database.properties))
+    controller = Completo.VisitController(Completo.PropertyController(), users)
+    controller.schedule_visit(50, client.id, prop.id, "2026-01-01 10:00")
+    assert controller.schedule_visit(None, client.id, prop.id, "2026-01-02 10:00").id == 51